@@ -109,11 +109,12 @@ class TibkatUpdater(ConferenceCorpusUpdate):
         '''
         if args.updateConferenceCorpus or args.updateAll:
             Tibkat.limitFiles=args.limitFiles
+            Tibkat.workers=args.workers
             Tibkat.ftxroot=args.ftxroot
             Tibkat.wantedbks=args.wantedBks
             if Tibkat.wantedbks==["all"]:
                 Tibkat.wantedbks=[]
-            super().updateDataSource(source=f"TIBKAT FTX dump \nftxroot:{args.ftxroot}\nlimitFiles:{args.limitFiles}\nBasisklassifikationen: {args.wantedBks}",sampleId=args.sample)
+            super().updateDataSource(source=f"TIBKAT FTX dump \nftxroot:{args.ftxroot}\nlimitFiles:{args.limitFiles}\nworkers:{args.workers}\nBasisklassifikationen: {args.wantedBks}",sampleId=args.sample)
         
 
 class DblpUpdater(ConferenceCorpusUpdate):
@@ -142,10 +143,11 @@ class DblpUpdater(ConferenceCorpusUpdate):
         print(f"dblp xml dump file is  {xmlfile} with size {sizeMB:5.1f} MB" )
         if args.updateXml or args.updateAll:
             showProgress=True
-            recreate=True
+            incremental=args.incremental
+            recreate=not incremental
             limit=10000000
             sample=5
-            _sqlDB=dblpXml.getSqlDB(limit, sample=sample, debug=debug,recreate=recreate,postProcess=dblpXml.postProcess,showProgress=showProgress)
+            _sqlDB=dblpXml.getSqlDB(limit, sample=sample, debug=debug,recreate=recreate,postProcess=dblpXml.postProcess,showProgress=showProgress,streaming=True,incremental=incremental)
         if args.updateConferenceCorpus or args.updateAll:
             super().updateDataSource("dblp xml dump","ISWC 2008") 
 
@@ -180,6 +182,9 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-d",   "--debug", dest="debug", action="store_true", help="set debug [default: %(default)s]")
         parser.add_argument("--createViews",action="store_true",help="create the common view for all datasources")
+        parser.add_argument("--materializeViews",action="store_true",help="create the common views as indexed tables that are refreshed on each update")
+        parser.add_argument("--bulkStore",action="store_true",help="store the updated tables with a single executemany transaction")
+        parser.add_argument("--shadowStore",action="store_true",help="write the updated tables to shadow tables that are swapped in when complete so that readers are not blocked")
         parser.add_argument("--createLookup",action="store_true",help="create lookup yaml files for city,country and region for the given table prefixes")
         parser.add_argument("--lookupTables",nargs="+",default=["dblp","wikidata","crossref","confref"],help="tables to use for lookup Creation\n[default: %(default)s]")
         parser.add_argument("-dblp","--dblp", dest="dblp",   action="store_true", help="update dblp")
@@ -189,9 +194,11 @@ USAGE
         parser.add_argument("--addLookupAcronym",nargs="+",help="add lookupAcronyms for the given lookup Ids")
         parser.add_argument("--updateSource",nargs="+",help="update the sources for the given lookup Ids")
         parser.add_argument("--limitFiles",type=int,default=10000,help="limit the number of file to be parsed [default: %(default)s]")
+        parser.add_argument("--workers",type=int,default=1,help="number of worker processes to parse the TIBKAT FTX files with [default: %(default)s]")
         parser.add_argument("--ftxroot",default="/Volumes/seel/tibkat-ftx/tib-intern-ftx_0/tib-2021-12-20",help="path to root directory of ftx xml files [default: %(default)s]")
         parser.add_argument("--sample",default="ISWC 2008",help="sample event ID [default: %(default)s]")
         parser.add_argument("--wantedBks",nargs="+",default=["54"],help="wanted Basisklassifikationen [default: %(default)s] use 'all' for no filter")
+        parser.add_argument("--incremental",action="store_true",help="only re-import the dblp records whose mdate changed instead of recreating the dblp database")
         parser.add_argument("-uxml","--updateXml", dest="updateXml",   action="store_true", help="update the dblp xml file and eventcorpus database")
         parser.add_argument("-ucc","--updateConferenceCorpus", dest="updateConferenceCorpus",   action="store_true", help="update the dblp xml file and eventcorpus database")
         parser.add_argument("-uall","--updateAll", dest="updateAll",   action="store_true", help="update the dblp xml file and eventcorpus database")
@@ -201,6 +208,12 @@ USAGE
         if args.debug:
             DEBUG = True
             print("Starting in debug mode")
+        if args.materializeViews:
+            EventStorage.materializeViews=True
+        if args.bulkStore:
+            EventStorage.bulkStore=True
+        if args.shadowStore:
+            EventStorage.shadowStore=True
         if args.dblp:
             dblpUpdater=DblpUpdater()
             dblpUpdater.update(args)
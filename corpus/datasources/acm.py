@@ -6,7 +6,7 @@ Created on 2021-11-04
 from corpus.event import Event,EventSeries,EventManager,EventSeriesManager
 from lodstorage.storageconfig import StorageConfig
 from corpus.eventcorpus import EventDataSourceConfig,EventDataSource
-from corpus.datasources.webscrape import WebScrape
+from corpus.datasources.webscrape import WebScrape, ResponseCache
 from corpus.datasources.wikidata import Wikidata
 
 class ACM(EventDataSource):
@@ -17,16 +17,18 @@ class ACM(EventDataSource):
     sourceConfig=EventDataSourceConfig(lookupId="acm",name="acm",url="https://dl.acm.org/conferences",title="Association for Computing machinery",tableSuffix="acm")
   
 
-    def __init__(self,debug:bool=False,showHtml=False):
+    def __init__(self,debug:bool=False,showHtml=False,responseCache:ResponseCache=None):
         '''
         Constructor
         
             debug(bool): True if debugging should be active
             showHtml(bool): True if HTML of scraped websites should be shown
+            responseCache(ResponseCache): if set use the given cache for the HTTP responses
         '''
         super().__init__(AcmEventManager(),AcmEventSeriesManager(),ACM.sourceConfig)
         self.debug=debug
         self.showHtml=showHtml
+        self.responseCache=responseCache
         
     def getSoup(self,url:str):
         '''
@@ -41,7 +43,7 @@ class ACM(EventDataSource):
         msg=f"getting {url} ..."
         if self.debug:
             print (msg)
-        scrape=WebScrape(debug=self.debug)
+        scrape=WebScrape(debug=self.debug,responseCache=self.responseCache)
         soup=scrape.getSoup(url, showHtml=self.showHtml)   
         return soup
     
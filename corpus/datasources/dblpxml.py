@@ -4,24 +4,28 @@ Created on 2021-01-25
 @author: wf
 '''
 from pathlib import Path
-from io import BytesIO
 import urllib.request
-from gzip import GzipFile
+import urllib.error
 from lxml import etree
 from collections import Counter
 from xml.dom import minidom
-from lodstorage.sql import SQLDB
+from lodstorage.sql import SQLDB, EntityInfo
 from lodstorage.schema import Schema
 from corpus.utils.progress import Progress
+from corpus.utils.download import Download
+from corpus.event import EventStorage
 import os
 import re
 import time
+import datetime
 
 class DblpXml(object):
     '''
     handler for https://dblp.uni-trier.de/xml/ dumps
     see https://github.com/IsaacChanghau/DBLPParser/blob/master/src/dblp_parser.py
     '''
+    # name of the table that records the incremental syncs
+    syncTableName="dblp_sync"
 
     def __init__(self,xmlname:str="dblp.xml",dtd_validation:bool=False,xmlpath:str=None,gzurl:str="https://dblp.uni-trier.de/xml/dblp.xml.gz",debug=False,verbose=True):
         '''
@@ -146,12 +150,37 @@ class DblpXml(object):
         sampleTree=etree.ElementTree(root) 
         return sampleTree
         
-    def getXmlFile(self,reload=False):
+    def getMd5(self)->str:
+        '''
+        get the md5 checksum of the gzipped dump as published next to it
+        
+        Returns:
+            str: the md5 checksum or None if it is not available
+        '''
+        md5url=f"{self.gzurl}.md5"
+        md5=None
+        try:
+            with urllib.request.urlopen(md5url,timeout=60) as response:
+                md5Text=response.read().decode()
+                parts=md5Text.split()
+                if len(parts)>0:
+                    md5=parts[0].lower()
+        except (urllib.error.URLError,TimeoutError,OSError) as _ex:
+            # e.g. a read timeout or connection reset - the download is then not verified
+            if self.verbose:
+                print(f"no md5 checksum available at {md5url}")
+        return md5
+        
+    def getXmlFile(self,reload=False,verify:bool=True):
         '''
         get the dblp xml file - will download the file if it doesn't exist
         
+        the gzipped file is downloaded and decompressed in chunks - an interrupted
+        download is resumed on the next call
+        
         Args:
             reload(bool): if True force download
+            verify(bool): if True verify the md5 checksum of the download if available
             
         Returns:
             str: the xmlfile
@@ -160,10 +189,11 @@ class DblpXml(object):
             os.makedirs(self.xmlpath,exist_ok=True)
             if self.verbose:
                 print(f"downloading {self.xmlfile} from {self.gzurl}")
-            urlreq = urllib.request.urlopen(self.gzurl)
-            z = GzipFile(fileobj=BytesIO(urlreq.read()), mode='rb')
-            with open(self.xmlfile, 'wb') as outfile:
-                outfile.write(z.read())
+            gzfile=f"{self.xmlfile}.gz"
+            md5=self.getMd5() if verify else None
+            Download.streamDownload(self.gzurl, gzfile, md5=md5, verbose=self.verbose)
+            Download.gunzipFile(gzfile, self.xmlfile)
+            os.remove(gzfile)
         if not os.path.isfile(self.dtdfile) or reload:
             dtdurl=self.gzurl.replace(".xml.gz",".dtd")
             urllib.request.urlretrieve (dtdurl, self.dtdfile)
@@ -229,20 +259,37 @@ class DblpXml(object):
                 row['conf']=conf
         pass
     
-    def getXmlSqlDB(self,reload=False,showProgress=False):
+    def getXmlSqlDB(self,reload=False,showProgress=False,streaming:bool=True):
         '''
         get the SqlDB derived from the XML download 
+        
+        Args:
+            reload(bool): if True force download
+            showProgress(bool): if True show the progress
+            streaming(bool): if True store the records in batches while parsing
         '''
         self.getXmlFile(reload=reload)
-        return self.getSqlDB(postProcess=self.postProcess,showProgress=showProgress)
+        return self.getSqlDB(postProcess=self.postProcess,showProgress=showProgress,streaming=streaming)
         
             
-    def getSqlDB(self,limit=1000000000,sample=None,createSample=10000000,debug=False,recreate=False,postProcess=None,check_same_thread=False,showProgress:bool=False):
+    def getSqlDB(self,limit=1000000000,sample=None,createSample=10000000,debug=False,recreate=False,postProcess=None,check_same_thread=False,showProgress:bool=False,streaming:bool=False,batchSize:int=10000,incremental:bool=False):
         '''
         get the SQL database or create it from the XML content
         
         Args:
             limit(int): maximum number of records
+            sample(int): number of sample records to show in debug mode
+            createSample(int): number of sample records to derive the table schema from (non streaming mode only)
+            debug(bool): if True show debug information
+            recreate(bool): if True recreate the database
+            postProcess(callable): callback to post process each row with
+            check_same_thread(bool): True if the connection is to be used from the creating thread only
+            showProgress(bool): if True show the progress
+            streaming(bool): if True store the records in batches of batchSize per kind while parsing
+                instead of collecting the full dump in memory first
+            batchSize(int): the number of records per kind to collect before storing them in streaming mode
+            incremental(bool): if True and the database already exists only insert, update or delete the records
+                whose key/mdate changed compared to the xml content
         '''
         dbname=f"{self.xmlpath}/dblp.sqlite"
         # estimate size
@@ -256,70 +303,371 @@ class DblpXml(object):
             sample=5
         if (os.path.isfile(dbname)) and not recreate:
             sqlDB=SQLDB(dbname=dbname,debug=debug,errorDebug=True,check_same_thread=check_same_thread)
+            if incremental:
+                self.syncSqlDB(sqlDB, limit, batchSize=batchSize, debug=debug, postProcess=postProcess, progressSteps=progress, expectedTotal=expectedTotal, showProgress=showProgress)
+                self.createRecordView(sqlDB, debug=debug)
         else:
             if (os.path.isfile(dbname)) and recreate:
                 os.remove(dbname)
             sqlDB=SQLDB(dbname=dbname,debug=debug,errorDebug=True,check_same_thread=check_same_thread)
-            starttime=time.time()
-            dictOfLod=self.asDictOfLod(limit,progressSteps=progress,expectedTotal=expectedTotal)
-            elapsed=time.time()-starttime
-            executeMany=True
-            if showProgress:
-                print(f"parsing done after {elapsed:5.1f} s ... storing ...")
-            starttime=time.time()    
-            fixNone=True    
-            for i, (kind, lod) in enumerate(dictOfLod.items()):
-                if postProcess is not None:
-                    for j,row in enumerate(lod):
-                        postProcess(kind,j,row)
-            rows=0
-            for i, (kind, lod) in enumerate(dictOfLod.items()):
-                rows+=len(lod)
-                if debug:
-                    print ("#%4d %5d: %s" % (i+1,len(lod),kind))
-                entityInfo=sqlDB.createTable(lod,kind,'key',sampleRecordCount=createSample,failIfTooFew=False)
-                sqlDB.store(lod,entityInfo,executeMany=executeMany,fixNone=fixNone)
+            if incremental:
+                # an initial incremental sync inserts all records and records the sync info
+                self.syncSqlDB(sqlDB, limit, batchSize=batchSize, debug=debug, postProcess=postProcess, progressSteps=progress, expectedTotal=expectedTotal, showProgress=showProgress)
+            elif streaming:
+                self.storeStreaming(sqlDB, limit, batchSize=batchSize, sample=sample, debug=debug, postProcess=postProcess, progressSteps=progress, expectedTotal=expectedTotal, showProgress=showProgress)
+            else:
+                self.storeDictOfLod(sqlDB, limit, sample=sample, createSample=createSample, debug=debug, postProcess=postProcess, progressSteps=progress, expectedTotal=expectedTotal, showProgress=showProgress)
+            self.createRecordView(sqlDB, debug=debug)
+        return sqlDB
+    
+    @classmethod
+    def getRecordTableList(cls,sqlDB:SQLDB)->list:
+        '''
+        get the record tables of the given database - the sync and metadata tables are skipped
+        
+        Args:
+            sqlDB(SQLDB): the database to analyze
+            
+        Returns:
+            list: the table list entries of the record tables
+        '''
+        skipTables=[cls.syncTableName,EventStorage.metadataTableName]
+        tableList=[table for table in sqlDB.getTableList() if table["name"] not in skipTables]
+        return tableList
+    
+    def createRecordView(self,sqlDB:SQLDB,debug:bool=False):
+        '''
+        (re)create the general "record" view over all record tables
+        
+        Args:
+            sqlDB(SQLDB): the database to create the view in
+            debug(bool): if True show the view DDL
+        '''
+        tableList=self.getRecordTableList(sqlDB)
+        viewDDL=Schema.getGeneralViewDDL(tableList, "record")
+        if debug:
+            print(viewDDL)
+        sqlDB.execute("DROP VIEW IF EXISTS record")
+        sqlDB.execute(viewDDL)
+    
+    def storeDictOfLod(self,sqlDB:SQLDB,limit:int,sample:int=5,createSample:int=10000000,debug:bool=False,postProcess=None,progressSteps:int=None,expectedTotal:int=None,showProgress:bool=False):
+        '''
+        parse the complete xml dump into a dict of list of dicts and store it in the given database
+        
+        Args:
+            sqlDB(SQLDB): the database to store the records in
+            limit(int): maximum number of records
+            sample(int): number of sample records to show in debug mode
+            createSample(int): number of sample records to derive the table schema from
+            debug(bool): if True show debug information
+            postProcess(callable): callback to post process each row with
+            progressSteps(int): if set the interval at which to show the progress
+            expectedTotal(int): the expected Total number of records
+            showProgress(bool): if True show the progress
+        '''
+        starttime=time.time()
+        dictOfLod=self.asDictOfLod(limit,progressSteps=progressSteps,expectedTotal=expectedTotal)
+        elapsed=time.time()-starttime
+        executeMany=True
+        if showProgress:
+            print(f"parsing done after {elapsed:5.1f} s ... storing ...")
+        starttime=time.time()    
+        fixNone=True    
+        for i, (kind, lod) in enumerate(dictOfLod.items()):
+            if postProcess is not None:
                 for j,row in enumerate(lod):
-                    if debug:
-                        print ("  %4d: %s" % (j,row)) 
+                    postProcess(kind,j,row)
+        rows=0
+        for i, (kind, lod) in enumerate(dictOfLod.items()):
+            rows+=len(lod)
+            if debug:
+                print ("#%4d %5d: %s" % (i+1,len(lod),kind))
+            entityInfo=sqlDB.createTable(lod,kind,'key',sampleRecordCount=createSample,failIfTooFew=False)
+            sqlDB.store(lod,entityInfo,executeMany=executeMany,fixNone=fixNone)
+            for j,row in enumerate(lod):
+                if debug:
+                    print ("  %4d: %s" % (j,row)) 
+                if j>sample:
+                    break
+        EventStorage.updateTableMetadata(list(dictOfLod.keys()), sqlDB=sqlDB)
+        elapsed=time.time()-starttime        
+        if showProgress:
+            print (f"stored {rows} rows in {elapsed:5.1f} s {rows/elapsed:5.0f} rows/s" )
+            
+    def storeStreaming(self,sqlDB:SQLDB,limit:int,batchSize:int=10000,sample:int=5,debug:bool=False,postProcess=None,progressSteps:int=None,expectedTotal:int=None,showProgress:bool=False):
+        '''
+        store the records of the xml dump in the given database while parsing in
+        batches of batchSize records per kind so that the memory 
+        needed does not depend on the size of the dump
+        
+        Args:
+            sqlDB(SQLDB): the database to store the records in
+            limit(int): maximum number of records
+            batchSize(int): the number of records per kind to collect before storing them
+            sample(int): number of sample records to show in debug mode
+            debug(bool): if True show debug information
+            postProcess(callable): callback to post process each row with
+            progressSteps(int): if set the interval at which to show the progress
+            expectedTotal(int): the expected Total number of records
+            showProgress(bool): if True show the progress
+        '''
+        starttime=time.time()
+        batches={}
+        entityInfos={}
+        rowCounts=Counter()
+        for kind,row in self.iterRecords(limit,progressSteps=progressSteps,expectedTotal=expectedTotal):
+            if not kind in batches:
+                batches[kind]=[]
+            batch=batches[kind]
+            batch.append(row)
+            if len(batch)>=batchSize:
+                self.storeBatch(sqlDB, kind, batch, entityInfos, rowCounts, sample=sample, debug=debug, postProcess=postProcess)
+                batches[kind]=[]
+        for kind,batch in batches.items():
+            if len(batch)>0:
+                self.storeBatch(sqlDB, kind, batch, entityInfos, rowCounts, sample=sample, debug=debug, postProcess=postProcess)
+        EventStorage.updateTableMetadata(list(entityInfos.keys()), sqlDB=sqlDB)
+        elapsed=time.time()-starttime
+        if showProgress:
+            rows=sum(rowCounts.values())
+            print (f"parsed and stored {rows} rows in {elapsed:5.1f} s {rows/elapsed:5.0f} rows/s" )
+            
+    def storeBatch(self,sqlDB:SQLDB,kind:str,batch:list,entityInfos:dict,rowCounts:Counter,sample:int=5,debug:bool=False,postProcess=None,replace:bool=False):
+        '''
+        store the given batch of rows of the given kind
+        
+        the table for the kind is created with the first batch - columns that show up
+        in later batches only are added with ALTER TABLE
+        
+        Args:
+            sqlDB(SQLDB): the database to store the batch in
+            kind(str): e.g. proceedings/article
+            batch(list): the list of rows to store
+            entityInfos(dict): the entityInfos by kind of the tables created so far
+            rowCounts(Counter): the number of rows stored so far by kind
+            sample(int): number of sample records to show in debug mode
+            debug(bool): if True show debug information
+            postProcess(callable): callback to post process each row with
+            replace(bool): if True replace existing rows with the same key
+        '''
+        offset=rowCounts[kind]
+        if postProcess is not None:
+            for j,row in enumerate(batch):
+                postProcess(kind,offset+j,row)
+        if not kind in entityInfos:
+            if debug:
+                print ("#%4d %5d: %s" % (len(entityInfos)+1,len(batch),kind))
+            entityInfos[kind]=sqlDB.createTable(batch,kind,'key',sampleRecordCount=len(batch),failIfTooFew=False)
+            if debug:
+                for j,row in enumerate(batch):
+                    print ("  %4d: %s" % (j,row)) 
                     if j>sample:
                         break
-            elapsed=time.time()-starttime        
-            if showProgress:
-                print (f"stored {rows} rows in {elapsed:5.1f} s {rows/elapsed:5.0f} rows/s" )
-            tableList=sqlDB.getTableList()     
-            viewDDL=Schema.getGeneralViewDDL(tableList, "record")
-            if debug:
-                print(viewDDL)
-            sqlDB.execute(viewDDL)
-        return sqlDB
+        else:
+            entityInfo=entityInfos[kind]
+            batchInfo=EntityInfo(batch,kind,'key',quiet=True)
+            for column,sqlType in batchInfo.sqlTypeMap.items():
+                if not column in entityInfo.typeMap:
+                    sqlDB.execute(f"ALTER TABLE {kind} ADD COLUMN {column} {sqlType}")
+                    entityInfo.addType(column,batchInfo.typeMap[column],sqlType)
+        sqlDB.store(batch,entityInfos[kind],executeMany=True,fixNone=True,replace=replace)
+        rowCounts[kind]+=len(batch)
+        
+    def getEntityInfos(self,sqlDB:SQLDB)->dict:
+        '''
+        get the entityInfos for the record tables already existing in the given database
+        
+        Args:
+            sqlDB(SQLDB): the database to analyze
             
-    def asDictOfLod(self,limit:int=1000,delim:str=',',progressSteps:int=None,expectedTotal:int=None):
+        Returns:
+            dict: the entityInfos by kind
         '''
-        get the dblp data as a dict of list of dicts - effectively separating the content
-        into table structures
+        pythonTypes={"TEXT":str,"INTEGER":int,"FLOAT":float,"BOOLEAN":bool,"DATE":datetime.date,"TIMESTAMP":datetime.datetime}
+        entityInfos={}
+        for table in self.getRecordTableList(sqlDB):
+            kind=table["name"]
+            entityInfo=EntityInfo([],kind,'key',quiet=True)
+            for column in table["columns"]:
+                sqlType=column["type"]
+                entityInfo.addType(column["name"],pythonTypes.get(sqlType,str),sqlType)
+            entityInfos[kind]=entityInfo
+        return entityInfos
+    
+    def getSyncInfo(self,sqlDB:SQLDB)->dict:
+        '''
+        get the information about the latest incremental sync of the given database
+        
+        Args:
+            sqlDB(SQLDB): the database to check
+            
+        Returns:
+            dict: the latest sync record or None if the database was never synced incrementally
+        '''
+        syncInfo=None
+        tableNames=[table["name"] for table in sqlDB.getTableList()]
+        if DblpXml.syncTableName in tableNames:
+            lod=sqlDB.query(f"SELECT * FROM {DblpXml.syncTableName} ORDER BY syncTime DESC LIMIT 1")
+            if len(lod)>0:
+                syncInfo=lod[0]
+        return syncInfo
+    
+    def syncSqlDB(self,sqlDB:SQLDB,limit:int,batchSize:int=10000,debug:bool=False,postProcess=None,progressSteps:int=None,expectedTotal:int=None,showProgress:bool=False)->Counter:
+        '''
+        incrementally synchronize the given database with the content of the xml dump
+        
+        records are compared by key and mdate - only new and changed records are
+        (re)stored and records that are no longer in the dump are deleted
+        
+        Args:
+            sqlDB(SQLDB): the database to synchronize
+            limit(int): maximum number of records - deletions are only done if the dump was parsed completely
+            batchSize(int): the number of records per kind to collect before comparing and storing them
+            debug(bool): if True show debug information
+            postProcess(callable): callback to post process each changed row with
+            progressSteps(int): if set the interval at which to show the progress
+            expectedTotal(int): the expected Total number of records
+            showProgress(bool): if True show the progress
+            
+        Returns:
+            Counter: the number of inserted, updated, deleted and unchanged records
+        '''
+        starttime=time.time()
+        stats=Counter()
+        entityInfos=self.getEntityInfos(sqlDB)
+        rowCounts=Counter()
+        sqlDB.execute("DROP TABLE IF EXISTS temp.dblp_seen")
+        sqlDB.execute("CREATE TEMP TABLE dblp_seen(key TEXT PRIMARY KEY)")
+        batches={}
+        maxMdate=None
+        parsed=0
+        # ask for one more record than the limit to find out whether the end of the dump has been reached
+        endOfDump=True
+        for kind,row in self.iterRecords(limit+1,progressSteps=progressSteps,expectedTotal=expectedTotal):
+            if parsed>=limit:
+                endOfDump=False
+                break
+            parsed+=1
+            mdate=row.get("mdate",None)
+            if mdate is not None and (maxMdate is None or mdate>maxMdate):
+                maxMdate=mdate
+            if not kind in batches:
+                batches[kind]=[]
+            batch=batches[kind]
+            batch.append(row)
+            if len(batch)>=batchSize:
+                self.syncBatch(sqlDB, kind, batch, entityInfos, rowCounts, stats, debug=debug, postProcess=postProcess)
+                batches[kind]=[]
+        for kind,batch in batches.items():
+            if len(batch)>0:
+                self.syncBatch(sqlDB, kind, batch, entityInfos, rowCounts, stats, debug=debug, postProcess=postProcess)
+        # only delete if we have seen the full dump
+        if endOfDump:
+            for kind in entityInfos.keys():
+                cursor=sqlDB.c.execute(f"DELETE FROM {kind} WHERE key NOT IN (SELECT key FROM temp.dblp_seen)")
+                stats["deleted"]+=cursor.rowcount
+        else:
+            print(f"warning: the limit of {limit} records was reached before the end of the dblp xml dump - records that are no longer in the dump are not deleted")
+        sqlDB.execute("DROP TABLE temp.dblp_seen")
+        sqlDB.c.commit()
+        self.storeSyncInfo(sqlDB, maxMdate, stats)
+        EventStorage.updateTableMetadata(list(entityInfos.keys()), sqlDB=sqlDB)
+        elapsed=time.time()-starttime
+        if showProgress or debug:
+            print (f"synced {parsed} rows in {elapsed:5.1f} s: {stats['inserted']} inserted {stats['updated']} updated {stats['deleted']} deleted {stats['unchanged']} unchanged")
+        return stats
+    
+    def syncBatch(self,sqlDB:SQLDB,kind:str,batch:list,entityInfos:dict,rowCounts:Counter,stats:Counter,debug:bool=False,postProcess=None):
+        '''
+        synchronize the given batch of rows of the given kind
+        
+        Args:
+            sqlDB(SQLDB): the database to synchronize
+            kind(str): e.g. proceedings/article
+            batch(list): the list of rows to synchronize
+            entityInfos(dict): the entityInfos by kind of the existing tables
+            rowCounts(Counter): the number of rows stored so far by kind
+            stats(Counter): the number of inserted, updated and unchanged records
+            debug(bool): if True show debug information
+            postProcess(callable): callback to post process each changed row with
+        '''
+        keys=[(row["key"],) for row in batch if "key" in row]
+        sqlDB.c.executemany("INSERT OR IGNORE INTO temp.dblp_seen(key) VALUES (?)",keys)
+        existingMdates={}
+        if kind in entityInfos and "mdate" in entityInfos[kind].typeMap:
+            # SQLite's default limit for host parameters is 999
+            chunkSize=900
+            for i in range(0,len(keys),chunkSize):
+                chunk=[key for (key,) in keys[i:i+chunkSize]]
+                placeholders=",".join("?"*len(chunk))
+                query=f"SELECT key,mdate FROM {kind} WHERE key IN ({placeholders})"
+                for record in sqlDB.query(query,tuple(chunk)):
+                    existingMdates[record["key"]]=record["mdate"]
+        changed=[]
+        for row in batch:
+            key=row.get("key",None)
+            if key in existingMdates:
+                if existingMdates[key]==row.get("mdate",None):
+                    stats["unchanged"]+=1
+                    continue
+                stats["updated"]+=1
+            else:
+                stats["inserted"]+=1
+            changed.append(row)
+        if len(changed)>0:
+            self.storeBatch(sqlDB, kind, changed, entityInfos, rowCounts, debug=debug, postProcess=postProcess, replace=True)
+    
+    def storeSyncInfo(self,sqlDB:SQLDB,maxMdate:str,stats:Counter):
+        '''
+        record the dump version the given database was synced from
+        
+        Args:
+            sqlDB(SQLDB): the database that has been synced
+            maxMdate(str): the latest modification date of the records in the dump
+            stats(Counter): the number of inserted, updated, deleted and unchanged records
+        '''
+        stat=os.stat(self.xmlfile)
+        syncInfo={
+            "syncTime": datetime.datetime.now().isoformat(),
+            "xmlfile": self.xmlfile,
+            "size": stat.st_size,
+            "mtime": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "dumpVersion": maxMdate,
+            "inserted": stats["inserted"],
+            "updated": stats["updated"],
+            "deleted": stats["deleted"],
+            "unchanged": stats["unchanged"]
+        }
+        sqlDB.execute(f"""CREATE TABLE IF NOT EXISTS {DblpXml.syncTableName}(
+  syncTime TEXT PRIMARY KEY,xmlfile TEXT,size INTEGER,mtime TEXT,dumpVersion TEXT,
+  inserted INTEGER,updated INTEGER,deleted INTEGER,unchanged INTEGER)""")
+        columns=",".join(syncInfo.keys())
+        placeholders=":"+",:".join(syncInfo.keys())
+        sqlDB.c.execute(f"INSERT INTO {DblpXml.syncTableName}({columns}) VALUES ({placeholders})",syncInfo)
+        sqlDB.c.commit()
+            
+    def iterRecords(self,limit:int=1000,delim:str=',',progressSteps:int=None,expectedTotal:int=None):
+        '''
+        iterate over the records of the dblp xml dump one at a time
         
         Args:
             limit(int): maximum amount of records to process
             delim(str): the delimiter to use for splitting attributes with multiple values (e.g. author)
             progressSteps(int): if set the interval at which to print a progress dot 
             expectedTotal(int): the expected Total number 
+            
+        Yields:
+            tuple: kind and record dict e.g. ("proceedings",{"key":"conf/pfe/2001",...})
         '''
-        index=0
         progress=Progress(progressSteps,expectedTotal,msg="Parsing dblp xml dump",showMemory=True)
         level=0
-        dictOfLod={}
         current={}
-        levelCount=Counter()
+        kind=None
         for event, elem in self.iterParser():
             if event == 'start': 
                 level += 1
-                levelCount[level]+=1
                 if level==2:
                     kind=elem.tag
-                    if not kind in dictOfLod:
-                        dictOfLod[kind]=[]
-                    lod=dictOfLod[kind]
                     # copy the attributes (if any)
                     if hasattr(elem, "attrib"):
                         current = {**current, **elem.attrib}
@@ -338,23 +686,34 @@ class DblpXml(object):
                 elif level>=4:
                     # interesting things happen here ...
                     # sub/sup i and so on see dblp xml faq
-                    #if elem.sourceline:
-                    #    print(f"{elem.sourceline:6}:{elem.tag}")
                     pass
             elif event == 'end':
                 if level==2:
-                    lod.append(current)
-                    progress.next()
-                    kind=elem.tag
-                    self.checkRow(kind,progress.count,current)
+                    record=current
                     current={} 
+                    progress.next()
+                    self.checkRow(elem.tag,progress.count,record)
+                    yield elem.tag,record
                     if progress.count>=limit:
                         break
                 level -= 1
                 self.clear_element(elem)
-                index+=1
-        if self.debug:
-            pass
-        if progress is not None:
-            progress.done()
+        progress.done()
+            
+    def asDictOfLod(self,limit:int=1000,delim:str=',',progressSteps:int=None,expectedTotal:int=None):
+        '''
+        get the dblp data as a dict of list of dicts - effectively separating the content
+        into table structures
+        
+        Args:
+            limit(int): maximum amount of records to process
+            delim(str): the delimiter to use for splitting attributes with multiple values (e.g. author)
+            progressSteps(int): if set the interval at which to print a progress dot 
+            expectedTotal(int): the expected Total number 
+        '''
+        dictOfLod={}
+        for kind,record in self.iterRecords(limit,delim=delim,progressSteps=progressSteps,expectedTotal=expectedTotal):
+            if not kind in dictOfLod:
+                dictOfLod[kind]=[]
+            dictOfLod[kind].append(record)
         return dictOfLod
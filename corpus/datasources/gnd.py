@@ -218,24 +218,38 @@ class GndEventManager(EventManager):
         if not hasattr(self, "getListOfDicts"):
             self.getListOfDicts=self.getLoDfromEndpoint
         
-    def postProcessEntityList(self,debug:bool=False):
+    def postProcessLod(self,listOfDicts:list,debug:bool=False):
         '''
-        postProcess Events
+        postProcess the raw event records
         '''
         stats=ExtractStatistics()
-        for event in self.events:
-            titleExtractor=GndTitleExtractor(getattr(event, "fulltitle", ""),stats)
+        for rawEvent in listOfDicts:
+            titleExtractor=GndTitleExtractor(rawEvent.get("fulltitle", ""),stats)
             titleExtractor.titleExtract()
-            titleExtractor.updateRawEvent(event.__dict__)
-            dateRange=(Textparse.getDateRange(event.date))
-            if (len(dateRange)==0 and event.date is not None):
-                stats.addInvalidDate(event.date)
+            titleExtractor.updateRawEvent(rawEvent)
+            date=rawEvent.get("date")
+            dateRange=(Textparse.getDateRange(date))
+            if (len(dateRange)==0 and date is not None):
+                stats.addInvalidDate(date)
             else:
-                Textparse.setDateRange(event, dateRange)
+                for field in ["year","startDate","endDate"]:
+                    if field in dateRange:
+                        rawEvent[field]=dateRange[field]
         print(stats.counter.most_common())
         if debug:
             stats.dump()
         return stats
+        
+    def postProcessEntityList(self,debug:bool=False):
+        '''
+        postProcess Events
+        '''
+        listOfDicts=[event.__dict__ for event in self.events]
+        stats=self.postProcessLod(listOfDicts, debug=debug)
+        if self.compact:
+            # compact entities are read-only snapshots - rebuild them from the post processed records
+            self.fromLoD(listOfDicts, append=False, debug=debug)
+        return stats
     
     def getSparqlQuery(self):
         '''
@@ -10,6 +10,7 @@ from corpus.datasources.tibkatftx import FTXParser
 from corpus.utils.textparse import Textparse
 import re
 from corpus.utils.progress import Progress
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 class Tibkat(EventDataSource):
     '''
@@ -30,6 +31,8 @@ class Tibkat(EventDataSource):
     ftxroot=f"{home}/.conferencecorpus/tibkat/ftx"
     wantedbks=["54"] # Informatik
     limitFiles=10000
+    # number of worker processes to parse the FTX files with
+    workers=1
   
     def __init__(self):
         '''
@@ -60,10 +63,7 @@ class TibkatEventManager(EventManager):
         Args:
             bk(str): the basisklassifkation to check
         '''
-        for wantedbk in Tibkat.wantedbks:
-            if bk.startswith(wantedbk):
-                return True
-        return False
+        return TibkatEventManager.hasWantedBk(bk,Tibkat.wantedbks)
         
     def isInWantedBkDocuments(self,document):
         '''
@@ -72,34 +72,96 @@ class TibkatEventManager(EventManager):
         Args:
             document(XMLEntity): the document to check
         '''
-        if len(Tibkat.wantedbks)==0:
+        return TibkatEventManager.isWantedDocument(document,Tibkat.wantedbks)
+    
+    @staticmethod
+    def hasWantedBk(bk:str,wantedbks:list)->bool:
+        '''
+        check whether the given basisklassifikation bk is in the given list of wanted ones
+        
+        Args:
+            bk(str): the basisklassifkation to check
+            wantedbks(list): the prefixes of the wanted basisklassifikationen
+        '''
+        for wantedbk in wantedbks:
+            if bk.startswith(wantedbk):
+                return True
+        return False
+    
+    @staticmethod
+    def isWantedDocument(document,wantedbks:list)->bool:
+        '''
+        check whether the given document has one of the given wanted Basisklassifikationen
+        
+        Args:
+            document(XMLEntity): the document to check
+            wantedbks(list): the prefixes of the wanted basisklassifikationen - an empty list means all are wanted
+        '''
+        if len(wantedbks)==0:
             return True
         wanted=False
         if hasattr(document, "bk"):
             bk=document.bk
             if isinstance(bk,list):
                 for bkvalue in bk:
-                    wanted=wanted or self.isWantedBk(bkvalue) 
+                    wanted=wanted or TibkatEventManager.hasWantedBk(bkvalue,wantedbks) 
             else:
-                wanted=self.isWantedBk(bk)
+                wanted=TibkatEventManager.hasWantedBk(bk,wantedbks)
         return wanted
+    
+    @staticmethod
+    def parseFtxFile(ftxroot:str,xmlFile:str,wantedbks:list)->list:
+        '''
+        parse the given FTX file and get the post processed records of the documents
+        with wanted Basisklassifikationen
+        
+        this is a staticmethod so that it can be used as a worker in a process pool
+        
+        Args:
+            ftxroot(str): the root directory of the FTX files
+            xmlFile(str): the name of the FTX xml file
+            wantedbks(list): the prefixes of the wanted basisklassifikationen
+            
+        Returns:
+            list: the list of dicts of the wanted documents
+        '''
+        lod=[]
+        ftxParser=FTXParser(ftxroot)
+        for document in ftxParser.parse(xmlFile,local=True):
+            if TibkatEventManager.isWantedDocument(document,wantedbks):
+                rawEvent=document.asDict()
+                TibkatEvent.postProcessLodRecord(rawEvent)
+                lod.append(rawEvent)
+        return lod
          
     def getListOfDicts(self)->list:
         '''
         get my list of dicts
+        
+        with Tibkat.workers>1 the FTX files are parsed in a pool of worker processes
+        the records are returned in the order of the files in both cases
         '''
         lod=[]
         self.ftxParser=FTXParser(Tibkat.ftxroot)
         xmlFiles=self.ftxParser.ftxXmlFiles()
         xmlFiles=xmlFiles[:Tibkat.limitFiles]
-        progress=Progress(progressSteps=1,expectedTotal=len(xmlFiles),msg=f"parsing {len(xmlFiles)} TIBKAT FTX files",showMemory=True)
-        for xmlFile in xmlFiles:
-            for document in self.ftxParser.parse(xmlFile,local=True):
-                if self.isInWantedBkDocuments(document):
-                    rawEvent=document.asDict()
-                    TibkatEvent.postProcessLodRecord(rawEvent)
-                    lod.append(rawEvent)
-            progress.next()
+        workers=Tibkat.workers if Tibkat.workers is not None else 1
+        msg=f"parsing {len(xmlFiles)} TIBKAT FTX files"
+        if workers>1:
+            msg=f"{msg} with {workers} worker processes"
+        progress=Progress(progressSteps=1,expectedTotal=len(xmlFiles),msg=msg,showMemory=True)
+        if workers>1:
+            ftxroots=[Tibkat.ftxroot]*len(xmlFiles)
+            wantedbks=[Tibkat.wantedbks]*len(xmlFiles)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # map returns the results in the order of the xmlFiles
+                for fileLod in executor.map(TibkatEventManager.parseFtxFile,ftxroots,xmlFiles,wantedbks):
+                    lod.extend(fileLod)
+                    progress.next()
+        else:
+            for xmlFile in xmlFiles:
+                lod.extend(TibkatEventManager.parseFtxFile(Tibkat.ftxroot,xmlFile,Tibkat.wantedbks))
+                progress.next()
         progress.done()
         return lod
 
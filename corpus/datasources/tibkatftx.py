@@ -55,13 +55,15 @@ class FTXParser(object):
         files = [f for f in files if f.endswith(".xml")]
         return files
     
-    def parse(self,xmlFile,local:bool=True,progress:Progress=None)->Iterator[XmlEntity]:
+    def parse(self,xmlFile,local:bool=True,progress:Progress=None,compiled:bool=True,useLxml:bool=True)->Iterator[XmlEntity]:
         '''
           parse the xml data of  volume with the given collectionId
           
           Args:
             xmlFile(str): the file to process
             local(bool): True if the xmlFile name is a local file name
+            compiled(bool): if True use a precompiled property extractor
+            useLxml(bool): if True use lxml for parsing if it is available
         '''    
         recordTag="{http://www.openarchives.org/OAI/2.0/}document"
         namespaces={'ns0':'http://www.openarchives.org/OAI/2.0/',
@@ -115,8 +117,8 @@ class FTXParser(object):
         else:
             xmlPath=xmlFile
         if os.path.exists(xmlPath):
-            xmlParser=XMLEntityParser(xmlPath,recordTag)
-            for xmlEntity in xmlParser.parse(xmlPropertyMap,namespaces):
+            xmlParser=XMLEntityParser(xmlPath,recordTag,useLxml=useLxml)
+            for xmlEntity in xmlParser.parse(xmlPropertyMap,namespaces,compiled=compiled):
                 yield(xmlEntity)
                 if progress is not None:
                     progress.next()
@@ -7,7 +7,123 @@ import urllib.request
 from typing import Optional
 from urllib.request import build_opener, HTTPCookieProcessor
 from bs4 import BeautifulSoup, Tag
+from pathlib import Path
+import os
 import re
+import sqlite3
+import threading
+import time
+import zlib
+try:
+    import lxml.html as lxmlHtml
+except ImportError:
+    # fall back to BeautifulSoup with the standard library html.parser
+    lxmlHtml=None
+
+class ResponseCache(object):
+    '''
+    on disk SQLite cache of zlib compressed HTTP responses by url with their ETag and Last-Modified headers
+    '''
+
+    def __init__(self,cacheFile:str=None,ttl:float=None,offline:bool=False):
+        '''
+        constructor
+
+        Args:
+            cacheFile(str): the path of the SQLite database - if None ~/.conferencecorpus/webcache.db is used
+            ttl(float): the time in seconds a response is used without revalidation - None for no expiry, 0 to always revalidate
+            offline(bool): if True only replay cached responses and never access the network
+        '''
+        if cacheFile is None:
+            cacheFile=f"{Path.home()}/.conferencecorpus/webcache.db"
+        cacheDir=os.path.dirname(cacheFile)
+        if cacheDir and not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        self.cacheFile=cacheFile
+        self.ttl=ttl
+        self.offline=offline
+        self.lock=threading.Lock()
+        self.c=sqlite3.connect(cacheFile,check_same_thread=False)
+        self.c.execute("""CREATE TABLE IF NOT EXISTS response (
+  url TEXT PRIMARY KEY,
+  etag TEXT,
+  lastModified TEXT,
+  fetched REAL,
+  content BLOB
+)""")
+        self.c.commit()
+
+    def get(self,url:str)->dict:
+        '''
+        get the cached response for the given url
+
+        Args:
+            url(str): the url
+
+        Returns:
+            dict: the record with the etag, lastModified, fetched and the uncompressed content or None if the url is not cached
+        '''
+        with self.lock:
+            row=self.c.execute("SELECT etag,lastModified,fetched,content FROM response WHERE url=?",(url,)).fetchone()
+        if row is None:
+            return None
+        etag,lastModified,fetched,content=row
+        record={
+            "url": url,
+            "etag": etag,
+            "lastModified": lastModified,
+            "fetched": fetched,
+            "content": zlib.decompress(content)
+        }
+        return record
+
+    def isFresh(self,record:dict)->bool:
+        '''
+        check whether the given cached record may be used without revalidation
+        '''
+        if self.offline or self.ttl is None:
+            return True
+        return time.time()-record["fetched"]<self.ttl
+
+    def put(self,url:str,content:bytes,etag:str=None,lastModified:str=None):
+        '''
+        store the given response content for the given url
+
+        Args:
+            url(str): the url
+            content(bytes): the response body
+            etag(str): the ETag header of the response
+            lastModified(str): the Last-Modified header of the response
+        '''
+        with self.lock:
+            self.c.execute("INSERT OR REPLACE INTO response VALUES (?,?,?,?,?)",(url,etag,lastModified,time.time(),zlib.compress(content)))
+            self.c.commit()
+
+    def touch(self,url:str):
+        '''
+        mark the cached response of the given url as revalidated now
+        '''
+        with self.lock:
+            self.c.execute("UPDATE response SET fetched=? WHERE url=?",(time.time(),url))
+            self.c.commit()
+
+    def getConditionalHeaders(self,record:dict)->dict:
+        '''
+        get the headers for a conditional request to revalidate the given cached record
+        '''
+        headers={}
+        if record is not None:
+            if record["etag"]:
+                headers["If-None-Match"]=record["etag"]
+            if record["lastModified"]:
+                headers["If-Modified-Since"]=record["lastModified"]
+        return headers
+
+    def close(self):
+        '''
+        close the cache database
+        '''
+        self.c.close()
 
 class WebScrape(object):
     '''
@@ -21,7 +137,7 @@ class WebScrape(object):
     https://www.w3.org/MarkUp/2009/rdfa-for-html-authors
     '''
 
-    def __init__(self,debug:bool=False,showHtml:bool=False,timeout:float=20,agent='Mozilla/5.0'):
+    def __init__(self,debug:bool=False,showHtml:bool=False,timeout:float=20,agent='Mozilla/5.0',responseCache:ResponseCache=None,useLxml:bool=False):
         '''
         Constructor
         
@@ -30,6 +146,8 @@ class WebScrape(object):
             showHtml(bool): if True show the HTML retrieved
             timeout(float): the default timeout 
             agent(str): the agent to mimic
+            responseCache(ResponseCache): if set cache the responses and revalidate them with conditional requests
+            useLxml(bool): if True parse with lxml and XPath instead of BeautifulSoup if lxml is available
         '''
         self.err=None
         self.valid=False
@@ -37,6 +155,10 @@ class WebScrape(object):
         self.showHtml=showHtml
         self.timeout=timeout
         self.agent=agent
+        self.responseCache=responseCache
+        self.useLxml=useLxml and lxmlHtml is not None
+        # the lxml root element of the html parsed with useLxml
+        self.doc=None
         
     def findLinkForRegexp(self,regex:str):
         '''
@@ -50,13 +172,36 @@ class WebScrape(object):
         '''
         m=None
         text=None
-        link=self.soup.find('a',href=re.compile(regex))
-        if link:
-            href=link['href']
+        if self.useLxml:
+            link=self.findLinkWithLxml(regex)
+        else:
+            link=self.soup.find('a',href=re.compile(regex))
+        if link is not None:
+            if self.useLxml:
+                href=link.get('href')
+                text=link.text_content()
+            else:
+                href=link['href']
+                if hasattr(link, "text"):
+                    text=link.text 
             m=re.match(regex,href)    
-            if hasattr(link, "text"):
-                text=link.text 
         return m,text
+    
+    def findLinkWithLxml(self,regex:str):
+        '''
+        find the first link with a href matching the given regular expression in my lxml document
+        
+        Args:
+            regex(str): the regular expression to search in the href
+            
+        Return:
+            the lxml element of the link or None
+        '''
+        pattern=re.compile(regex)
+        for link in self.doc.iterfind('.//a[@href]'):
+            if pattern.search(link.get('href')):
+                return link
+        return None
 
     def findLinkByPrefixLabel(self, prefix: str) -> Optional[str]:
         """
@@ -68,12 +213,34 @@ class WebScrape(object):
             str: url
             None: If the prefix was not found
         """
+        if self.useLxml:
+            return self.findLinkByPrefixLabelWithLxml(prefix)
         element = self.soup.find(string=re.compile(prefix))
         if element and element.next_sibling:
             a_tag = element.next_sibling
             if isinstance(a_tag, Tag) and a_tag.name == "a":
                 return a_tag.attrs.get("href", None)
         return None
+    
+    def findLinkByPrefixLabelWithLxml(self, prefix: str) -> Optional[str]:
+        '''
+        lxml version of findLinkByPrefixLabel
+        
+        the text nodes of lxml are the text of an element followed by its first child
+        and the tail of an element followed by its next sibling
+        '''
+        pattern=re.compile(prefix)
+        for textNode in self.doc.xpath("//text()"):
+            if pattern.search(textNode):
+                parent=textNode.getparent()
+                if textNode.is_tail:
+                    nextNode=parent.getnext()
+                else:
+                    nextNode=parent[0] if len(parent)>0 else None
+                if nextNode is not None and nextNode.tag=="a":
+                    return nextNode.get("href")
+                return None
+        return None
 
         
     def fromTag(self,soup,tag,attr=None,value=None):
@@ -101,6 +268,21 @@ class WebScrape(object):
         else:
             return None
         
+    def getText(self,tag:str)->Optional[str]:
+        '''
+        get the text of the first element with the given tag of the html parsed last
+        
+        Args:
+           tag(str): the tag to search
+           
+        Return:
+            str: the text or None if there is no such element
+        '''
+        if self.useLxml:
+            node=next(self.doc.iter(tag),None)
+            return node.text_content() if node is not None else None
+        return self.fromTag(self.soup, tag)
+    
     def getSoup(self,url:str,showHtml:bool=False)->BeautifulSoup:
         '''
         get the beautiful Soup parser 
@@ -112,11 +294,56 @@ class WebScrape(object):
         Return:
             BeautifulSoup: the html parser
         '''
-        req=urllib.request.Request(url,headers={'User-Agent': f'{self.agent}'})
+        html=self.getHtml(url)
+        return self.getSoupFromHtml(html, showHtml)
+
+    def getHtml(self,url:str)->bytes:
+        '''
+        get the html of the given url - from my response cache if available
+
+        Args:
+           url(str): the url to open
+
+        Return:
+            bytes: the html code
+        '''
+        cache=self.responseCache
+        record=cache.get(url) if cache is not None else None
+        if record is not None and cache.isFresh(record):
+            return record["content"]
+        if cache is not None and cache.offline:
+            raise urllib.error.URLError(f"{url} is not available in the offline response cache")
+        headers={'User-Agent': f'{self.agent}'}
+        if cache is not None:
+            headers.update(cache.getConditionalHeaders(record))
+        req=urllib.request.Request(url,headers=headers)
         # handle cookies
         opener = build_opener(HTTPCookieProcessor())
-        response = opener.open(req,timeout=self.timeout)
+        try:
+            response = opener.open(req,timeout=self.timeout)
+        except urllib.error.HTTPError as herr:
+            if herr.code==304 and record is not None:
+                if self.debug:
+                    print(f"{url} not modified")
+                cache.touch(url)
+                return record["content"]
+            raise herr
         html = response.read()
+        if cache is not None:
+            cache.put(url, html, etag=response.headers.get("ETag"), lastModified=response.headers.get("Last-Modified"))
+        return html
+    
+    def getSoupFromHtml(self,html,showHtml:bool=False)->BeautifulSoup:
+        '''
+        get the beautiful Soup parser for the given already retrieved html
+        
+        Args:
+           html(bytes): the html code
+           showHtml(boolean): True if the html code should be pretty printed and shown
+           
+        Return:
+            BeautifulSoup: the html parser
+        '''
         soup = BeautifulSoup(html, 'html.parser', from_encoding='utf-8')  
         if showHtml:
             self.printPrettyHtml(soup)
@@ -164,27 +391,99 @@ class WebScrape(object):
         '''
         triples=[]    
         try:
-            self.soup=self.getSoup(url, self.showHtml)         
-            subjectNodes = self.soup.find_all(True, {'typeof' : True})
-            for subjectNode in subjectNodes:
-                subject=subjectNode.attrs['typeof']
-                if self.debug:
-                    print(subjectNode)
-                for predicateNode in subjectNode.find_all():
-                    value=None 
-                    name=None
-                    if 'content' in predicateNode.attrs:
-                        value=predicateNode.attrs['content']
-                    else:
-                        value=predicateNode.get_text()    
-                    if 'property' in predicateNode.attrs:
-                        name=predicateNode.attrs['property'] 
-                    if name is not None and value is not None:
-                        triples.append((subject,name,value))
-            self.valid=True
+            html=self.getHtml(url)
+            triples=self.parseRDFaHtml(html)
         except urllib.error.HTTPError as herr:
             self.err=herr
         except urllib.error.URLError as terr:
             self.err=terr
         return triples    
-    
\ No newline at end of file
+    
+    def parseRDFaHtml(self,html)->list:
+        '''
+        rudimentary RDFa parsing of already retrieved html
+        
+        Args:
+           html(bytes): the html code
+           
+        Return:
+            list: the list of (subject,predicate,object) triples
+        '''
+        if self.useLxml:
+            self.doc=self.getLxmlDoc(html, self.showHtml)
+            triples=self.getRDFaTriplesWithLxml(self.doc)
+        else:
+            self.soup=self.getSoupFromHtml(html, self.showHtml)
+            triples=self.getRDFaTriples(self.soup)
+        self.valid=True
+        return triples
+    
+    def getLxmlDoc(self,html,showHtml:bool=False):
+        '''
+        get the lxml root element for the given html
+        
+        Args:
+           html(bytes): the html code
+           showHtml(boolean): True if the html code should be pretty printed and shown
+           
+        Return:
+            the lxml root element
+        '''
+        if isinstance(html,str):
+            html=html.encode("utf-8")
+        parser=lxmlHtml.HTMLParser(encoding="utf-8")
+        doc=lxmlHtml.fromstring(html,parser=parser)
+        if showHtml:
+            print(lxmlHtml.tostring(doc,pretty_print=True,encoding="unicode"))
+        return doc
+    
+    def getRDFaTriplesWithLxml(self,doc)->list:
+        '''
+        get the RDFa triples from the given lxml document with XPath
+        
+        only the descendants with a property attribute of the subject nodes are visited
+        
+        Args:
+           doc: the lxml root element
+           
+        Return:
+            list: the list of (subject,predicate,object) triples
+        '''
+        triples=[]
+        for subjectNode in doc.xpath("//*[@typeof]"):
+            subject=subjectNode.get('typeof')
+            for predicateNode in subjectNode.xpath(".//*[@property]"):
+                value=predicateNode.get('content')
+                if value is None:
+                    value=predicateNode.text_content()
+                triples.append((subject,predicateNode.get('property'),value))
+        return triples
+    
+    def getRDFaTriples(self,soup)->list:
+        '''
+        get the RDFa triples from the given soup
+        
+        Args:
+           soup(BeautifulSoup): the parser to work with
+           
+        Return:
+            list: the list of (subject,predicate,object) triples
+        '''
+        triples=[]
+        subjectNodes = soup.find_all(True, {'typeof' : True})
+        for subjectNode in subjectNodes:
+            subject=subjectNode.attrs['typeof']
+            if self.debug:
+                print(subjectNode)
+            for predicateNode in subjectNode.find_all():
+                value=None 
+                name=None
+                if 'content' in predicateNode.attrs:
+                    value=predicateNode.attrs['content']
+                else:
+                    value=predicateNode.get_text()    
+                if 'property' in predicateNode.attrs:
+                    name=predicateNode.attrs['property'] 
+                if name is not None and value is not None:
+                    triples.append((subject,name,value))
+        return triples
@@ -6,12 +6,14 @@ Created on 2021-07-31
 
 from corpus.event import EventStorage,EventSeriesManager, EventSeries, Event, EventManager
 from lodstorage.storageconfig import StorageConfig
+from lodstorage.lod import LOD
 import corpus.datasources.wikicfpscrape
 from corpus.eventcorpus import EventDataSource, EventDataSourceConfig
 from corpus.quality.rating import Rating, RatingType
 from datetime import datetime
 from corpus.datasources import wikicfpscrape
 from plp.ordinal import Ordinal
+import sqlite3
 
 class WikiCfp(EventDataSource):
     '''
@@ -29,6 +31,87 @@ class WikiCfp(EventDataSource):
         jsonEventCache=WikiCfpEventManager(config=config)
         jsonEventSeriesCache=WikiCfpEventSeriesManager(config=config)
         self.wikiCfpScrape=corpus.datasources.wikicfpscrape.WikiCfpScrape(jsonEventCache,jsonEventSeriesCache)
+        
+    def getManager(self,crawlType:wikicfpscrape.CrawlType):
+        '''
+        get my SQL cache manager for the given crawlType
+        '''
+        if crawlType.value is wikicfpscrape.CrawlType.EVENT.value:
+            return self.eventManager
+        return self.eventSeriesManager
+        
+    def getMaxWikiCfpId(self,crawlType:wikicfpscrape.CrawlType=wikicfpscrape.CrawlType.EVENT)->int:
+        '''
+        get the highest wikiCfpId in my SQL cache e.g. event_wikicfp
+        
+        Args:
+            crawlType(CrawlType): Event or Series
+            
+        Returns:
+            int: the highest known id or None if the table is not available
+        '''
+        manager=self.getManager(crawlType)
+        sqlDB=manager.getSQLDB(manager.getCacheFile(config=manager.config))
+        try:
+            lod=sqlDB.query(f"SELECT MAX(wikiCfpId) AS maxId FROM {manager.tableName}")
+        except sqlite3.OperationalError:
+            return None
+        return lod[0]["maxId"]
+    
+    def deltaUpdate(self,crawler:wikicfpscrape.AsyncWikiCfpCrawler=None,crawlType:wikicfpscrape.CrawlType=wikicfpscrape.CrawlType.EVENT,window:int=40,stride:int=1000)->list:
+        '''
+        crawl the ids above the highest wikiCfpId of my SQL cache and merge
+        the new records into the json batch files and the SQL cache
+        
+        Args:
+            crawler(AsyncWikiCfpCrawler): the crawler to use - if None a default crawler is used
+            crawlType(CrawlType): Event or Series
+            window(int): the number of ids that need to be deleted to assume the end of the ids
+            stride(int): the initial distance of the galloping probes
+            
+        Returns:
+            list: the list of new records that have been added to the SQL cache
+        '''
+        knownId=self.getMaxWikiCfpId(crawlType)
+        if knownId is None:
+            raise Exception(f"no cached WikiCFP {crawlType.value} records - a full crawl is needed first")
+        if crawler is None:
+            crawler=wikicfpscrape.AsyncWikiCfpCrawler(self.wikiCfpScrape)
+        rawEvents=crawler.deltaCrawl(crawlType, knownId, window=window, stride=stride)
+        lod=[]
+        for rawEvent in rawEvents:
+            if self.wikiCfpScrape.isValidRecord(rawEvent):
+                record=dict(rawEvent)
+                if record.get("startDate",None) is not None:
+                    record["year"]=record["startDate"].year
+                lod.append(record)
+        manager=self.getManager(crawlType)
+        manager.postProcessLodRecords(lod)
+        sqlDB=manager.getSQLDB(manager.getCacheFile(config=manager.config))
+        # only the columns of the existing table can be appended to
+        columns=[column["name"] for column in sqlDB.query(f"PRAGMA table_info({manager.tableName})")]
+        lod=[{column:record[column] for column in columns if column in record} for record in lod]
+        if manager.handleInvalidListTypes:
+            LOD.handleListTypes(lod=lod,doFilter=manager.filterInvalidListTypes,separator=manager.listSeparator)
+        placeholders=",".join(["?"]*len(columns))
+        insertCmd=f"INSERT INTO {manager.tableName} ({','.join(columns)}) VALUES ({placeholders})"
+        rows=[tuple(record.get(column) for column in columns) for record in lod]
+        with EventStorage.writeLock:
+            connection=sqlDB.c
+            connection.commit()
+            try:
+                # delete and append in a single transaction to make the update idempotent
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute(f"DELETE FROM {manager.tableName} WHERE wikiCfpId>?",(knownId,))
+                connection.executemany(insertCmd,rows)
+                connection.commit()
+            except Exception as ex:
+                connection.rollback()
+                raise ex
+            EventStorage.updateTableMetadata([manager.tableName], sqlDB=sqlDB)
+        # the merged json cache is rebuilt from the batch files on the next forced update
+        self.wikiCfpScrape.getManager(crawlType).removeCacheFile()
+        return lod
     
 class WikiCfpEvent(Event):
     '''
@@ -150,9 +233,8 @@ class WikiCfpEventManager(EventManager):
         '''
         lod = []
         if  hasattr(self, "dataSource"):
-            jsonEm=self.dataSource.wikiCfpScrape.cacheToJsonManager(corpus.datasources.wikicfpscrape.CrawlType.EVENT) 
-            for event in jsonEm.events:
-                lod.append(event.__dict__)
+            # read the records directly without instantiating entities per json file
+            lod=self.dataSource.wikiCfpScrape.getListOfDicts(corpus.datasources.wikicfpscrape.CrawlType.EVENT)
             self.postProcessLodRecords(lod)
         return lod    
 
@@ -180,8 +262,7 @@ class WikiCfpEventSeriesManager(EventSeriesManager):
         '''
         lod = []
         if  hasattr(self, "dataSource"):
-            jsonEm=self.dataSource.wikiCfpScrape.cacheToJsonManager(corpus.datasources.wikicfpscrape.CrawlType.SERIES)
-            for series in jsonEm.series:
-                lod.append(series.__dict__)
+            # read the records directly without instantiating entities per json file
+            lod=self.dataSource.wikiCfpScrape.getListOfDicts(corpus.datasources.wikicfpscrape.CrawlType.SERIES)
             self.postProcessLodRecords(lod)
         return lod    
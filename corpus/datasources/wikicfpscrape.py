@@ -14,12 +14,16 @@ Created on 2020-08-20
   @copyright:  2020-2021 TIB Hannover, Wolfgang Fahl. All rights reserved.
 
 """
-from corpus.datasources.webscrape import WebScrape
+from corpus.datasources.webscrape import WebScrape, ResponseCache
 from corpus.event import EventStorage,EventManager, EventSeriesManager
+import asyncio
+import aiohttp
 import datetime
 from enum import Enum
 import glob
+import json
 import re
+import sqlite3
 import os
 import sys
 import threading
@@ -28,8 +32,13 @@ from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
 #from lodstorage.jsonpicklemixin import JsonPickleMixin
 from lodstorage.storageconfig import StorageConfig
-import corpus.datasources.wikicfp as wcfp
 #import jsonpickle
+try:
+    import orjson
+    jsonLoads=orjson.loads
+except ImportError:
+    # fall back to the standard library json parser
+    jsonLoads=json.loads
 
 class CrawlType(Enum):
     '''
@@ -122,13 +131,184 @@ class CrawlBatch(object):
         '''
         text=f"WikiCFP {self.crawlType.value} IDs {self.startId} - {self.stopId} ({self.threads} threads of {self.batchSize} IDs each)"
         return text
- 
+
+    def getIds(self)->range:
+        '''
+        get the range of ids of this batch in crawl order
+        '''
+        return range(int(self.startId), int(self.stopId+self.step), self.step)
+
+class CrawlJournal(object):
+    '''
+    persistent SQLite journal of the crawl status of each WikiCFP id
+
+    allows to resume an interrupted crawl by fetching only the ids that are
+    missing or failed - the raw events of successfully crawled ids are kept in
+    the journal so that the batch json file can be written once the batch is complete
+    '''
+    STATUS_OK="ok"
+    STATUS_DELETED="deleted"
+    STATUS_500="500"
+    STATUS_TIMEOUT="timeout"
+    # other HTTP errors e.g. 404
+    STATUS_ERROR="error"
+    # status of ids that need not be fetched again
+    doneStates=[STATUS_OK,STATUS_DELETED]
+    # status of ids that are final for writing the batch json file
+    finalStates=[STATUS_OK,STATUS_DELETED,STATUS_500,STATUS_ERROR]
+
+    def __init__(self,dbFile:str,flushSize:int=50):
+        '''
+        constructor
+
+        Args:
+            dbFile(str): the path of the SQLite database file
+            flushSize(int): the number of records after which the journal is committed
+        '''
+        self.dbFile=dbFile
+        self.flushSize=flushSize
+        self.pending=0
+        self.lock=threading.Lock()
+        self.c=sqlite3.connect(dbFile,check_same_thread=False)
+        self.c.execute("""CREATE TABLE IF NOT EXISTS crawl_journal (
+  crawlType TEXT NOT NULL,
+  wikiCfpId INTEGER NOT NULL,
+  status TEXT NOT NULL,
+  record TEXT,
+  updated TEXT,
+  PRIMARY KEY (crawlType,wikiCfpId)
+)""")
+        self.c.commit()
+
+    @staticmethod
+    def encodeValue(value):
+        '''
+        json encoding of the date and datetime values of a raw event - the marker keeps the type
+        '''
+        # datetime is a subclass of date
+        if isinstance(value,datetime.datetime):
+            return {"__datetime__":value.isoformat()}
+        if isinstance(value,datetime.date):
+            return {"__date__":value.isoformat()}
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+    @staticmethod
+    def decodeValue(record:dict):
+        '''
+        json decoding of the date and datetime values of a raw event
+        '''
+        if "__datetime__" in record:
+            return datetime.datetime.fromisoformat(record["__datetime__"])
+        if "__date__" in record:
+            return datetime.date.fromisoformat(record["__date__"])
+        return record
+
+    def record(self,crawlType:CrawlType,cfpId:int,status:str,rawEvent:dict=None):
+        '''
+        record the status of the given id - the journal is committed every flushSize records
+
+        Args:
+            crawlType(CrawlType): the type of the crawl
+            cfpId(int): the WikiCFP id
+            status(str): the crawl status e.g. ok, deleted, 500 or timeout
+            rawEvent(dict): the raw event or series for the done states
+        '''
+        recordJson=json.dumps(rawEvent,default=CrawlJournal.encodeValue) if rawEvent is not None else None
+        updated=datetime.datetime.now().isoformat()
+        with self.lock:
+            self.c.execute("INSERT OR REPLACE INTO crawl_journal VALUES (?,?,?,?,?)",(crawlType.value,cfpId,status,recordJson,updated))
+            self.pending+=1
+            if self.pending>=self.flushSize:
+                self.c.commit()
+                self.pending=0
+
+    def recordRawEvent(self,crawlType:CrawlType,cfpId:int,rawEvent:dict):
+        '''
+        record the given fetched raw event with status ok or deleted
+        '''
+        status=CrawlJournal.STATUS_DELETED if rawEvent.get("deleted",False) else CrawlJournal.STATUS_OK
+        self.record(crawlType, cfpId, status, rawEvent)
+
+    def flush(self):
+        '''
+        commit the pending records
+        '''
+        with self.lock:
+            self.c.commit()
+            self.pending=0
+
+    def close(self):
+        '''
+        flush and close the journal
+        '''
+        self.flush()
+        self.c.close()
+
+    def getStates(self,crawlBatch:CrawlBatch)->dict:
+        '''
+        get the recorded status of the ids of the given batch
+
+        Args:
+            crawlBatch(CrawlBatch): the batch to get the status for
+
+        Returns:
+            dict: the status by WikiCFP id
+        '''
+        minId=min(crawlBatch.startId,crawlBatch.stopId)
+        maxId=max(crawlBatch.startId,crawlBatch.stopId)
+        with self.lock:
+            rows=self.c.execute("SELECT wikiCfpId,status FROM crawl_journal WHERE crawlType=? AND wikiCfpId BETWEEN ? AND ?",(crawlBatch.crawlType.value,minId,maxId)).fetchall()
+        states={cfpId:status for cfpId,status in rows}
+        return states
+
+    def getTodoIds(self,crawlBatch:CrawlBatch)->list:
+        '''
+        get the ids of the given batch that are missing in the journal or failed
+
+        Args:
+            crawlBatch(CrawlBatch): the batch to check
+
+        Returns:
+            list: the ids to (re)fetch in crawl order
+        '''
+        states=self.getStates(crawlBatch)
+        todoIds=[cfpId for cfpId in crawlBatch.getIds() if states.get(cfpId) not in CrawlJournal.doneStates]
+        return todoIds
+
+    def isComplete(self,crawlBatch:CrawlBatch)->bool:
+        '''
+        check whether all ids of the given batch have a final status
+        '''
+        states=self.getStates(crawlBatch)
+        for cfpId in crawlBatch.getIds():
+            if states.get(cfpId) not in CrawlJournal.finalStates:
+                return False
+        return True
+
+    def getRawEvents(self,crawlBatch:CrawlBatch)->list:
+        '''
+        get the recorded raw events of the given batch
+
+        Args:
+            crawlBatch(CrawlBatch): the batch to get the raw events for
+
+        Returns:
+            list: the raw events in crawl order
+        '''
+        minId=min(crawlBatch.startId,crawlBatch.stopId)
+        maxId=max(crawlBatch.startId,crawlBatch.stopId)
+        order="ASC" if crawlBatch.step>0 else "DESC"
+        with self.lock:
+            rows=self.c.execute(f"SELECT record FROM crawl_journal WHERE crawlType=? AND wikiCfpId BETWEEN ? AND ? AND record IS NOT NULL ORDER BY wikiCfpId {order}",(crawlBatch.crawlType.value,minId,maxId)).fetchall()
+        rawEvents=[json.loads(recordJson,object_hook=CrawlJournal.decodeValue) for recordJson, in rows]
+        return rawEvents
+
 class WikiCfpScrape(object):
     '''
     support events from http://www.wikicfp.com/cfp/
     '''
 
-    def __init__(self,jsonEventManager,jsonEventSeriesManager,profile:bool=True,debug:bool=False,jsondir:str=None,limit=200000,batchSize=1000,showProgress=True):
+    def __init__(self,jsonEventManager,jsonEventSeriesManager,profile:bool=True,debug:bool=False,jsondir:str=None,limit=200000,batchSize=1000,showProgress=True,responseCache:ResponseCache=None):
         '''
         Constructor
         
@@ -138,6 +318,7 @@ class WikiCfpScrape(object):
             limit(int): maximum number of entries to be crawled
             batchSize(int): default size of batches
             showProgress(bool): if True show Progress
+            responseCache(ResponseCache): if set use the given cache for the HTTP responses of the crawl
         '''
         self.debug=debug
         self.limit=limit
@@ -150,6 +331,7 @@ class WikiCfpScrape(object):
             "Series": jsonEventSeriesManager
         }
         self.profile=profile
+        self.responseCache=responseCache
         if jsondir is not None:
             self.jsondir=jsondir
         else:
@@ -199,52 +381,108 @@ class WikiCfpScrape(object):
         '''
         # crawling is not done on startup but need to be done
         # in command line mode ... we just collect the json crawl result files here
-        #self.crawl(startId=startId,stopId=stopId)
         jsonEm=self.getManager(crawlType)
-        entityList=jsonEm.getList()
         startTime=time.time()
         jsonFiles=self.jsonFiles(crawlType)
         if len(jsonFiles)==0:
             if self.profile or self.debug:
                 print(f"No wikiCFP crawl json backups for {crawlType.value} available")
         else:
-            # loop over all crawled files
-            for jsonFilePath in jsonFiles:
-                config=StorageConfig.getJSON(debug=self.debug)
-                config.cacheFile=jsonFilePath
-                if crawlType.value is CrawlType.EVENT.value:
-                    batchEm=EventManager(name=jsonFilePath,clazz=jsonEm.clazz,config=config)
-                elif crawlType.value is CrawlType.SERIES.value:
-                    batchEm=EventSeriesManager(name=jsonFilePath,clazz=jsonEm.clazz,config=config)
-                # legacy mode -file were created before ORM Mode
-                # was available - TODO: make new files available in ORM mode with jsonable
-                #jsonPickleEm=JsonPickleMixin.readJsonPickle(jsonFileName=jsonFilePath,extension='.json')
-                #jsonPickleEvents=jsonPickleEm['events']
-                #if self.showProgress:
-                #    print("%4d: %s" % (len(jsonPickleEvents),jsonFilePath))
-                batchEm.fromStore(cacheFile=jsonFilePath)
-                for entity in batchEm.getList():
-                    if hasattr(entity, "startDate"):
-                        if entity.startDate is not None:
-                            entity.year=entity.startDate.year  
-                    doAdd=not(entity.deleted)
-                    # SPAM Filter
-                    if hasattr(entity, "locality"):
-                        if entity.locality.startswith("1"):
-                            doAdd=False
-                    # Series Filter
-                    if hasattr(entity, "title"):
-                        if entity.title.startswith("WikiCFP : Call For Papers of Conferences, Workshops and Journals"):
-                            doAdd=False
-                    
-                    if doAdd:
-                        entityList.append(entity)
+            lod=list(self.iterBatchRecords(crawlType, jsonFiles))
+            jsonEm.fromLoD(lod,append=True)
             if self.profile:
                 elapsed=time.time()-startTime
-                print (f"read {len(entityList)} {crawlType.value} records in {elapsed:5.1f} s")
+                print (f"read {len(jsonEm.getList())} {crawlType.value} records in {elapsed:5.1f} s")
             if withStore:
                 jsonEm.store(limit=self.limit,batchSize=self.batchSize)
         return jsonEm
+    
+    def getDateFields(self,crawlType:CrawlType)->list:
+        '''
+        get the fields that are restored as datetime values from the json files of the given crawlType
+        
+        Args:
+            crawlType(CrawlType): the CrawlType to get the date fields for
+            
+        Returns:
+            list: the names of the fields that have datetime values in the samples of the entity class
+        '''
+        clazz=self.getManager(crawlType).clazz
+        dateFields=[]
+        for sample in clazz.getSamples():
+            for key,value in sample.items():
+                if isinstance(value,datetime.date) and key not in dateFields:
+                    dateFields.append(key)
+        return dateFields
+    
+    def readRecords(self,jsonFilePath:str,crawlType:CrawlType,dateFields:list=None):
+        '''
+        read the records of the given json file without instantiating entities 
+        
+        Args:
+            jsonFilePath(str): the path of the json file
+            crawlType(CrawlType): the CrawlType of the records
+            dateFields(list): the fields to convert to datetime - if None use getDateFields
+            
+        Returns:
+            generator: the valid records with the date fields converted and the year set
+        '''
+        if dateFields is None:
+            dateFields=self.getDateFields(crawlType)
+        listName=self.getManager(crawlType).listName
+        with open(jsonFilePath,"rb") as jsonFile:
+            jsonData=jsonLoads(jsonFile.read())
+        records=jsonData[listName] if isinstance(jsonData,dict) else jsonData
+        for record in records:
+            if not self.isValidRecord(record):
+                continue
+            for dateField in dateFields:
+                value=record.get(dateField,None)
+                if isinstance(value,str):
+                    record[dateField]=datetime.datetime.fromisoformat(value)
+            startDate=record.get("startDate",None)
+            if startDate is not None:
+                record["year"]=startDate.year
+            yield record
+    
+    def iterBatchRecords(self,crawlType:CrawlType,jsonFiles:list=None):
+        '''
+        stream the valid records of all crawl batch files of the given crawlType 
+        
+        Args:
+            crawlType(CrawlType): the CrawlType to get the records for
+            jsonFiles(list): the json files to read - if None use jsonFiles
+            
+        Returns:
+            generator: the records in the order of the batch files
+        '''
+        if jsonFiles is None:
+            jsonFiles=self.jsonFiles(crawlType)
+        dateFields=self.getDateFields(crawlType)
+        for jsonFilePath in jsonFiles:
+            yield from self.readRecords(jsonFilePath, crawlType, dateFields)
+            
+    def getListOfDicts(self,crawlType:CrawlType)->list:
+        '''
+        get the list of dicts of the given crawlType for the SQL cache 
+        
+        Args:
+            crawlType(CrawlType): the CrawlType to get the records for
+            
+        Returns:
+            list: the records of the merged json cache if available otherwise of the crawl batch files
+        '''
+        jsonEm=self.getManager(crawlType)
+        startTime=time.time()
+        if jsonEm.isCached():
+            jsonFiles=[jsonEm.getCacheFile(config=jsonEm.config,mode=jsonEm.config.mode)]
+        else:
+            jsonFiles=self.jsonFiles(crawlType)
+        lod=list(self.iterBatchRecords(crawlType, jsonFiles))
+        if self.profile:
+            elapsed=time.time()-startTime
+            print (f"read {len(lod)} {crawlType.value} records from {len(jsonFiles)} json files in {elapsed:5.1f} s")
+        return lod
         
     def jsonFiles(self,crawlType:CrawlType)->list:  
         '''
@@ -254,9 +492,13 @@ class WikiCfpScrape(object):
             crawlType(CrawlType): the tpe of the files
             
         Return:
-            list: a list of json file names
+            list: a list of json file names sorted by start id
         '''
-        jsonFiles=sorted(glob.glob(f"{self.jsondir}/wikicfp_{crawlType.value}*.json"),key=lambda path:int(re.findall(r'\d+',path)[0]))
+        prefix=f"wikicfp_{crawlType.value}"
+        # the start id directly follows the prefix of the file name see getJsonFileName
+        def startId(path:str)->int:
+            return int(os.path.basename(path)[len(prefix):].split("-")[0])
+        jsonFiles=sorted(glob.glob(f"{self.jsondir}/{prefix}*.json"),key=startId)
         return jsonFiles    
         
     def getJsonFileName(self,crawlBatch):
@@ -285,6 +527,8 @@ class WikiCfpScrape(object):
         jsonFilepath=self.getJsonFileName(crawlBatch)
         config=EventStorage.getStorageConfig(debug=self.debug, mode="json")
         config.cacheFile=jsonFilepath
+        # import here to avoid a circular import - wikicfp uses CrawlType at class definition time
+        import corpus.datasources.wikicfp as wcfp
         crawlType=crawlBatch.crawlType
         print(f"CrawlBatch has crawlType {type(crawlType)}{crawlType}/{crawlType.value}")
         if crawlType.value is CrawlType.EVENT.value:
@@ -295,63 +539,196 @@ class WikiCfpScrape(object):
             raise Exception(f"Invalid crawlType {crawlType}")
         return batchEm
         
-    def crawl(self,crawlBatch:CrawlBatch):
+    def getCrawlJournal(self,flushSize:int=50)->CrawlJournal:
+        '''
+        get the crawl journal in my json directory
+        
+        Args:
+            flushSize(int): the number of records after which the journal is committed
+            
+        Returns:
+            CrawlJournal: the journal
+        '''
+        journal=CrawlJournal(f"{self.jsondir}/wikicfp_crawl.db",flushSize=flushSize)
+        return journal
+    
+    def storeBatch(self,crawlBatch:CrawlBatch,rawEvents:list):
+        '''
+        store the given raw events to the json file of the given batch
+        
+        Args:
+            crawlBatch(CrawlBatch): the batch that has been crawled
+            rawEvents(list): the raw events or series in crawl order
+            
+        Returns:
+            EntityManager: the batch entity manager
+        '''
+        import corpus.datasources.wikicfp as wcfp
+        batchEm=self.getBatchEntityManager(crawlBatch)
+        for rawEvent in rawEvents:
+            if crawlBatch.crawlType.value is CrawlType.EVENT.value:
+                entity=wcfp.WikiCfpEvent()
+            else:
+                entity=wcfp.WikiCfpEventSeries()
+            entity.fromDict(rawEvent)
+            batchEm.getList().append(entity)
+        batchEm.store()
+        return batchEm
+    
+    def isValidRecord(self,record:dict)->bool:
+        '''
+        check whether the given crawled record should be part of the corpus
+        
+        Args:
+            record(dict): the raw event or series record
+            
+        Returns:
+            bool: False for deleted records, locality spam and the WikiCFP default title of unknown series
+        '''
+        if record.get("deleted",False):
+            return False
+        # SPAM Filter
+        locality=record.get("locality",None)
+        if locality is not None and locality.startswith("1"):
+            return False
+        # Series Filter
+        title=record.get("title",None)
+        if title is not None and title.startswith("WikiCFP : Call For Papers of Conferences, Workshops and Journals"):
+            return False
+        return True
+    
+    def getAlignedBatches(self,crawlType:CrawlType,startId:int,stopId:int,batchSize:int=1000)->list:
+        '''
+        get the json file batches of batchSize ids as used by scripts/crawlWikiCFP that cover the given id range
+        
+        Args:
+            crawlType(CrawlType): the type of the crawl
+            startId(int): the lowest id of the range
+            stopId(int): the highest id of the range
+            batchSize(int): the number of ids per batch file
+            
+        Returns:
+            list: the list of CrawlBatches
+        '''
+        crawlBatches=[]
+        for base in range(startId//batchSize,stopId//batchSize+1):
+            crawlBatch=CrawlBatch(1,base*batchSize,base*batchSize+batchSize-1,crawlType.value)
+            crawlBatches.append(crawlBatch)
+        return crawlBatches
+    
+    def mergeBatch(self,crawlBatch:CrawlBatch,rawEvents:list):
+        '''
+        merge the given raw events into the json file of the given batch replacing
+        the records with the same wikiCfpId - existing records without wikiCfpId are dropped
+        
+        Args:
+            crawlBatch(CrawlBatch): the batch to merge into
+            rawEvents(list): the raw events or series to merge
+            
+        Returns:
+            EntityManager: the batch entity manager
+        '''
+        recordsById={}
+        jsonFilePath=self.getJsonFileName(crawlBatch)
+        if os.path.isfile(jsonFilePath):
+            batchEm=self.getBatchEntityManager(crawlBatch)
+            batchEm.fromStore(cacheFile=jsonFilePath)
+            for entity in batchEm.getList():
+                record=entity.__dict__
+                # records without id can not be merged
+                if "wikiCfpId" in record:
+                    recordsById[record["wikiCfpId"]]=record
+        for rawEvent in rawEvents:
+            recordsById[rawEvent["wikiCfpId"]]=rawEvent
+        records=sorted(recordsById.values(),key=lambda record:record["wikiCfpId"])
+        return self.storeBatch(crawlBatch, records)
+    
+    def finishBatch(self,crawlBatch:CrawlBatch,journal:CrawlJournal):
+        '''
+        flush the journal and write the batch json file from it if the batch is complete
+        
+        Args:
+            crawlBatch(CrawlBatch): the batch that has been crawled
+            journal(CrawlJournal): the journal of the crawl
+            
+        Returns:
+            EntityManager: the batch entity manager or None if there are ids left to fetch
+        '''
+        journal.flush()
+        if not journal.isComplete(crawlBatch):
+            todoIds=journal.getTodoIds(crawlBatch)
+            print(f"{crawlBatch} incomplete - {len(todoIds)} ids left to resume")
+            return None
+        return self.storeBatch(crawlBatch, journal.getRawEvents(crawlBatch))
+        
+    def crawl(self,crawlBatch:CrawlBatch,journal:CrawlJournal=None):
         '''
         see https://github.com/TIBHannover/confIDent-dataScraping/blob/master/wikicfp.py
         
         Args:
             crawlBatch(CrawlBatch): the batch to crawl
+            journal(CrawlJournal): if set only fetch the ids that are missing or failed in the journal and record the results
+            
+        Returns:
+            EntityManager: the batch entity manager or None if the journal shows ids left to fetch
         '''
        
         print(f'crawling {crawlBatch}')
-        batchEm=self.getBatchEntityManager(crawlBatch)
- 
-        # get all ids
         crawlType=crawlBatch.crawlType
-        for eventId in range(int(crawlBatch.startId), int(crawlBatch.stopId+1), crawlBatch.step):
-            wEvent=WikiCfpEventFetcher(crawlType=crawlType)
+        if journal is None:
+            cfpIds=crawlBatch.getIds()
+        else:
+            cfpIds=journal.getTodoIds(crawlBatch)
+        rawEvents=[]
+        for eventId in cfpIds:
+            wEvent=WikiCfpEventFetcher(crawlType=crawlType,responseCache=self.responseCache)
             retry=1
             maxRetries=3
             retrievedResult=False
+            title=None
             while not retrievedResult:
                 try:
                     rawEvent=wEvent.fromEventId(eventId)
                     if crawlType.value is CrawlType.EVENT.value:
-                        event=wcfp.WikiCfpEvent()
-                        event.fromDict(rawEvent)
-                        title="? deleted: %r" %event.deleted if not 'title' in rawEvent else event.title
-                        batchEm.getList().append(event)
+                        title="? deleted: %r" %rawEvent['deleted'] if not 'title' in rawEvent else rawEvent['title']
                     elif crawlType.value is CrawlType.SERIES.value:
-                        eventSeries=wcfp.WikiCfpEventSeries()
-                        eventSeries.fromDict(rawEvent)
-                        title="?" if not 'title' in rawEvent else eventSeries.title
-                        batchEm.getList().append(eventSeries)
+                        title="?" if not 'title' in rawEvent else rawEvent['title']
+                    rawEvents.append(rawEvent)
+                    if journal is not None:
+                        journal.recordRawEvent(crawlType, eventId, rawEvent)
                     retrievedResult=True
                 except Exception as ex:
                     if "HTTP Error 500" in str(ex):
                         print(f"{eventId} inaccessible due to HTTP Error 500")
+                        if journal is not None:
+                            journal.record(crawlType, eventId, CrawlJournal.STATUS_500)
                         retrievedResult=True
                     elif "timed out" in str(ex):
                         print(f"{eventId} access timed Out on retry attempt {retry}")
                         retry+=1
                         if retry>maxRetries:
-                            raise ex
+                            if journal is None:
+                                raise ex
+                            # keep going - the id will be fetched again on resume
+                            journal.record(crawlType, eventId, CrawlJournal.STATUS_TIMEOUT)
+                            retrievedResult=True
                     else:
                         raise ex
                     pass
                 
             print(f"{eventId:06d}: {title}")
            
-           
-        batchEm.store()
-        return batchEm
+        if journal is not None:
+            return self.finishBatch(crawlBatch, journal)
+        return self.storeBatch(crawlBatch, rawEvents)
             
-    def threadedCrawl(self,crawlBatch:CrawlBatch):
+    def threadedCrawl(self,crawlBatch:CrawlBatch,journal:CrawlJournal=None):
         '''
         crawl with the given number of threads, startId and stopId
         
         Args:
             crawlBatch(CrawlBatch): the batch to crawl
+            journal(CrawlJournal): if set resume the crawl with the given journal
         '''
         # determine the eventId range for each threaded job
         startTime=time.time()
@@ -365,7 +742,7 @@ class WikiCfpScrape(object):
         # now start each thread with its id range and own filename
         for crawlBatch in crawlBatch.split(): 
         
-            thread = threading.Thread(target = self.crawl, args=(crawlBatch,))
+            thread = threading.Thread(target = self.crawl, args=(crawlBatch,journal))
             jobs.append(thread)
             
         for job in jobs:
@@ -384,13 +761,15 @@ class WikiCfpEventFetcher(object):
     '''
     a single WikiCfpEentFetcher to fetch and event or series
     '''
-    def __init__(self,crawlType=CrawlType.EVENT,debug=False,showProgress:bool=True,timeout=20):
+    def __init__(self,crawlType=CrawlType.EVENT,debug=False,showProgress:bool=True,timeout=20,responseCache:ResponseCache=None,useLxml:bool=False):
         '''
         construct me
         
         Args:
             showProgress(bool): if True show progress
             timeout(float): the default timeout
+            responseCache(ResponseCache): if set use the given cache for the HTTP responses
+            useLxml(bool): if True parse the html with lxml and XPath
         
         '''
         self.debug=debug
@@ -398,6 +777,8 @@ class WikiCfpEventFetcher(object):
         self.showProgress=showProgress
         self.progressCount=0
         self.timeout=timeout
+        self.responseCache=responseCache
+        self.useLxml=useLxml
             
     def fromTriples(self,rawEvent,triples): 
         '''
@@ -526,8 +907,8 @@ class WikiCfpEventFetcher(object):
         '''
         if len(triples)==0:
             #scrape.printPrettyHtml(scrape.soup)
-            firstH3=scrape.fromTag(scrape.soup, 'h3')
-            if "This item has been deleted" in firstH3:
+            firstH3=scrape.getText('h3')
+            if firstH3 is not None and "This item has been deleted" in firstH3:
                 rawEvent['deleted']=True
         else:        
             self.fromTriples(rawEvent,triples)
@@ -556,8 +937,8 @@ class WikiCfpEventFetcher(object):
             rawEvent(dict): the event dictionary
             scrape(WebScrape): the webscrape object to be used for parsing
         '''
-        title=scrape.soup.find("title")
-        rawEvent["title"]=title.text.strip()
+        title=scrape.getText("title")
+        rawEvent["title"]=title.strip()
         dblpM,_text=scrape.findLinkForRegexp(r'http://dblp.uni-trier.de/db/([a-zA-Z0-9/-]+)/index.html')
         if dblpM:
             dblpSeriesId=dblpM.group(1)
@@ -576,6 +957,41 @@ class WikiCfpEventFetcher(object):
             dict: a raw event dict or None if an error occured
         
         '''
+        rawEvent=self.getRawEvent4Url(url)
+        scrape=WebScrape(debug=self.debug,timeout=self.timeout,responseCache=self.responseCache,useLxml=self.useLxml)
+        triples=scrape.parseRDFa(url)
+        if scrape.err:
+            raise Exception(f"fromUrl {url} failed {scrape.err}")
+        self.fromWebScrape(rawEvent, triples, scrape)
+        return rawEvent
+    
+    def fromHtml(self,url:str,html)->dict:
+        '''
+        get the event from the given already retrieved html of the given url
+        
+        Args:
+            url(str): the url the html was retrieved from
+            html(bytes): the html code
+            
+        Returns:
+            dict: a raw event dict
+        '''
+        rawEvent=self.getRawEvent4Url(url)
+        scrape=WebScrape(debug=self.debug,timeout=self.timeout,useLxml=self.useLxml)
+        triples=scrape.parseRDFaHtml(html)
+        self.fromWebScrape(rawEvent, triples, scrape)
+        return rawEvent
+    
+    def getRawEvent4Url(self,url:str)->dict:
+        '''
+        get the initial raw event dict for the given url
+        
+        Args:
+            url(str): the WikiCFP url of the event or series
+            
+        Returns:
+            dict: the raw event with the ids, url and deleted flag
+        '''
         regexp=r"^"+self.crawlType.urlPrefix.replace("?","\?")+"(\d+)$"
         m=re.match(regexp,url)
         if not m:
@@ -590,15 +1006,339 @@ class WikiCfpEventFetcher(object):
         rawEvent['url']=url
         rawEvent['wikiCfpId']=cfpId
         rawEvent['deleted']=False
-        scrape=WebScrape(debug=self.debug,timeout=self.timeout)
-        triples=scrape.parseRDFa(url)
-        if scrape.err:
-            raise Exception(f"fromUrl {url} failed {scrape.err}")
+        return rawEvent
+    
+    def fromWebScrape(self,rawEvent:dict,triples:list,scrape:WebScrape):
+        '''
+        fill the given raw event or series from the given scrape depending on my crawlType
+        '''
         if self.crawlType.value is CrawlType.EVENT.value:
             self.rawEventFromWebScrape(rawEvent, triples, scrape)
         else:
             self.rawEventSeriesFromWebScrape(rawEvent,scrape)
-        return rawEvent
+    
+class TokenBucket(object):
+    '''
+    token bucket politeness limiter for asyncio tasks
+    
+    allows bursts of up to capacity requests and on average rate requests per second
+    '''
+    
+    def __init__(self,rate:float,capacity:int=1):
+        '''
+        constructor
+        
+        Args:
+            rate(float): the number of tokens added per second
+            capacity(int): the maximum number of tokens
+        '''
+        self.rate=rate
+        self.capacity=capacity
+        self.tokens=capacity
+        self.updated=time.monotonic()
+        self.lock=None
+        
+    async def acquire(self):
+        '''
+        wait until a token is available and take it
+        '''
+        # the lock needs to be created in the running event loop
+        if self.lock is None:
+            self.lock=asyncio.Lock()
+        async with self.lock:
+            while True:
+                now=time.monotonic()
+                self.tokens=min(self.capacity,self.tokens+(now-self.updated)*self.rate)
+                self.updated=now
+                if self.tokens>=1:
+                    self.tokens-=1
+                    return
+                await asyncio.sleep((1-self.tokens)/self.rate)
+                
+class AsyncWikiCfpCrawler(object):
+    '''
+    asyncio based WikiCFP crawler 
+    
+    uses a shared keep-alive HTTP session with a bounded number of concurrent
+    requests, a token bucket politeness limiter and retries with exponential backoff
+    for timeouts, dropped connections and HTTP 500 errors
+    '''
+    
+    def __init__(self,wikiCfpScrape:WikiCfpScrape,concurrency:int=8,rate:float=10.0,maxRetries:int=3,backoff:float=1.0,timeout:float=20,baseUrl:str=None,journal:CrawlJournal=None,useLxml:bool=False):
+        '''
+        constructor
+        
+        Args:
+            wikiCfpScrape(WikiCfpScrape): the scrape to get the batch entity managers and json directory from
+            concurrency(int): the maximum number of concurrent requests
+            rate(float): the maximum average number of requests per second
+            maxRetries(int): the maximum number of retries for timeouts, dropped connections and HTTP 500 errors
+            backoff(float): the initial delay in seconds before a retry - doubled on each retry
+            timeout(float): the timeout per request in seconds
+            baseUrl(str): if set fetch from this base url instead of http://www.wikicfp.com e.g. for a local stub
+            journal(CrawlJournal): if set only fetch the ids that are missing or failed in the journal and record the results
+            useLxml(bool): if True parse the html with lxml and XPath
+        '''
+        self.wikiCfpScrape=wikiCfpScrape
+        self.debug=wikiCfpScrape.debug
+        self.concurrency=concurrency
+        self.rate=rate
+        self.maxRetries=maxRetries
+        self.backoff=backoff
+        self.timeout=timeout
+        self.baseUrl=baseUrl
+        self.journal=journal
+        self.useLxml=useLxml
+        self.agent='Mozilla/5.0'
+        
+    def getFetchUrl(self,url:str)->str:
+        '''
+        get the url to actually fetch for the given WikiCFP url
+        '''
+        if self.baseUrl is not None:
+            url=url.replace("http://www.wikicfp.com",self.baseUrl)
+        return url
+        
+    async def fetch(self,session,eventFetcher:WikiCfpEventFetcher,cfpId:int)->dict:
+        '''
+        fetch the raw event or series with the given id
+        
+        Args:
+            session(aiohttp.ClientSession): the HTTP session to use
+            eventFetcher(WikiCfpEventFetcher): the fetcher to parse the html with
+            cfpId(int): the WikiCFP id
+            
+        Returns:
+            dict: the raw event or None if the page is inaccessible due to an HTTP Error, can not be parsed or timed out with a journal
+        '''
+        url=WikiCfpEventFetcher.getUrl(cfpId,eventFetcher.crawlType)
+        fetchUrl=self.getFetchUrl(url)
+        loop=asyncio.get_running_loop()
+        retry=0
+        while True:
+            await self.tokenBucket.acquire()
+            try:
+                async with self.semaphore:
+                    async with session.get(fetchUrl) as response:
+                        if response.status==500:
+                            raise aiohttp.ClientResponseError(response.request_info,response.history,status=500,message="HTTP Error 500")
+                        response.raise_for_status()
+                        html=await response.read()
+                try:
+                    # parse in the default executor to not block the event loop
+                    rawEvent=await loop.run_in_executor(None,eventFetcher.fromHtml,url,html)
+                except Exception as ex:
+                    # e.g. an unexpected page layout - the other ids of the batch are still to be fetched
+                    print(f"{cfpId} could not be parsed: {ex}")
+                    if self.journal is not None:
+                        self.journal.record(eventFetcher.crawlType, cfpId, CrawlJournal.STATUS_ERROR)
+                    return None
+                if self.journal is not None:
+                    self.journal.recordRawEvent(eventFetcher.crawlType, cfpId, rawEvent)
+                return rawEvent
+            except aiohttp.ClientResponseError as ex:
+                if ex.status!=500:
+                    # e.g. 404 - retrying will not help and the other ids of the batch are still to be fetched
+                    print(f"{cfpId} inaccessible due to HTTP Error {ex.status}")
+                    if self.journal is not None:
+                        self.journal.record(eventFetcher.crawlType, cfpId, CrawlJournal.STATUS_ERROR)
+                    return None
+                retry+=1
+                if retry>self.maxRetries:
+                    print(f"{cfpId} inaccessible due to HTTP Error 500")
+                    if self.journal is not None:
+                        self.journal.record(eventFetcher.crawlType, cfpId, CrawlJournal.STATUS_500)
+                    return None
+                reason="HTTP Error 500"
+            except (asyncio.TimeoutError,aiohttp.ClientConnectionError) as ex:
+                # timeouts and dropped connections e.g. ServerDisconnectedError or ClientConnectorError
+                retry+=1
+                reason="timed out" if isinstance(ex,asyncio.TimeoutError) else f"connection failed ({ex.__class__.__name__})"
+                if retry>self.maxRetries:
+                    if self.journal is None:
+                        raise Exception(f"{cfpId} access {reason} after {self.maxRetries} retries") from ex
+                    # keep going - the id will be fetched again on resume
+                    print(f"{cfpId} access {reason} after {self.maxRetries} retries")
+                    self.journal.record(eventFetcher.crawlType, cfpId, CrawlJournal.STATUS_TIMEOUT)
+                    return None
+            delay=self.backoff*2**(retry-1)
+            if self.debug:
+                print(f"{cfpId} {reason} - retry {retry} in {delay:.1f} s")
+            await asyncio.sleep(delay)
+    
+    async def crawlBatch(self,session,crawlBatch:CrawlBatch):
+        '''
+        crawl the given batch and store the result in the batch's json file
+        
+        Args:
+            session(aiohttp.ClientSession): the HTTP session to use
+            crawlBatch(CrawlBatch): the batch to crawl
+            
+        Returns:
+            EntityManager: the batch entity manager or None if the journal shows ids left to fetch
+        '''
+        crawlType=crawlBatch.crawlType
+        eventFetcher=WikiCfpEventFetcher(crawlType=crawlType,debug=self.debug,timeout=self.timeout,useLxml=self.useLxml)
+        if self.journal is None:
+            cfpIds=crawlBatch.getIds()
+        else:
+            cfpIds=self.journal.getTodoIds(crawlBatch)
+        rawEvents=await asyncio.gather(*[self.fetch(session,eventFetcher,cfpId) for cfpId in cfpIds])
+        if self.journal is not None:
+            return self.wikiCfpScrape.finishBatch(crawlBatch, self.journal)
+        # keep the order of the ids as the sequential crawl does
+        rawEvents=[rawEvent for rawEvent in rawEvents if rawEvent is not None]
+        return self.wikiCfpScrape.storeBatch(crawlBatch, rawEvents)
+    
+    def getSession(self):
+        '''
+        get a shared keep-alive HTTP session and the limiters to be used in the running event loop
+        
+        Returns:
+            aiohttp.ClientSession: the session
+        '''
+        self.semaphore=asyncio.Semaphore(self.concurrency)
+        self.tokenBucket=TokenBucket(self.rate,capacity=self.concurrency)
+        connector=aiohttp.TCPConnector(limit=self.concurrency)
+        timeout=aiohttp.ClientTimeout(total=self.timeout)
+        session=aiohttp.ClientSession(connector=connector,timeout=timeout,headers={'User-Agent': self.agent})
+        return session
+    
+    async def crawlBatchesAsync(self,crawlBatches:list)->list:
+        '''
+        crawl the given batches concurrently with a shared session
+        '''
+        async with self.getSession() as session:
+            batchEms=await asyncio.gather(*[self.crawlBatch(session,crawlBatch) for crawlBatch in crawlBatches])
+        return batchEms
+    
+    async def probe(self,session,eventFetcher:WikiCfpEventFetcher,fromId:int,toId:int)->int:
+        '''
+        concurrently fetch the ids fromId to toId and get the highest id that is not deleted
+        
+        Args:
+            session(aiohttp.ClientSession): the HTTP session to use
+            eventFetcher(WikiCfpEventFetcher): the fetcher to parse the html with
+            fromId(int): minimum id to probe
+            toId(int): maximum id to probe
+            
+        Returns:
+            int: the highest id of an event or series that is not deleted or None if there is none in this range
+        '''
+        cfpIds=[cfpId for cfpId in range(fromId,toId+1) if cfpId not in self.probed]
+        rawEvents=await asyncio.gather(*[self.fetch(session,eventFetcher,cfpId) for cfpId in cfpIds])
+        for cfpId,rawEvent in zip(cfpIds,rawEvents):
+            self.probed[cfpId]=rawEvent
+        maxId=None
+        for cfpId in range(fromId,toId+1):
+            rawEvent=self.probed[cfpId]
+            if rawEvent is not None and not rawEvent['deleted']:
+                maxId=cfpId
+        return maxId
+    
+    async def findFrontier(self,session,crawlType:CrawlType,knownId:int,window:int=40,stride:int=1000)->int:
+        '''
+        find the highest id that is not deleted above the given known id
+        
+        first gallops with doubling strides and then does a binary search - each 
+        probe fetches the window ids below the probe position concurrently
+        
+        Args:
+            session(aiohttp.ClientSession): the HTTP session to use
+            crawlType(CrawlType): the type of the crawl
+            knownId(int): the highest id known to exist
+            window(int): the number of ids that need to be deleted to assume the end of the ids
+            stride(int): the initial distance of the galloping probes
+            
+        Returns:
+            int: the id of the frontier
+        '''
+        eventFetcher=WikiCfpEventFetcher(crawlType=crawlType,debug=self.debug,timeout=self.timeout,useLxml=self.useLxml)
+        low=knownId
+        offset=stride
+        while True:
+            high=knownId+offset
+            maxId=await self.probe(session,eventFetcher,high-window+1,high)
+            if maxId is None:
+                break
+            low=maxId
+            offset*=2
+        # the window ids above high are deleted and the frontier is between low and high
+        high=high-window
+        while high-low>window:
+            mid=(low+high)//2+window//2
+            maxId=await self.probe(session,eventFetcher,mid-window+1,mid)
+            if maxId is None:
+                high=mid-window
+            else:
+                low=maxId
+        maxId=None
+        if high>low:
+            maxId=await self.probe(session,eventFetcher,low+1,high)
+        frontier=maxId if maxId is not None else low
+        return frontier
+    
+    async def deltaCrawlAsync(self,crawlType:CrawlType,knownId:int,window:int=40,stride:int=1000)->list:
+        '''
+        find the frontier and fetch the ids above the known id
+        
+        Returns:
+            list: the raw events of the new id range in id order
+        '''
+        self.probed={}
+        async with self.getSession() as session:
+            self.frontier=await self.findFrontier(session,crawlType,knownId,window=window,stride=stride)
+            if self.debug:
+                print(f"WikiCFP {crawlType.value} frontier is {self.frontier} - {self.frontier-knownId} ids above {knownId}")
+            eventFetcher=WikiCfpEventFetcher(crawlType=crawlType,debug=self.debug,timeout=self.timeout,useLxml=self.useLxml)
+            await self.probe(session,eventFetcher,knownId+1,self.frontier)
+        rawEvents=[self.probed[cfpId] for cfpId in range(knownId+1,self.frontier+1) if self.probed[cfpId] is not None]
+        return rawEvents
+    
+    def deltaCrawl(self,crawlType:CrawlType,knownId:int,window:int=40,stride:int=1000,batchSize:int=1000)->list:
+        '''
+        crawl the ids above the given known id up to the current frontier and merge them
+        into the json batch files
+        
+        Args:
+            crawlType(CrawlType): the type of the crawl
+            knownId(int): the highest id that has already been crawled
+            window(int): the number of ids that need to be deleted to assume the end of the ids
+            stride(int): the initial distance of the galloping probes
+            batchSize(int): the number of ids per json batch file
+            
+        Returns:
+            list: the raw events of the new id range in id order
+        '''
+        startTime=time.time()
+        rawEvents=asyncio.run(self.deltaCrawlAsync(crawlType, knownId, window=window, stride=stride))
+        if self.frontier>knownId:
+            for crawlBatch in self.wikiCfpScrape.getAlignedBatches(crawlType,knownId+1,self.frontier,batchSize=batchSize):
+                batchRawEvents=[rawEvent for rawEvent in rawEvents if crawlBatch.startId<=rawEvent["wikiCfpId"]<=crawlBatch.stopId]
+                self.wikiCfpScrape.mergeBatch(crawlBatch, batchRawEvents)
+        if self.debug:
+            elapsed=time.time()-startTime
+            print(f"delta crawl of {len(self.probed)} ids done after {elapsed:5.1f} s")
+        return rawEvents
+            
+    def crawl(self,crawlBatch:CrawlBatch)->list:
+        '''
+        crawl the given batch - split into the same json batch files as the threadedCrawl
+        
+        Args:
+            crawlBatch(CrawlBatch): the batch to crawl
+            
+        Returns:
+            list: the batch entity managers
+        '''
+        startTime=time.time()
+        print(f"Crawling {crawlBatch} asynchronously with {self.concurrency} concurrent requests at {self.rate} requests/s")
+        crawlBatches=crawlBatch.split() if crawlBatch.threads>1 else [crawlBatch]
+        batchEms=asyncio.run(self.crawlBatchesAsync(crawlBatches))
+        if self.debug:
+            elapsed=time.time()-startTime
+            print(f'crawling done after {elapsed:5.1f} s')
+        return batchEms
     
 __version__ = 0.4
 __date__ = '2020-06-22'
@@ -638,20 +1378,53 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-d", "--debug", dest="debug", action="count", help="set debug level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
-        parser.add_argument('--startId', type=int, help='eventId to start crawling from', required=True)
-        parser.add_argument('--stopId', type=int, help='eventId to stop crawling at', required=True)
+        parser.add_argument('--startId', type=int, help='eventId to start crawling from')
+        parser.add_argument('--stopId', type=int, help='eventId to stop crawling at')
         parser.add_argument('--crawlType',type=str,default="Event",help="The crawlType - Event or Series")
         parser.add_argument('-p','--targetPath',type=str,help="targetPath (JSON directory) for crawl results")
         parser.add_argument('-t','--threads', type=int, help='number of threads to start', default=10)
+        parser.add_argument('--async',dest="asyncCrawl",action="store_true",help="crawl with asyncio and a shared keep-alive session - threads is then the number of json batch files")
+        parser.add_argument('--concurrency', type=int, help='maximum number of concurrent requests for the async crawl', default=8)
+        parser.add_argument('--rate', type=float, help='maximum number of requests per second for the async crawl', default=10.0)
+        parser.add_argument('--journal',action="store_true",help="record the status of each id in the crawl journal of the targetPath and only fetch missing or failed ids")
+        parser.add_argument('--flushSize', type=int, help='number of ids after which the crawl journal is committed', default=50)
+        parser.add_argument('--lxml',dest="useLxml",action="store_true",help="parse the html with lxml and XPath instead of BeautifulSoup for the async crawl")
+        parser.add_argument('--delta',action="store_true",help="crawl the ids above the highest wikiCfpId of the SQL cache up to the current frontier and merge them into the json batch files and the SQL cache")
+        parser.add_argument('--cache',action="store_true",help="use the on disk HTTP response cache ~/.conferencecorpus/webcache.db for the threaded crawl")
+        parser.add_argument('--ttl',type=float,help="time in seconds a cached response is used without revalidation [default: no expiry]")
+        parser.add_argument('--offline',action="store_true",help="only replay the responses of the HTTP response cache and never access the network")
 
         # Process arguments
         args = parser.parse_args(argv)
+        import corpus.datasources.wikicfp as wcfp
         wikiCfp=wcfp.WikiCfp()
         wikiCfpScrape=wikiCfp.wikiCfpScrape
-        wikiCfpScrape.jsondir=args.targetPath
+        if args.targetPath is not None:
+            wikiCfpScrape.jsondir=args.targetPath
         wikiCfpScrape.debug=args.debug
+        if args.delta:
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=args.concurrency,rate=args.rate,useLxml=args.useLxml)
+            lod=wikiCfp.deltaUpdate(crawler,CrawlType.ofValue(args.crawlType))
+            print(f"added {len(lod)} new WikiCFP {args.crawlType} records up to id {crawler.frontier}")
+            return 0
+        if args.startId is None or args.stopId is None:
+            parser.error("--startId and --stopId are needed if not using --delta")
         crawlBatch=CrawlBatch(args.threads, args.startId, args.stopId,args.crawlType,None)
-        wikiCfpScrape.threadedCrawl(crawlBatch)
+        if args.cache or args.offline:
+            wikiCfpScrape.responseCache=ResponseCache(ttl=args.ttl,offline=args.offline)
+        journal=wikiCfpScrape.getCrawlJournal(flushSize=args.flushSize) if args.journal else None
+        try:
+            if args.asyncCrawl:
+                crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=args.concurrency,rate=args.rate,journal=journal,useLxml=args.useLxml)
+                crawler.crawl(crawlBatch)
+            else:
+                wikiCfpScrape.threadedCrawl(crawlBatch,journal)
+        finally:
+            # make sure the recorded results survive an interrupted crawl
+            if journal is not None:
+                journal.close()
+            if wikiCfpScrape.responseCache is not None:
+                wikiCfpScrape.responseCache.close()
         
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
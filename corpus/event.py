@@ -11,15 +11,21 @@ from lodentity.jsonable import JSONAble
 from lodstorage.lod import LOD
 from lodstorage.sql import SQLDB
 from corpus.utils.download import Profiler
-from lodstorage.storageconfig import StorageConfig
+from corpus.utils.sqlpool import SQLDBPool
+from lodstorage.storageconfig import StorageConfig, StoreMode
 from corpus.quality.rating import RatingManager
 from corpus.eventrating import EventRating,EventSeriesRating
 from lodstorage.sparql import SPARQL
 from lodstorage.schema import Schema
 from lodstorage.uml import UML
 from lodstorage.query import QueryManager
+import hashlib
+import operator
 import os
+import sqlite3
 import sys
+import threading
+import time
 from datetime import datetime
 
 
@@ -44,6 +50,20 @@ class EventStorage:
                  "eventseries_orclonebackup",
                  "eventseries_gnd"]
             }
+    # serializes the SQLite writes of the managers when data sources are loaded concurrently
+    writeLock=threading.RLock()
+    # if True reuse the connections per thread from the sqlDBPool e.g. for the worker threads of a webserver
+    pooled=False
+    sqlDBPool=SQLDBPool()
+    # if True the managers store their tables with a single executemany transaction see EventBaseManager.storeLoDBulk
+    bulkStore=False
+    # if True the managers store their tables to a shadow table with the shadowTableSuffix which is then swapped in
+    shadowStore=False
+    shadowTableSuffix="__new"
+    # if True createViews creates indexed tables instead of plain UNION views
+    materializeViews=False
+    # columns to index in materialized views - columns containing wikidataid are indexed as well
+    viewIndexColumns=["lookupAcronym","acronym","year","source","eventId","ordinal"]
     
     @staticmethod
     def getStorageConfig(debug:bool=False,mode='sql')->StorageConfig:
@@ -107,12 +127,21 @@ class EventStorage:
         return dbfile
     
     @classmethod
-    def getSqlDB(cls):
+    def getSqlDB(cls,readOnly:bool=False):
         '''
         get the SQL Database
+        
+        Args:
+            readOnly(bool): if True get a read-only connection
+            
+        Returns:
+            SQLDB: the connection of the current thread from the sqlDBPool or a new one if pooled is False
         '''
         dbfile=EventStorage.getDBFile()
-        sqlDB=SQLDB(dbfile)
+        if not EventStorage.pooled:
+            sqlDB=SQLDB(dbfile)
+        else:
+            sqlDB=EventStorage.sqlDBPool.getSqlDB(dbfile,readOnly=readOnly)
         return sqlDB
     
     @classmethod
@@ -125,29 +154,134 @@ class EventStorage:
             withInstanceCount(bool): if TRUE add the count of instances to the table Map 
         '''
         sqlDB=EventStorage.getSqlDB()
-        tableList=sqlDB.getTableList()
-        for table in tableList:
-            tableName=table["name"]
-            if withInstanceCount:
-                countQuery="SELECT count(*) as count from %s" % tableName
-                countResult=sqlDB.query(countQuery)
-                table['instances']=countResult[0]['count']
+        # the metadata table is not a cache table
+        tableList=[table for table in sqlDB.getTableList() if table["name"]!=cls.metadataTableName]
+        if withInstanceCount:
+            instanceCounts=cls.getInstanceCounts([table["name"] for table in tableList],sqlDB=sqlDB)
+            for table in tableList:
+                table['instances']=instanceCounts[table["name"]]
         return tableList
     
     @classmethod
-    def getViewTableList(cls,viewName,exclude=None):
-        sqlDB=EventStorage.getSqlDB()
+    def swapTable(cls,sqlDB:SQLDB,shadowTableName:str,tableName:str):
+        '''
+        atomically replace the given table by the given completely written shadow table
+        
+        Args:
+            sqlDB(SQLDB): the database
+            shadowTableName(str): the name of the shadow table e.g. event_dblp__new
+            tableName(str): the name of the table to replace e.g. event_dblp
+        '''
+        connection=sqlDB.c
+        connection.commit()
+        # do not check the views referencing the table while it is briefly missing
+        legacyAlterTable=connection.execute("PRAGMA legacy_alter_table").fetchone()[0]
+        connection.execute("PRAGMA legacy_alter_table=ON")
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(f"DROP TABLE IF EXISTS {tableName}")
+            connection.execute(f"ALTER TABLE {shadowTableName} RENAME TO {tableName}")
+            connection.commit()
+        except Exception as ex:
+            connection.rollback()
+            raise ex
+        finally:
+            connection.execute(f"PRAGMA legacy_alter_table={legacyAlterTable}")
+    
+    @classmethod
+    def updateTableMetadata(cls,tableNames:list,sqlDB:SQLDB=None)->list:
+        '''
+        count the rows of the given tables and record the counts with the
+        current timestamp in the metadata table
+        
+        Args:
+            tableNames(list): the names of the tables to update the metadata for
+            sqlDB(SQLDB): the database to use - if None use the EventCorpus database
+            
+        Returns:
+            list: the metadata records
+        '''
+        if sqlDB is None:
+            sqlDB=EventStorage.getSqlDB()
+        records=[]
+        with EventStorage.writeLock:
+            sqlDB.c.execute(f"CREATE TABLE IF NOT EXISTS {cls.metadataTableName} (tableName TEXT PRIMARY KEY,instances INTEGER,updated TIMESTAMP)")
+            for tableName in tableNames:
+                countResult=sqlDB.query(f"SELECT count(*) as count from {tableName}")
+                record={
+                    "tableName":tableName,
+                    "instances":countResult[0]["count"],
+                    "updated":datetime.now()
+                }
+                sqlDB.c.execute(f"INSERT OR REPLACE INTO {cls.metadataTableName} VALUES (?,?,?)",(tableName,record["instances"],str(record["updated"])))
+                records.append(record)
+            sqlDB.c.commit()
+        return records
+    
+    @classmethod
+    def getTableMetadata(cls,sqlDB:SQLDB=None)->dict:
+        '''
+        get the recorded row counts and update timestamps
+        
+        Args:
+            sqlDB(SQLDB): the database to use - if None use the EventCorpus database
+            
+        Returns:
+            dict: the metadata records by table name
+        '''
+        if sqlDB is None:
+            sqlDB=EventStorage.getSqlDB(readOnly=True)
+        metadata={}
+        tableQuery="SELECT name FROM sqlite_master WHERE type='table' AND name=?"
+        if sqlDB.query(tableQuery,(cls.metadataTableName,)):
+            for record in sqlDB.query(f"SELECT * FROM {cls.metadataTableName}"):
+                metadata[record["tableName"]]=record
+        return metadata
+    
+    @classmethod
+    def getInstanceCounts(cls,tableNames:list,sqlDB:SQLDB=None)->dict:
+        '''
+        get the number of instances of the given tables from the metadata table
+        counting and recording the tables that have no metadata yet
+        
+        Args:
+            tableNames(list): the names of the tables
+            sqlDB(SQLDB): the database to use - if None use the EventCorpus database
+            
+        Returns:
+            dict: the number of instances by table name
+        '''
+        metadata=cls.getTableMetadata(sqlDB)
+        missing=[tableName for tableName in tableNames if tableName not in metadata]
+        if missing:
+            try:
+                records=cls.updateTableMetadata(missing, sqlDB=sqlDB)
+            except sqlite3.OperationalError:
+                # e.g. read-only database - just count
+                if sqlDB is None:
+                    sqlDB=EventStorage.getSqlDB(readOnly=True)
+                records=[{"tableName":tableName,"instances":sqlDB.query(f"SELECT count(*) as count from {tableName}")[0]["count"]} for tableName in missing]
+            for record in records:
+                metadata[record["tableName"]]=record
+        instanceCounts={tableName:metadata[tableName]["instances"] for tableName in tableNames}
+        return instanceCounts
+    
+    @classmethod
+    def getViewTableList(cls,viewName,exclude=None,sqlDB:SQLDB=None):
+        if sqlDB is None:
+            sqlDB=EventStorage.getSqlDB()
         tableList=sqlDB.getTableList()  
         viewTableList=[]
         for table in tableList:
             tableName=table["name"]
-            if tableName.startswith(f"{viewName}_"):
+            # skip shadow tables e.g. event__new of a materialized view that is being refreshed
+            if tableName.startswith(f"{viewName}_") and not tableName.endswith(cls.shadowTableSuffix):
                 if exclude is None or tableName not in exclude[viewName]:
                     viewTableList.append(table)
         return viewTableList
     
     @classmethod
-    def getCommonViewDDLs(cls,viewNames=["event","eventseries"],exclude=None):
+    def getCommonViewDDLs(cls,viewNames=["event","eventseries"],exclude=None,sqlDB:SQLDB=None):
         '''
         get the SQL DDL for a common view 
         
@@ -157,27 +291,105 @@ class EventStorage:
            
         viewDDLs={}
         for viewName in viewNames:
-            viewTableList=cls.getViewTableList(viewName, exclude=exclude)
+            viewTableList=cls.getViewTableList(viewName, exclude=exclude,sqlDB=sqlDB)
             viewDDL=Schema.getGeneralViewDDL(viewTableList, viewName)
             viewDDLs[viewName]=viewDDL
         return viewDDLs
         
     @classmethod
-    def createViews(cls,exclude=None,show=False):
+    def createViews(cls,exclude=None,show=False,materialize:bool=None,sqlDB:SQLDB=None):
         ''' 
           create the general Event views
           
         Args:
             exclude(list): the list of table names to be excluded
             show(bool): if True show the DDL
+            materialize(bool): if True create indexed tables instead of views - if None use materializeViews
+            sqlDB(SQLDB): the database to use - if None use the EventCorpus database
         '''
-        sqlDB=EventStorage.getSqlDB()
-        viewDDLs=EventStorage.getCommonViewDDLs(exclude=exclude)
+        if sqlDB is None:
+            sqlDB=EventStorage.getSqlDB()
+        if materialize is None:
+            materialize=cls.materializeViews
+        viewDDLs=EventStorage.getCommonViewDDLs(exclude=exclude,sqlDB=sqlDB)
         for viewName,viewDDL in viewDDLs.items():
-            sqlDB.c.execute(f"DROP VIEW IF EXISTS {viewName}")
+            if materialize:
+                viewTableList=cls.getViewTableList(viewName, exclude=exclude, sqlDB=sqlDB)
+                cls.materializeView(sqlDB, viewName, viewTableList, show=show)
+            else:
+                if cls.getObjectType(sqlDB, viewName)=="table":
+                    sqlDB.c.execute(f"DROP TABLE {viewName}")
+                sqlDB.c.execute(f"DROP VIEW IF EXISTS {viewName}")
+                if show:
+                    print(viewDDL)
+                sqlDB.c.execute(viewDDL)
+                
+    @staticmethod
+    def getObjectType(sqlDB:SQLDB,name:str)->str:
+        '''
+        get the type of the schema object with the given name
+        
+        Returns:
+            str: table, view, index or None if there is no such object
+        '''
+        row=sqlDB.c.execute("SELECT type FROM sqlite_master WHERE name=?",(name,)).fetchone()
+        return None if row is None else row[0]
+                
+    @classmethod
+    def materializeView(cls,sqlDB:SQLDB,viewName:str,viewTableList:list,show:bool=False):
+        '''
+        materialize the common view with the given name and DDL as a table with indices
+        
+        the table is filled under a temporary name and swapped in within a single transaction
+        so that readers either see the old or the new content - the columns in viewIndexColumns
+        and the wikidata id columns are indexed
+        
+        Args:
+            sqlDB(SQLDB): the database to use
+            viewName(str): the name of the view e.g. event
+            viewTableList(list): the tables to combine as returned by getViewTableList
+            show(bool): if True show the DDL
+        '''
+        if len(viewTableList)==0:
+            # there is nothing to combine - keep the existing view or table (if any)
             if show:
-                print(viewDDL)
-            sqlDB.c.execute(viewDDL)
+                print(f"no tables to materialize {viewName} from")
+            return
+        # keep the declared column types of the source tables e.g. DATE
+        columns=Schema.getGeneral(viewTableList,viewName)["columns"]
+        newName=f"{viewName}__new"
+        columnDDL=",\n  ".join(f"{column['name']} {column['type']}" for column in columns)
+        # same as the UNION of Schema.getGeneralViewDDL which can not be called again on the same tableList
+        cols=",".join(column["name"] for column in columns)
+        selectSql="\nUNION\n".join(f"  SELECT {cols} FROM {table['name']}" for table in viewTableList)
+        ddls=[
+            f"DROP TABLE IF EXISTS {newName}",
+            f"CREATE TABLE {newName} (\n  {columnDDL}\n)",
+            f"INSERT INTO {newName}\n{selectSql}"
+        ]
+        indexDDLs=[]
+        for column in columns:
+            columnName=column["name"]
+            if columnName in cls.viewIndexColumns or "wikidataid" in columnName.lower():
+                indexDDLs.append(f"CREATE INDEX {viewName}_{columnName} ON {newName}({columnName})")
+        # DDL statements do not start a transaction implicitly
+        sqlDB.c.commit()
+        with sqlDB.c:
+            sqlDB.c.execute("BEGIN")
+            for ddl in ddls:
+                if show:
+                    print(ddl)
+                sqlDB.c.execute(ddl)
+            objectType=cls.getObjectType(sqlDB, viewName)
+            if objectType is not None:
+                # the indices of an old table are dropped together with it
+                sqlDB.c.execute(f"DROP {objectType.upper()} {viewName}")
+            for ddl in indexDDLs:
+                if show:
+                    print(ddl)
+                sqlDB.c.execute(ddl)
+            sqlDB.c.execute(f"ALTER TABLE {newName} RENAME TO {viewName}")
+        cls.updateTableMetadata([viewName], sqlDB=sqlDB)
     
     @classmethod        
     def asPlantUml(cls,baseEntity='Event',exclude=None):
@@ -209,18 +421,37 @@ see also [[http://cc.bitplan.com Conference Corpus]]
         plantUml=uml.mergeSchema(schemaManager,tableList,title=title,packageName='DataSources',generalizeTo=baseEntity)
         return plantUml
     
+    # indices of the signature cache
+    signatureIndexDDLs = [
+        "CREATE INDEX IF NOT EXISTS eventsByCountry ON event(country)",
+        #"CREATE INDEX IF NOT EXISTS eventsByRegion ON event(region)",
+        #"CREATE INDEX IF NOT EXISTS eventsByCity ON event(city)",
+        "CREATE INDEX IF NOT EXISTS eventsByOrdinal ON event(ordinal)"
+    ]
+    # name of the table tracking the state of the sources in the signature cache
+    signatureSourceTableName="signature_source"
+    # row counts and update timestamps per table see updateTableMetadata
+    metadataTableName="table_metadata"
+    
     @classmethod
-    def getSignatureCache(cls,profile:bool=True,force:bool=False):
+    def getSignatureCache(cls,profile:bool=True,force:bool=False,incremental:bool=False):
         '''
         cache the signature Data in a separate SQLite DB
         
         Args:
             profile(bool): if True show profiling information
             force(bool): if True force the cache creation
+            incremental(bool): if True copy the signature columns per source with INSERT … SELECT from the attached 
+                EventCorpus database and only refresh the sources that changed see refreshSignatureCache
         '''
         signatureCache=cls.getDBFile("Signature")
         profiler=None
-        if (not os.path.isfile(signatureCache)) or force:
+        if incremental:
+            if force and os.path.isfile(signatureCache):
+                os.remove(signatureCache)
+            signature=SQLDB(signatureCache)
+            cls.refreshSignatureCache(signature, EventStorage.getSqlDB(), exclude=cls.viewTableExcludes, profile=profile)
+        elif (not os.path.isfile(signatureCache)) or force:
             if profile:
                 msg="Reading events for Signature cache"
                 profiler=Profiler(msg)
@@ -238,14 +469,8 @@ see also [[http://cc.bitplan.com Conference Corpus]]
                 profiler.time()
             ddls = [
                 "DROP INDEX if EXISTS eventsByCountry",
-                "CREATE INDEX eventsByCountry ON event(country)",
-                #"DROP INDEX if EXISTS eventsByRegion",
-                #"#CREATE INDEX eventsByRegion ON event(region)",
-                #"DROP INDEX if EXISTS eventsByCity",
-                #"CREATE INDEX eventsByCity ON event(city)",
                 "DROP INDEX if EXISTS eventsByOrdinal",
-                "CREATE INDEX eventsByOrdinal ON event(ordinal)"
-            ]
+            ]+cls.signatureIndexDDLs
             for ddl in ddls:
                 signature.execute(ddl)
       
@@ -253,6 +478,146 @@ see also [[http://cc.bitplan.com Conference Corpus]]
             signature=SQLDB(signatureCache)
         return signature
     
+    @staticmethod
+    def getContentHash(sqlDB:SQLDB,tableName:str,columnNames:list)->str:
+        '''
+        get a hash of the content of the given columns of the given table
+        
+        the rows are streamed from a cursor as strings and not converted to dicts
+        
+        Args:
+            sqlDB(SQLDB): the database to use
+            tableName(str): the (optionally schema qualified) name of the table
+            columnNames(list): the names of the columns to take into account
+            
+        Returns:
+            str: the hex digest of the md5 hash of the content
+        '''
+        md5=hashlib.md5()
+        # let SQLite render each row as a single string to avoid creating python objects per column
+        rowExpr="||char(31)||".join(f"quote({columnName})" for columnName in columnNames)
+        cursor=sqlDB.c.execute(f"SELECT {rowExpr} FROM {tableName} ORDER BY rowid")
+        while True:
+            rows=cursor.fetchmany(10000)
+            if not rows:
+                break
+            md5.update("\n".join(row[0] for row in rows).encode())
+        return md5.hexdigest()
+    
+    @classmethod
+    def refreshSignatureCache(cls,signature:SQLDB,sqlDB:SQLDB,exclude:dict=None,profile:bool=True)->dict:
+        '''
+        refresh the signature cache incrementally
+        
+        the columns of the common event view are copied per event_<source> table 
+        with INSERT … SELECT from the attached database of the given sqlDB so that
+        the rows never pass through python. The row count and content hash of each source
+        table are tracked in the signature_source table and only sources that changed
+        are refreshed. If the common columns changed the cache is rebuilt completely.
+        
+        Args:
+            signature(SQLDB): the signature cache database
+            sqlDB(SQLDB): the EventCorpus database
+            exclude(dict): the tables to exclude per view see viewTableExcludes
+            profile(bool): if True show profiling information
+            
+        Returns:
+            dict: the refresh status per source table (unchanged, refreshed or removed)
+        '''
+        profiler=Profiler("refreshing Signature cache") if profile else None
+        tableList=[]
+        for table in sqlDB.getTableList():
+            tableName=table["name"]
+            if tableName.startswith("event_"):
+                if exclude is None or tableName not in exclude["event"]:
+                    tableList.append(table)
+        columns=Schema.getGeneral(tableList,"event")["columns"] if tableList else []
+        columnNames=[column["name"] for column in columns]
+        if not "source" in columnNames:
+            raise Exception("the signature cache needs a common source column for the event tables")
+        columnsKey=",".join(f"{column['name']} {column['type']}" for column in columns)
+        stateTableName=cls.signatureSourceTableName
+        signature.execute(f"""CREATE TABLE IF NOT EXISTS {stateTableName} (
+  tableName TEXT PRIMARY KEY,
+  rowCount INTEGER,
+  contentHash TEXT,
+  minRowId INTEGER,
+  maxRowId INTEGER,
+  columns TEXT,
+  refreshed TIMESTAMP
+)""")
+        states={}
+        for state in signature.query(f"SELECT * FROM {stateTableName}"):
+            states[state["tableName"]]=state
+        signatureTables=[table["name"] for table in signature.getTableList()]
+        # the common columns changed or the cache has not been created incrementally - rebuild
+        if "event" in signatureTables and (len(states)==0 or any(state["columns"]!=columnsKey for state in states.values())):
+            signature.execute("DROP TABLE event")
+            signature.execute(f"DELETE FROM {stateTableName}")
+            signatureTables.remove("event")
+            states={}
+        if not "event" in signatureTables:
+            ddl=",\n  ".join(f"{column['name']} {column['type']}" for column in columns)
+            signature.execute(f"CREATE TABLE event (\n  {ddl}\n)")
+        cols=",".join(columnNames)
+        status={}
+        # ATTACH is not possible within a transaction
+        signature.c.commit()
+        signature.c.execute("ATTACH DATABASE ? AS corpus",(os.path.abspath(sqlDB.dbname),))
+        try:
+            with signature.c:
+                for table in tableList:
+                    tableName=table["name"]
+                    rowCount=signature.query(f"SELECT count(*) AS count FROM corpus.{tableName}")[0]["count"]
+                    state=states.pop(tableName,None)
+                    contentHash=cls.getContentHash(signature, f"corpus.{tableName}", columnNames)
+                    if state is not None and state["rowCount"]==rowCount and state["contentHash"]==contentHash:
+                        status[tableName]="unchanged"
+                        continue
+                    if state is not None:
+                        cls.deleteSignatureSources(signature, state)
+                    # the rows of a source get a contiguous rowid range since they are appended after the current maximum
+                    minRowId=cls.getMaxRowId(signature)+1
+                    # the event view is a UNION so duplicate rows are removed
+                    signature.c.execute(f"INSERT INTO event ({cols}) SELECT DISTINCT {cols} FROM corpus.{tableName}")
+                    maxRowId=cls.getMaxRowId(signature)
+                    signature.c.execute(f"INSERT OR REPLACE INTO {stateTableName} VALUES (?,?,?,?,?,?,?)",
+                        (tableName,rowCount,contentHash,minRowId,maxRowId,columnsKey,datetime.now()))
+                    status[tableName]="refreshed"
+                # sources that are gone
+                for tableName,state in states.items():
+                    cls.deleteSignatureSources(signature, state)
+                    signature.c.execute(f"DELETE FROM {stateTableName} WHERE tableName=?",(tableName,))
+                    status[tableName]="removed"
+        finally:
+            signature.c.execute("DETACH DATABASE corpus")
+        for ddl in cls.signatureIndexDDLs:
+            signature.execute(ddl)
+        signature.c.commit()
+        if profiler:
+            changed=[tableName for tableName,tableStatus in status.items() if tableStatus!="unchanged"]
+            profiler.time(f" for {len(changed)} of {len(status)} sources {changed}")
+        return status
+    
+    @staticmethod
+    def getMaxRowId(signature:SQLDB)->int:
+        '''
+        get the maximum rowid of the event table of the given signature cache
+        '''
+        maxRowId=signature.c.execute("SELECT max(rowid) FROM event").fetchone()[0]
+        return 0 if maxRowId is None else maxRowId
+    
+    @classmethod
+    def deleteSignatureSources(cls,signature:SQLDB,state:dict):
+        '''
+        delete the events of the source table recorded in the given signature_source state record
+        
+        Args:
+            signature(SQLDB): the signature cache database
+            state(dict): the signature_source record
+        '''
+        signature.c.execute("DELETE FROM event WHERE rowid BETWEEN ? AND ?",(state["minRowId"],state["maxRowId"]))
+    
     @classmethod
     def createLookup(cls,column:str,tables:list):
         '''
@@ -451,10 +816,68 @@ class EventSeries(JSONAble):
         return markup
 
 
+class CompactEntity(object):
+    '''
+    mixin for read-only entities that keep their attribute values in __slots__
+    instead of a per instance __dict__
+    
+    the concrete classes are generated per entity class and set of fields with getClass
+    '''
+    __slots__=()
+    # generated classes by (entity class,fields)
+    classes={}
+    
+    @classmethod
+    def getClass(cls,clazz,fields:tuple):
+        '''
+        get the compact class for the given entity class and fields
+        
+        Args:
+            clazz: the entity class e.g. Event
+            fields(tuple): the names of the attributes
+            
+        Returns:
+            the generated class which is a subclass of the given entity class
+        '''
+        key=(clazz,fields)
+        if not key in cls.classes:
+            classDict={
+                "__slots__":fields,
+                # the entity class has a __dict__ descriptor which needs to be shadowed in the generated class itself
+                "__dict__":property(CompactEntity.asDict)
+            }
+            cls.classes[key]=type(f"Compact{clazz.__name__}",(CompactEntity,clazz),classDict)
+        return cls.classes[key]
+    
+    @classmethod
+    def fromRecord(cls,compactClass,record:dict):
+        '''
+        create an instance of the given compact class from the given record
+        '''
+        entity=compactClass.__new__(compactClass)
+        for key,value in record.items():
+            object.__setattr__(entity,key,value)
+        return entity
+    
+    def asDict(self)->dict:
+        '''
+        get a snapshot of my attribute values as a dict
+        '''
+        return {field:getattr(self,field) for field in self.__class__.__slots__ if hasattr(self,field)}
+    
+    def __setattr__(self,name,value):
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+    
+    def __delattr__(self,name):
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+        
+
 class EventBaseManager(EntityManager):
     '''
     common entity Manager for ConferenceCorpus
     '''
+    # the sample fields by entity class see getSampleFields
+    sampleFieldsByClass={}
     
     def __init__(self,name,entityName,entityPluralName:str,listName:str=None,clazz=None,sourceConfig:EventDataSourceConfig=None,primaryKey:str=None,config=None,handleInvalidListTypes=False,filterInvalidListTypes=False,debug=False,profile=True):
         '''
@@ -479,6 +902,20 @@ class EventBaseManager(EntityManager):
         else:
             tableName=entityName
         super().__init__(name, entityName, entityPluralName, listName, clazz, tableName, primaryKey, config, handleInvalidListTypes, filterInvalidListTypes, listSeparator='⇹',debug=debug)
+        # if True store with storeLoDBulk see storeLoD
+        self.bulkStore=EventStorage.bulkStore
+        # columns to index after a bulk store - columns that are missing in the table or the primary key are skipped
+        self.indexColumns=[]
+        # if True store to a shadow table that replaces my table when complete see EventStorage.swapTable
+        self.shadowStore=EventStorage.shadowStore
+        # if True create read-only CompactEntity instances see fromLoD
+        self.compact=False
+        # callback to load my entities on first access see setLazyLoader
+        self.lazyLoader=None
+        self.lazyLoading=False
+        self.lazyLock=threading.RLock()
+        # lookups by (attrName,withDuplicates) see getLookup
+        self.invalidateIndex()
    
         
     def configure(self):
@@ -508,6 +945,8 @@ class EventBaseManager(EntityManager):
                     raise Exception(f"rateAll for unknown entity type {type(entity).__name__}")
                 entity.rate(rating)
                 ratingManager.ratings.append(rating)
+        # rating might modify the entities
+        self.invalidateIndex()
             
     def fromCsv(self, csvString, separator:str= ',', overwriteEvents:bool = True, updateEntitiesCallback:Callable =None):
         """
@@ -531,6 +970,7 @@ class EventBaseManager(EntityManager):
     def updateFromLod(self, lod:list, overwriteEvents:bool = True, updateEntitiesCallback:Callable=None, restrictToSamples:bool=True):
         """
         Updates the entities from the given LoD. If a entity does not already exist a new one will be added.
+        Read-only CompactEntity instances are replaced by updated copies.
         Args:
             lod: data to update the entities
             overwriteEvents: If False only missing values are added
@@ -540,50 +980,362 @@ class EventBaseManager(EntityManager):
         Returns:
 
         """
-        originalEventsLookup = self.getLookup(attrName=self.primaryKey)[0]
+        originalEventsLookup = self.getPrimaryKeyIndex()
+        modified = False
+        # list positions of read-only compact entities that need to be replaced
+        positions = None
         for eventRecord in lod:
             if self.primaryKey in eventRecord:
                 eventRecordPrimaryKey = eventRecord.get(self.primaryKey)
                 if eventRecordPrimaryKey in originalEventsLookup:
                     originalEvent = originalEventsLookup[eventRecordPrimaryKey]
                     if hasattr(originalEvent, self.primaryKey):
-                        sampleProperties = []
-                        if hasattr(originalEvent, 'getSamples') and callable(originalEvent.getSamples):
-                            sampleProperties = LOD.getFields(originalEvent.getSamples())
-                        for key, value in eventRecord.items():
-                            if hasattr(originalEvent, key):
-                                setattr(originalEvent, key, value)
-                            else:
-                                if restrictToSamples or key in sampleProperties:
+                        sampleProperties = EventBaseManager.getSampleFields(originalEvent)
+                        modified = True
+                        if isinstance(originalEvent, CompactEntity):
+                            record = originalEvent.asDict()
+                            for key, value in eventRecord.items():
+                                if key in record or restrictToSamples or key in sampleProperties:
+                                    record[key] = value
+                            if positions is None:
+                                positions = {id(entity):index for index,entity in enumerate(self.getList())}
+                            index = positions.pop(id(originalEvent))
+                            originalEvent = CompactEntity.fromRecord(CompactEntity.getClass(self.clazz, tuple(record)), record)
+                            self.getList()[index] = originalEvent
+                            positions[id(originalEvent)] = index
+                            originalEventsLookup[eventRecordPrimaryKey] = originalEvent
+                        else:
+                            for key, value in eventRecord.items():
+                                if hasattr(originalEvent, key):
                                     setattr(originalEvent, key, value)
                                 else:
-                                    pass
+                                    if restrictToSamples or key in sampleProperties:
+                                        setattr(originalEvent, key, value)
+                                    else:
+                                        pass
                         if updateEntitiesCallback is not None and callable(updateEntitiesCallback):
                             updateEntitiesCallback(originalEvent, overwrite=overwriteEvents)
                 else:
                     self.fromLoD(lod=[eventRecord], append=True, debug=self.debug)
                     # new entity was addded → update lookup
-                    originalEventsLookup = self.getLookup(attrName=self.primaryKey)[0]
-                    originalEvent = originalEventsLookup[eventRecordPrimaryKey]
+                    originalEvent = self.getList()[-1]
+                    self.addToIndex(originalEvent)
                     if updateEntitiesCallback is not None and callable(updateEntitiesCallback):
                         updateEntitiesCallback(originalEvent, overwrite=overwriteEvents)
+        if modified:
+            # attribute values of existing entities might have changed
+            self.invalidateIndex()
+                        
+    def setLazyLoader(self,lazyLoader:Callable):
+        '''
+        defer loading my entities until my list is accessed for the first time
+        
+        Args:
+            lazyLoader(Callable): the callback that loads my entities e.g. by calling fromCache
+        '''
+        self.lazyLoader=lazyLoader
+        
+    def loadLazily(self):
+        '''
+        call my lazyLoader if my entities have not been loaded yet
+        '''
+        if self.lazyLoader is not None:
+            with self.lazyLock:
+                # the lazyLoader itself accesses my list from the loading thread
+                if self.lazyLoader is not None and not self.lazyLoading:
+                    self.lazyLoading=True
+                    try:
+                        self.lazyLoader()
+                        self.lazyLoader=None
+                    finally:
+                        self.lazyLoading=False
+                        
+    def getList(self)->list:
+        '''
+        get my list of entities - loading them lazily if needed
+        '''
+        self.loadLazily()
+        return super().getList()
+    
+    def invalidateIndex(self):
+        '''
+        invalidate my lookup index
+        
+        fromLoD and updateFromLod keep the index consistent - callers that modify attributes
+        of my entities in place or replace elements of my list need to call this afterwards
+        '''
+        self.entityIndex={}
+        self.entityIndexSignature=None
+        # whether all entities have a given attribute see getEventByKey
+        self.hasAttrIndex={}
+        
+    def checkIndex(self):
+        '''
+        make sure my lookup index is valid for my current entity list - the index
+        is dropped if the list has been replaced or its length changed but in place
+        modifications are not detected see invalidateIndex
+        '''
+        entityList=self.getList()
+        signature=(id(entityList),len(entityList))
+        if signature!=self.entityIndexSignature:
+            self.invalidateIndex()
+            self.entityIndexSignature=signature
+            
+    def getLookup(self,attrName:str,withDuplicates:bool=False):
+        '''
+        get a lookup dictionary by the given attribute name
+        
+        the lookups are built lazily and shared until my entity list changes - they must not be modified
+        
+        Args:
+            attrName(str): the attribute to lookup
+            withDuplicates(bool): whether to retain single values or lists
+        
+        Return:
+            a dictionary for lookup or a tuple dictionary,list of duplicates depending on withDuplicates
+        '''
+        self.checkIndex()
+        key=(attrName,withDuplicates)
+        if not key in self.entityIndex:
+            self.entityIndex[key]=LOD.getLookup(self.getList(), attrName, withDuplicates)
+        return self.entityIndex[key]
+    
+    def fromLoD(self,lod,append:bool=True,debug:bool=False):
+        '''
+        overwritten version of fromLoD that invalidates my lookup index if my list is replaced
+        and creates read-only CompactEntity instances in compact mode
+        '''
+        # legacy post processing modifies the entities and therefore needs the mutable entities
+        if self.compact and self.clazz is not None and not self.needsEntityListPostProcessing():
+            errors=self.fromLoDCompact(lod, append=append)
+        else:
+            errors=super().fromLoD(lod,append=append,debug=debug)
+        if not append:
+            self.invalidateIndex()
+        return errors
+    
+    def fromLoDCompact(self,lod:list,append:bool=True)->list:
+        '''
+        load my entityList from the given list of dicts as read-only CompactEntity instances
+        
+        Args:
+            lod(list): the list of dicts to load
+            append(bool): if True append to my existing entries
+            
+        Return:
+            list: a list of errors (if any)
+        '''
+        entityList=self.getList()
+        if not append:
+            del entityList[:]
+        if self.handleInvalidListTypes:
+            LOD.handleListTypes(lod=lod,doFilter=self.filterInvalidListTypes)
+        fields={}
+        for record in lod:
+            for key in record:
+                fields[key]=True
+        compactClass=CompactEntity.getClass(self.clazz,tuple(fields))
+        for record in lod:
+            entityList.append(CompactEntity.fromRecord(compactClass, record))
+        return []
+        
+    def getPrimaryKeyIndex(self)->dict:
+        '''
+        get the index of my entities by primary key
+        
+        Returns:
+            dict: the entities by primary key value
+        '''
+        return self.getLookup(attrName=self.primaryKey)[0]
+    
+    def addToIndex(self,entity):
+        '''
+        add the given entity that has just been appended to my list to all lookups built so far
+        
+        Args:
+            entity: the entity to add
+        '''
+        entityList=self.getList()
+        if self.entityIndexSignature!=(id(entityList),len(entityList)-1):
+            # the list has changed otherwise - the index will be rebuilt lazily
+            return
+        for (attrName,withDuplicates),lookupResult in self.entityIndex.items():
+            if withDuplicates:
+                lookup,duplicates=lookupResult,None
+            else:
+                lookup,duplicates=lookupResult
+            value=getattr(entity,attrName,None)
+            if value is not None:
+                values=value if isinstance(value,list) else [value]
+                for listValue in values:
+                    LOD.addLookup(lookup, duplicates, entity, listValue, withDuplicates)
+        self.hasAttrIndex={}
+        self.entityIndexSignature=(id(entityList),len(entityList))
+        
+    @classmethod
+    def getSampleFields(cls,entity)->list:
+        '''
+        get the fields of the samples of the class of the given entity
+        
+        Args:
+            entity: the entity to get the sample fields for
+            
+        Returns:
+            set: the sample fields - cached per class
+        '''
+        clazz=entity.__class__
+        if not clazz in cls.sampleFieldsByClass:
+            sampleFields=[]
+            if hasattr(entity, 'getSamples') and callable(entity.getSamples):
+                sampleFields=LOD.getFields(entity.getSamples())
+            cls.sampleFieldsByClass[clazz]=set(sampleFields)
+        return cls.sampleFieldsByClass[clazz]
 
     def fromCache(self,force:bool=False,getListOfDicts=None,append=False,sampleRecordCount=-1):
         '''
-        overwritten version of fromCache that calls postProcessEntityList
+        overwritten version of fromCache that calls postProcessLod on freshly fetched 
+        records before the entities are created and stored
         '''
         needsUpdate=not self.isCached() or force
-        super().fromCache(force, getListOfDicts, append, sampleRecordCount)
         if needsUpdate:
-            # TODO
-            # this is inefficient and uses 2x the memory 
-            # try postProcessing on lod instead
+            if getListOfDicts is None and hasattr(self, "getListOfDicts"):
+                getListOfDicts=self.getListOfDicts
+            if getListOfDicts is not None:
+                getRawListOfDicts=getListOfDicts
+                def getListOfDicts():
+                    listOfDicts=getRawListOfDicts()
+                    self.postProcessLod(listOfDicts,debug=self.debug)
+                    return listOfDicts
+        super().fromCache(force, getListOfDicts, append, sampleRecordCount)
+        if needsUpdate and self.needsEntityListPostProcessing():
+            # legacy post processing of the entities which needs a second store
             self.postProcessEntityList(debug=self.debug)
+            self.invalidateIndex()
             self.store()
             
+    def needsEntityListPostProcessing(self)->bool:
+        '''
+        check whether my class only overrides postProcessEntityList and not postProcessLod
+        '''
+        clazz=self.__class__
+        overridesEntityList=clazz.postProcessEntityList is not EventBaseManager.postProcessEntityList
+        overridesLod=clazz.postProcessLod is not EventBaseManager.postProcessLod
+        return overridesEntityList and not overridesLod
+            
+    def postProcessLod(self,listOfDicts:list,debug:bool=False):
+        '''
+        post process the freshly fetched list of dicts in place before 
+        the entities are created and stored - override this method
+        
+        Args:
+            listOfDicts(list): the list of raw records
+            debug(bool): if True show debug information
+        '''
+        pass
+            
+    def storeLoD(self,listOfDicts,limit=10000000,batchSize=250,cacheFile=None,append=False,fixNone=True,sampleRecordCount=1,replace:bool=False)->str:
+        '''
+        overwritten version of storeLoD that serializes the writes of concurrently loaded data sources
+        '''
+        with EventStorage.writeLock:
+            shadow=self.shadowStore and not append and self.config.mode is StoreMode.SQL
+            tableName=self.tableName
+            if shadow:
+                # write to the shadow table while readers keep using the current table
+                self.tableName=f"{tableName}{EventStorage.shadowTableSuffix}"
+            try:
+                if self.bulkStore and self.config.mode is StoreMode.SQL:
+                    cacheFile=self.storeLoDBulk(listOfDicts, cacheFile=cacheFile, append=append, fixNone=fixNone, sampleRecordCount=sampleRecordCount, replace=replace)
+                else:
+                    cacheFile=super().storeLoD(listOfDicts, limit=limit, batchSize=batchSize, cacheFile=cacheFile, append=append, fixNone=fixNone, sampleRecordCount=sampleRecordCount, replace=replace)
+            finally:
+                self.tableName=tableName
+            if shadow:
+                EventStorage.swapTable(self.sqldb, f"{tableName}{EventStorage.shadowTableSuffix}", tableName)
+            if self.config.mode is StoreMode.SQL:
+                # keep the instance count of the table up to date for getDataSourceInfos
+                EventStorage.updateTableMetadata([self.tableName], sqlDB=self.sqldb)
+            return cacheFile
+            
+    def storeLoDBulk(self,listOfDicts:list,cacheFile:str=None,append:bool=False,fixNone:bool=True,sampleRecordCount:int=1,replace:bool=False)->str:
+        '''
+        store the given list of dicts to my SQL table in a single transaction
+        with executemany and a prepared column list
+        
+        the secondary indices of the table and my indexColumns are created after the
+        rows have been inserted and synchronous=OFF is used while rebuilding
+        
+        Args:
+            listOfDicts(list): the list of dicts to store
+            cacheFile(str): the database file - if None use my cache file
+            append(bool): if True append to the existing table otherwise recreate it
+            fixNone(bool): if True set missing columns of the records to None
+            sampleRecordCount(int): the number of records to analyze for type information
+            replace(bool): if True allow replace for insert
+            
+        Returns:
+            str: the cache file
+        '''
+        startTime=time.time()
+        if cacheFile is None:
+            cacheFile=self.getCacheFile(config=self.config)
+        if self.handleInvalidListTypes:
+            LOD.handleListTypes(lod=listOfDicts,doFilter=self.filterInvalidListTypes,separator=self.listSeparator)
+        sqldb=self.getSQLDB(cacheFile)
+        entityInfo=self.initSQLDB(sqldb,listOfDicts,withCreate=False,withDrop=False,sampleRecordCount=sampleRecordCount)
+        columns=list(entityInfo.typeMap.keys())
+        if fixNone:
+            LOD.setNone4List(listOfDicts, columns)
+        replaceClause=" OR REPLACE" if replace else ""
+        placeholders=",".join(["?"]*len(columns))
+        insertCmd=f"INSERT{replaceClause} INTO {self.tableName} ({','.join(columns)}) VALUES ({placeholders})"
+        connection=sqldb.c
+        synchronous=connection.execute("PRAGMA synchronous").fetchone()[0]
+        connection.execute("PRAGMA synchronous=OFF")
+        try:
+            connection.execute("BEGIN")
+            # defer the existing secondary indices - the primary key is part of the table definition
+            indexDDLs=[]
+            if append:
+                indexQuery="SELECT name,sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL"
+                for indexName,indexDDL in connection.execute(indexQuery,(self.tableName,)).fetchall():
+                    connection.execute(f"DROP INDEX {indexName}")
+                    indexDDLs.append(indexDDL)
+            else:
+                connection.execute(entityInfo.dropTableCmd)
+                connection.execute(entityInfo.createTableCmd)
+            # a shadow table needs index names that differ from the ones of the table it replaces
+            baseTableName=self.tableName.replace(EventStorage.shadowTableSuffix,"")
+            indexNames=[name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name!=?",(self.tableName,)).fetchall()]
+            for column in self.indexColumns:
+                if column==self.primaryKey or not column in entityInfo.typeMap:
+                    continue
+                indexName=f"{baseTableName}_{column}"
+                if indexName in indexNames:
+                    indexName=f"{indexName}{EventStorage.shadowTableSuffix}"
+                indexDDLs.append(f"CREATE INDEX IF NOT EXISTS {indexName} ON {self.tableName}({column})")
+            if fixNone and len(columns)>1:
+                # all columns are set - get the row tuples without a python level loop
+                rows=map(operator.itemgetter(*columns),listOfDicts)
+            else:
+                rows=(tuple(record.get(column) for column in columns) for record in listOfDicts)
+            connection.executemany(insertCmd,rows)
+            for indexDDL in indexDDLs:
+                connection.execute(indexDDL)
+            connection.commit()
+        except Exception as ex:
+            connection.rollback()
+            raise ex
+        finally:
+            connection.execute(f"PRAGMA synchronous={synchronous}")
+        elapsed=max(time.time()-startTime,0.001)
+        rows=len(listOfDicts)
+        self.showProgress(f"bulk stored {rows} {self.entityPluralName} for {self.name} in {elapsed:5.1f} s {rows/elapsed:5.0f} rows/s")
+        return cacheFile
+    
     def postProcessEntityList(self,debug:bool=False):
         '''
-        postProcess my entities
+        postProcess my entities - prefer overriding postProcessLod which avoids a second store
         '''
         # override this method
         pass
@@ -652,12 +1404,28 @@ class EventBaseManager(EntityManager):
         return listOfDicts
 
     def getEventByKey(self, keyToSearch, keytype='pageTitle'):
-        for event in self.getList():
-            if hasattr(event, keytype):
-                if getattr(event, keytype) == keyToSearch:
-                    return event
-            else:
-                raise ValueError("Invalid keytype given")
+        '''
+        get the first event with the given value of the given key attribute from my lookup index
+        
+        Args:
+            keyToSearch: the value to search for
+            keytype(str): the name of the key attribute
+            
+        Returns:
+            the event or None if there is no such event
+            
+        Raises:
+            ValueError: if the event is not found and not all events have the key attribute
+        '''
+        eventsByKey=self.getLookup(keytype)[0]
+        if keyToSearch in eventsByKey:
+            return eventsByKey[keyToSearch]
+        if not keytype in self.hasAttrIndex:
+            self.hasAttrIndex[keytype]=all(hasattr(event, keytype) for event in self.getList())
+        hasKeyType=self.hasAttrIndex[keytype]
+        if not hasKeyType:
+            raise ValueError("Invalid keytype given")
+        return None
 
 
 class EventSeriesManager(EventBaseManager):
@@ -669,6 +1437,8 @@ class EventSeriesManager(EventBaseManager):
         constructor 
         '''
         super().__init__(name=name,entityName="EventSeries",entityPluralName="EventSeries",primaryKey=primaryKey,listName="series",clazz=clazz,sourceConfig=sourceConfig,handleInvalidListTypes=True,config=config,debug=debug) 
+        # the lookup columns of the series queries
+        self.indexColumns=["eventSeriesId","acronym"]
             
 class EventManager(EventBaseManager):
     '''
@@ -680,6 +1450,8 @@ class EventManager(EventBaseManager):
         constructor 
         '''
         super(EventManager, self).__init__(name=name,entityName="Event",entityPluralName="Events",primaryKey=primaryKey,listName="events",clazz=clazz,sourceConfig=sourceConfig,config=config,handleInvalidListTypes=True,debug=debug,profile=config.profile if config else False)
+        # the id column of CorpusLookup.getDictOfLod4MultiQuery and the lookup columns of the event queries
+        self.indexColumns=["eventId","acronym","lookupAcronym"]
         
  
     def linkSeriesAndEvent(self, eventSeriesManager:EventSeriesManager, seriesKey:str="series"):
@@ -691,9 +1463,9 @@ class EventManager(EventBaseManager):
             eventSeriesManager(EventSeriesManager):
         '''
         # get foreign key hashtable
-        self.seriesLookup = LOD.getLookup(self.getList(), seriesKey, withDuplicates=True)
+        self.seriesLookup = self.getLookup(seriesKey, withDuplicates=True)
         # get "primary" key hashtable
-        self.seriesAcronymLookup = LOD.getLookup(eventSeriesManager.getList(), "acronym", withDuplicates=True)
+        self.seriesAcronymLookup = eventSeriesManager.getLookup("acronym", withDuplicates=True)
 
         for seriesAcronym in self.seriesLookup.keys():
             if seriesAcronym in self.seriesAcronymLookup:
@@ -711,6 +1483,7 @@ class EventManager(EventBaseManager):
         """
         Return all the events in a given series.
         """
+        self.loadLazily()
         if seriesAcronym in self.seriesLookup:
             seriesEvents = self.seriesLookup[seriesAcronym]
             if self.debug:
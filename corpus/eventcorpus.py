@@ -8,6 +8,7 @@ from corpus.config import EventDataSourceConfig
 from corpus.quality.rating import RatingManager
 from corpus.utils.download import Download
 from corpus.utils.download import Profiler
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 class DataSource():
     '''
@@ -86,7 +87,7 @@ class EventDataSource(object):
         self.eventSeriesManager.dataSource=self
         pass
         
-    def load(self,forceUpdate=False,showProgress=False,debug=False):
+    def load(self,forceUpdate=False,showProgress=False,debug=False,lazy:bool=False):
         '''
         load this data source
         
@@ -94,18 +95,43 @@ class EventDataSource(object):
             forceUpdate(bool): if true force updating this datasource
             showProgress(bool): if true show the progress
             debug(bool): if true show debug information
+            lazy(bool): if true and the data source is cached only load the entities on first access of the managers' getList
+            
+        Returns:
+            float: the time in seconds it took to load this data source
         '''
         msg=f"loading {self.sourceConfig.title}"
         profiler=Profiler(msg=msg,profile=showProgress)
+        if lazy and not forceUpdate and self.eventManager.isCached() and self.eventSeriesManager.isCached():
+            self.eventSeriesManager.setLazyLoader(self.loadEventSeries)
+            self.eventManager.setLazyLoader(self.loadEvents)
+            self.loadTime=profiler.time()
+            return self.loadTime
         self.eventSeriesManager.configure()
         self.eventManager.configure()
         # first events
         self.eventManager.fromCache(force=forceUpdate)
-        # then series
+        # then series - e.g. the confref series are derived from the event_confref table
         self.eventSeriesManager.fromCache(force=forceUpdate)
         # TODO use same foreign key in all dataSources
         self.eventManager.linkSeriesAndEvent(self.eventSeriesManager,"inEventSeries")
-        profiler.time()
+        self.loadTime=profiler.time()
+        return self.loadTime
+        
+    def loadEventSeries(self):
+        '''
+        lazily load my event series from the cache
+        '''
+        self.eventSeriesManager.configure()
+        self.eventSeriesManager.fromCache()
+        
+    def loadEvents(self):
+        '''
+        lazily load my events from the cache and link them to the series
+        '''
+        self.eventManager.configure()
+        self.eventManager.fromCache()
+        self.eventManager.linkSeriesAndEvent(self.eventSeriesManager,"inEventSeries")
         
     def rateAll(self,ratingManager:RatingManager):
         '''
@@ -142,15 +168,52 @@ class EventCorpus(object):
         self.eventDataSources[eventDataSource.sourceConfig.lookupId]=eventDataSource
         pass
     
-    def loadAll(self,forceUpdate:bool=False,showProgress=False):
+    def loadAll(self,forceUpdate:bool=False,showProgress=False,parallel:bool=False,maxWorkers:int=None,lazy:bool=False)->dict:
         '''
         load all eventDataSources
         
         Args:
             forceUpdate(bool): True if the data should be fetched from the source instead of the cache
-        '''
-        for eventDataSource in self.eventDataSources.values():
-            eventDataSource.load(forceUpdate=forceUpdate,showProgress=showProgress)
+            showProgress(bool): if True show the progress and the timings per data source
+            parallel(bool): if True load the data sources concurrently on a thread pool
+            maxWorkers(int): the maximum number of threads to use - if None one per data source
+            lazy(bool): if True defer loading the entities of cached data sources until they are accessed
+            
+        Returns:
+            dict: the load time in seconds by lookupId
+        '''
+        loadTimes={}
+        profiler=Profiler(msg=f"loading {len(self.eventDataSources)} data sources",profile=showProgress)
+        if not parallel or len(self.eventDataSources)<2:
+            for lookupId,eventDataSource in self.eventDataSources.items():
+                loadTimes[lookupId]=eventDataSource.load(forceUpdate=forceUpdate,showProgress=showProgress,lazy=lazy)
+        else:
+            # the events and series of a data source are still loaded one after the other
+            # since the series may depend on the events e.g. for confref
+            # the SQLite writes are serialized with EventStorage.writeLock
+            if maxWorkers is None:
+                maxWorkers=len(self.eventDataSources)
+            errors=[]
+            with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+                futures={}
+                for lookupId,eventDataSource in self.eventDataSources.items():
+                    future=executor.submit(eventDataSource.load,forceUpdate=forceUpdate,showProgress=showProgress,lazy=lazy)
+                    futures[future]=lookupId
+                for future in as_completed(futures):
+                    lookupId=futures[future]
+                    try:
+                        loadTimes[lookupId]=future.result()
+                    except Exception as ex:
+                        errors.append((lookupId,ex))
+            if errors:
+                lookupId,ex=errors[0]
+                raise Exception(f"loading {lookupId} failed: {ex}") from ex
+        total=profiler.time()
+        if showProgress:
+            for lookupId,loadTime in sorted(loadTimes.items(),key=lambda item:-item[1]):
+                print(f"{lookupId:>16}: {loadTime:7.1f} s")
+            print(f"{'sum':>16}: {sum(loadTimes.values()):7.1f} s {total:7.1f} s elapsed")
+        return loadTimes
 
     @staticmethod
     def download():
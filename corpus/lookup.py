@@ -19,6 +19,7 @@ from lodstorage.lod import LOD
 from wikibot3rd.wikiuser import WikiUser
 from wikifile.wikiFileManager import WikiFileManager
 
+from concurrent.futures import ThreadPoolExecutor
 import os
 import re
 from os import path
@@ -61,6 +62,8 @@ class CorpusLookup(object):
     search and lookup for different EventCorpora
     '''
     lookupIds=["confref","crossref","dblp","gnd","tibkat","wikidata","wikicfp","or","or-backup","orclone","orclone-backup"]
+    # number of ids to bind per statement in getDictOfLod4MultiQuery - below the SQLite limit of 999 host parameters
+    idChunkSize=500
     
 
     def __init__(self,lookupIds:list=None,
@@ -137,7 +140,7 @@ class CorpusLookup(object):
         return None
 
 
-    def load(self,forceUpdate:bool=False,showProgress:bool=False,withCreateViews=True):
+    def load(self,forceUpdate:bool=False,showProgress:bool=False,withCreateViews=True,parallel:bool=False,maxWorkers:int=None,compact:bool=False,lazy:bool=False)->dict:
         '''
         load the event corpora
         
@@ -145,18 +148,35 @@ class CorpusLookup(object):
             forceUpdate(bool): if True the data should be fetched from the source instead of the cache
             showProgress(bool): if True the progress of the loading should be shown
             withCreateViews(bool): if True recreate the common views
+            parallel(bool): if True load the data sources concurrently
+            maxWorkers(int): the maximum number of threads for parallel loading
+            compact(bool): if True load the entities as read-only CompactEntity instances to save memory
+            lazy(bool): if True only load the entities of a cached data source on first access of its managers' getList - SQL queries via getLod4Query do not need the entities
+            
+        Returns:
+            dict: the load time in seconds by lookupId
         '''
         if self.configure:
             self.configure(self)
-        self.eventCorpus.loadAll(forceUpdate=forceUpdate,showProgress=showProgress)
+        for eventDataSource in self.eventCorpus.eventDataSources.values():
+            eventDataSource.eventManager.compact=compact
+            eventDataSource.eventSeriesManager.compact=compact
+        loadTimes=self.eventCorpus.loadAll(forceUpdate=forceUpdate,showProgress=showProgress,parallel=parallel,maxWorkers=maxWorkers,lazy=lazy)
         if withCreateViews:
             EventStorage.createViews(exclude=EventStorage.viewTableExcludes)
+        return loadTimes
     
     def getDataSourceInfos(self,withInstanceCount:bool=True):
         '''
         get the dataSource Infos
         '''
         infos=[]
+        if withInstanceCount:
+            tableNames=[]
+            for dataSource in self.eventCorpus.eventDataSources.values():
+                tableNames.extend([dataSource.eventManager.tableName,dataSource.eventSeriesManager.tableName])
+            # recorded in the metadata table when the data sources are stored
+            instanceCounts=EventStorage.getInstanceCounts(tableNames)
         for dataSourceName,dataSource in self.eventCorpus.eventDataSources.items():
             info={
                 "source":dataSourceName,
@@ -169,10 +189,7 @@ class CorpusLookup(object):
                 em=dataSource.eventManager
                 esm=dataSource.eventSeriesManager
                 for title,manager in [("event",em),("series",esm)]:
-                    query=f"SELECT count(*) as count from {manager.tableName}"
-                    lod=self.getLod4Query(query)
-                    record=lod[0]
-                    info[title]=record["count"]
+                    info[title]=instanceCounts[manager.tableName]
             infos.append(info)
         return infos
             
@@ -184,7 +201,7 @@ class CorpusLookup(object):
         Return:
             list: the list of dicts for the query
         '''
-        sqlDB=EventStorage.getSqlDB()
+        sqlDB=EventStorage.getSqlDB(readOnly=True)
         listOfDicts=sqlDB.query(query,params)
         return listOfDicts
     
@@ -214,12 +231,15 @@ class CorpusLookup(object):
                 raise Exception("need a variable for the tableName to be queried in {viewName} notation")   
         return var
     
-    def getDictOfLod4MultiQuery(self,multiquery:str,idQuery:str=None,omitFailed:bool=True)->dict:
+    def getDictOfLod4MultiQuery(self,multiquery:str,idQuery:str=None,omitFailed:bool=True,idParams=None,parallel:bool=False,maxWorkers:int=None)->dict:
         '''
         Args:
             multiquery(str): the multi query containing a variable
             idQuery(str): optional query to get lists of ids for selection
             omitFaild(bool): if True omit failed queries if False raise Exception on failure
+            idParams(tuple): the params of the idQuery, if any
+            parallel(bool): if True run the per source queries concurrently each thread with its own read-only connection
+            maxWorkers(int): the maximum number of threads for parallel queries - if None one per data source
             
         Return:
             dict: the dict of list of dicts for the queries derived
@@ -233,20 +253,24 @@ class CorpusLookup(object):
         viewName=self.getMultiQueryVariable(multiquery)
         variable="{%s}" % viewName
         dictOfLod={}
+        # the sequential queries use the same connection
+        sqlDB=EventStorage.getSqlDB(readOnly=True)
+        idColumn=f"{viewName}Id"
         # if an idquery is given create a dictionary of ids pers source
         if idQuery:
-            idLod=self.getLod4Query(idQuery)
+            idLod=sqlDB.query(idQuery,idParams)
             idDict={}
-            idColumn=f"{viewName}Id"
             for idRecord in idLod:
                 source=idRecord["source"]
-                recordId=f"'{idRecord[idColumn]}'"
+                recordId=idRecord[idColumn]
                 if source in idDict:
                     idDict[source].append(recordId)
                 else:
                     idDict[source]=[recordId]
         # get the tables to potentially query 
-        tableList=EventStorage.getViewTableList(viewName, exclude=EventStorage.viewTableExcludes)
+        tableList=EventStorage.getViewTableList(viewName, exclude=EventStorage.viewTableExcludes,sqlDB=sqlDB)
+        # the query and the ids to select (if any) by data source
+        sourceQueries={}
         # loop over all relevant tables
         for table in tableList:
             tableName=table["name"]
@@ -255,33 +279,90 @@ class CorpusLookup(object):
             tableSuffix=tableName.replace(f"{viewName}_","")
             # do we have a data source for the table?
             if tableSuffix in dataSourcesByTableSuffix:
-                # are we going to actually query?
-                queryDataSource=True
-                whereClause=""
                 # get the dataSource
                 dataSourceName=dataSourcesByTableSuffix[tableSuffix]["lookupId"]
                 # shall we select only certain ids?
                 if idQuery:
-                    # do we have an idList?
-                    if dataSourceName in idDict: 
-                        idList=",".join(idDict[dataSourceName])
-                        whereClause=f" WHERE {idColumn} in ({idList})"
-                    else:
-                        # no idList - do not query at all
-                        queryDataSource=False
-                # if we want to query
-                if queryDataSource:
-                    # query the table
-                    query=f"{queryPrefix}{whereClause}"
+                    # no idList - do not query at all
+                    if not dataSourceName in idDict:
+                        continue
+                    sourceQueries[dataSourceName]=(queryPrefix,idDict[dataSourceName])
+                else:
+                    sourceQueries[dataSourceName]=(queryPrefix,None)
+        if not parallel or len(sourceQueries)<2:
+            for dataSourceName,(query,idList) in sourceQueries.items():
+                try:
+                    # put the result into the dict for the given datasource
+                    dictOfLod[dataSourceName]=self.getLod4SourceQuery(sqlDB, query, idColumn, idList)
+                except sqlite3.OperationalError as ex:
+                    if not omitFailed:
+                        raise ex
+        else:
+            if maxWorkers is None:
+                maxWorkers=len(sourceQueries)
+            with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+                futures={}
+                for dataSourceName,(query,idList) in sourceQueries.items():
+                    futures[dataSourceName]=executor.submit(self.getLod4SourceQuery,None,query,idColumn,idList)
+                # keep the order of the sequential queries
+                for dataSourceName,future in futures.items():
                     try:
-                        # get the list of dicts
-                        lod=self.getLod4Query(query)
-                        # put the result into the dict for the given datasource
-                        dictOfLod[dataSourceName]=lod
+                        dictOfLod[dataSourceName]=future.result()
                     except sqlite3.OperationalError as ex:
                         if not omitFailed:
                             raise ex
         return dictOfLod
+    
+    def getLod4SourceQuery(self,sqlDB,query:str,idColumn:str,idList:list=None)->list:
+        '''
+        run the query for a single data source
+        
+        Args:
+            sqlDB(SQLDB): the database to query - if None get a read-only connection for the current thread
+            query(str): the query without WHERE clause
+            idColumn(str): the name of the id column to filter
+            idList(list): the ids to select - if None select all records
+            
+        Returns:
+            list: the list of dicts for the query
+        '''
+        if sqlDB is None:
+            # SQLite connections may only be used by the thread that created them
+            sqlDB=EventStorage.getSqlDB(readOnly=True)
+        if idList is None:
+            lod=sqlDB.query(query)
+        else:
+            lod=self.getLod4IdList(sqlDB, query, idColumn, idList)
+        return lod
+    
+    def getLod4IdList(self,sqlDB,query:str,idColumn:str,idList:list,chunkSize:int=None)->list:
+        '''
+        run the given query restricted to the given ids with bound parameters
+        
+        the ids are bound in chunks of the same size so that SQLite's statement cache 
+        can reuse the prepared statements and the host parameter limit is not exceeded
+        
+        Args:
+            sqlDB(SQLDB): the database to query
+            query(str): the query without WHERE clause
+            idColumn(str): the name of the id column to filter
+            idList(list): the ids to select
+            chunkSize(int): the number of ids per statement - if None use idChunkSize
+            
+        Returns:
+            list: the list of dicts for all chunks
+        '''
+        if chunkSize is None:
+            chunkSize=CorpusLookup.idChunkSize
+        lod=[]
+        for offset in range(0,len(idList),chunkSize):
+            chunk=idList[offset:offset+chunkSize]
+            # pad the last chunk with NULLs which never match to keep the statement text the same
+            size=chunkSize if len(idList)>chunkSize else len(chunk)
+            params=tuple(chunk)+(None,)*(size-len(chunk))
+            placeholders=",".join(["?"]*size)
+            lod.extend(sqlDB.query(f"{query} WHERE {idColumn} IN ({placeholders})",params))
+        return lod
         
         
 __version__ = "0.0.27"
@@ -336,7 +417,7 @@ USAGE
         Wikidata.endpoint=args.endpoint
         lookupIds=args.datasources.split(",")
         lookup=CorpusLookup(debug=args.debug,lookupIds=lookupIds,configure=CorpusLookupConfigure.configureCorpusLookup)
-        lookup.load(forceUpdate=args.forceUpdate)
+        lookup.load(forceUpdate=args.forceUpdate,lazy=True)
         if args.uml:
             for baseEntity in ["Event","EventSeries"]:
                 plantUml=lookup.asPlantUml(baseEntity)
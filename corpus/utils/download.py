@@ -4,8 +4,11 @@ Created on 2021-08-21
 @author: wf
 '''
 import os
-import urllib
+import re
+import urllib.request
+import urllib.error
 import gzip
+import hashlib
 import shutil
 import time
 
@@ -79,6 +82,113 @@ class Download:
                 raise (f"could not extract {fileName} from {zipped}")
         return extractTo
     
+    @staticmethod
+    def getMd5(filePath:str,chunkSize:int=1024*1024)->str:
+        '''
+        get the md5 checksum of the given file reading it in chunks
+        
+        Args:
+            filePath(str): the path of the file
+            chunkSize(int): the number of bytes to read at a time
+            
+        Return:
+            str: the hex digest of the md5 checksum
+        '''
+        md5=hashlib.md5()
+        with open(filePath,"rb") as f:
+            for chunk in iter(lambda: f.read(chunkSize), b""):
+                md5.update(chunk)
+        return md5.hexdigest()
+    
+    @staticmethod
+    def streamDownload(url:str,filePath:str,md5:str=None,resume:bool=True,chunkSize:int=1024*1024,timeout:float=60.0,verbose:bool=False)->str:
+        '''
+        download the given url to the given filePath in chunks without holding the content in memory
+        
+        the content is written to a ".part" file first which is renamed to filePath when the
+        download is complete and verified - an existing ".part" file is resumed with 
+        a HTTP Range request if the server supports it
+        
+        Args:
+            url(str): the url to download
+            filePath(str): the path of the file to download to
+            md5(str): the expected md5 checksum of the content (if any)
+            resume(bool): if True resume a partial download
+            chunkSize(int): the number of bytes to read at a time
+            timeout(float): the timeout in seconds for the connection
+            verbose(bool): if True show what is going on
+            
+        Return:
+            str: the filePath
+            
+        Raises:
+            Exception: if the download is incomplete or the checksum does not match
+        '''
+        partPath=f"{filePath}.part"
+        offset=0
+        if resume and os.path.isfile(partPath):
+            offset=os.path.getsize(partPath)
+        request=urllib.request.Request(url)
+        if offset>0:
+            request.add_header("Range",f"bytes={offset}-")
+        total=None
+        try:
+            with urllib.request.urlopen(request,timeout=timeout) as response:
+                contentRange=response.headers.get("Content-Range")
+                if offset>0 and response.status==206 and contentRange:
+                    mode="ab"
+                    rangeMatch=re.search(r"/(\d+)$",contentRange)
+                    if rangeMatch:
+                        total=int(rangeMatch.group(1))
+                    if verbose:
+                        print(f"resuming download of {url} at {offset} bytes")
+                else:
+                    # the server ignored the range request - start from scratch
+                    mode="wb"
+                    offset=0
+                    contentLength=response.headers.get("Content-Length")
+                    if contentLength is not None:
+                        total=int(contentLength)
+                with open(partPath,mode) as partFile:
+                    shutil.copyfileobj(response,partFile,chunkSize)
+        except urllib.error.HTTPError as httpError:
+            # 416: Range not satisfiable - the partial file is already complete
+            if httpError.code!=416 or offset==0:
+                raise httpError
+        size=os.path.getsize(partPath)
+        if total is not None and size!=total:
+            raise Exception(f"download of {url} incomplete: {size} of {total} bytes - retry to resume")
+        if md5 is not None:
+            actualMd5=Download.getMd5(partPath,chunkSize=chunkSize)
+            if actualMd5!=md5:
+                os.remove(partPath)
+                if offset>0:
+                    # the partial file might have been stale - try once more from scratch
+                    return Download.streamDownload(url, filePath, md5=md5, resume=False, chunkSize=chunkSize, timeout=timeout, verbose=verbose)
+                raise Exception(f"md5 checksum mismatch for {url}: expected {md5} got {actualMd5}")
+        os.replace(partPath,filePath)
+        return filePath
+    
+    @staticmethod
+    def gunzipFile(gzPath:str,filePath:str,chunkSize:int=1024*1024)->str:
+        '''
+        decompress the given gzip file to the given filePath in chunks
+        
+        Args:
+            gzPath(str): the path of the gzip file
+            filePath(str): the path of the file to decompress to
+            chunkSize(int): the number of bytes to read at a time
+            
+        Return:
+            str: the filePath
+        '''
+        partPath=f"{filePath}.part"
+        with gzip.open(gzPath,"rb") as gzipped:
+            with open(partPath,"wb") as unzipped:
+                shutil.copyfileobj(gzipped,unzipped,chunkSize)
+        os.replace(partPath,filePath)
+        return filePath
+    
 class Profiler:
     '''
     simple profiler
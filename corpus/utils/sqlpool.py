@@ -0,0 +1,125 @@
+'''
+Created on 2023-02-10
+
+@author: wf
+'''
+import os
+import pathlib
+import sqlite3
+import threading
+from lodstorage.sql import SQLDB
+
+class SQLDBPool:
+    '''
+    thread-safe pool of SQLDB connections keyed by database file and access mode
+
+    SQLite connections may only be used by the thread that created them so each
+    thread gets its own connection per database file and mode which is reused
+    for all later calls of that thread e.g. the worker threads of the webserver
+    '''
+    # tuned pragmas for all connections
+    defaultPragmas={
+        # map up to 256 MB of the database file to memory
+        "mmap_size":256*1024*1024,
+        # negative values are in KiB - 64 MB page cache
+        "cache_size":-64*1024,
+        "temp_store":"MEMORY"
+    }
+
+    def __init__(self,wal:bool=False,pragmas:dict=None,timeout:float=5.0):
+        '''
+        constructor
+
+        Args:
+            wal(bool): if True switch writeable databases to the write ahead log journal mode - this is persistent in the database file
+            pragmas(dict): the pragmas to set for each new connection - if None use the defaultPragmas
+            timeout(float): number of seconds to wait for a locked database
+        '''
+        self.wal=wal
+        self.pragmas=SQLDBPool.defaultPragmas if pragmas is None else pragmas
+        self.timeout=timeout
+        self.local=threading.local()
+        self.lock=threading.Lock()
+        # all connections of all threads so that they can be closed
+        self.connections=[]
+
+    def connect(self,dbFile:str,readOnly:bool=False)->sqlite3.Connection:
+        '''
+        open a new connection to the given database file
+
+        Args:
+            dbFile(str): the path of the database file
+            readOnly(bool): if True open the database with mode=ro and query_only
+
+        Returns:
+            sqlite3.Connection: the connection
+        '''
+        if readOnly:
+            uri=f"{pathlib.Path(dbFile).as_uri()}?mode=ro"
+            connection=sqlite3.connect(uri,uri=True,detect_types=sqlite3.PARSE_DECLTYPES,timeout=self.timeout)
+            connection.execute("PRAGMA query_only=ON")
+        else:
+            connection=sqlite3.connect(dbFile,detect_types=sqlite3.PARSE_DECLTYPES,timeout=self.timeout)
+            if self.wal:
+                connection.execute("PRAGMA journal_mode=WAL")
+        for pragma,value in self.pragmas.items():
+            connection.execute(f"PRAGMA {pragma}={value}")
+        return connection
+
+    def getSqlDB(self,dbFile:str,readOnly:bool=False)->SQLDB:
+        '''
+        get the SQLDB for the given database file for the current thread
+
+        Args:
+            dbFile(str): the path of the database file
+            readOnly(bool): if True get a read-only connection
+
+        Returns:
+            SQLDB: the cached or new SQLDB
+        '''
+        dbFile=os.path.abspath(dbFile)
+        # a replaced database file needs a new connection
+        inode=os.stat(dbFile).st_ino if os.path.isfile(dbFile) else None
+        key=(dbFile,readOnly)
+        if not hasattr(self.local,"sqlDBs"):
+            self.local.sqlDBs={}
+        cached=self.local.sqlDBs.get(key)
+        if cached is not None:
+            cachedInode,sqlDB=cached
+            if cachedInode==inode:
+                return sqlDB
+            self.close(sqlDB)
+        connection=self.connect(dbFile, readOnly)
+        if inode is None:
+            inode=os.stat(dbFile).st_ino
+        sqlDB=SQLDB(dbFile,connection=connection)
+        self.local.sqlDBs[key]=(inode,sqlDB)
+        with self.lock:
+            self.connections.append(connection)
+        return sqlDB
+
+    def close(self,sqlDB:SQLDB):
+        '''
+        close the given pooled SQLDB
+        '''
+        with self.lock:
+            if sqlDB.c in self.connections:
+                self.connections.remove(sqlDB.c)
+        sqlDB.c.close()
+
+    def closeAll(self):
+        '''
+        close the connections of all threads
+
+        sqlite3 does not allow closing connections of other threads - these are
+        dropped from the pool and closed when they are garbage collected
+        '''
+        with self.lock:
+            connections=self.connections
+            self.connections=[]
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.ProgrammingError:
+                pass
+        self.local=threading.local()
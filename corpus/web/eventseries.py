@@ -37,8 +37,8 @@ class EventSeriesAPI():
             name(str): the name of the event series to be queried
         '''
         multiQuery = "select * from {event}"
-        idQuery = f"""select source,eventId from event where lookupAcronym LIKE "{name} %" order by year desc"""
-        dictOfLod = self.lookup.getDictOfLod4MultiQuery(multiQuery, idQuery)
+        idQuery = """select source,eventId from event where lookupAcronym LIKE ? order by year desc"""
+        dictOfLod = self.lookup.getDictOfLod4MultiQuery(multiQuery, idQuery, idParams=(f"{name} %",))
         if bks:
             allowedBks = bks.split(",") if bks else None
             self.filterForBk(dictOfLod.get("tibkat"), allowedBks)
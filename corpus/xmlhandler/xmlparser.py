@@ -6,11 +6,269 @@ Created on 2022-03-04
 from xml.etree.ElementTree import Element
 from xml.etree import cElementTree as ElementTree
 from xml.etree.ElementTree import ParseError
-#from lxml.etree.ElementTree import ElementTree
 from typing import Iterator
+import re
 import sys
 from corpus.utils.progress import Progress
+try:
+    from lxml import etree as lxmlEtree
+    parseErrors=(ParseError,lxmlEtree.XMLSyntaxError)
+except ImportError:
+    # fall back to the standard library ElementTree
+    lxmlEtree=None
+    parseErrors=(ParseError,)
 
+class XmlPropertyExtractor(object):
+    '''
+    precompiled extractor for the properties of an xmlPropertyMap
+    
+    the simple xpath expressions used in the property maps 
+    e.g. './/ns0:identifiers/ns0:identifier[@type="ppn"]' are compiled once
+    into a list of steps so that each record subtree is walked only once
+    dispatching on the tag of the elements visited - expressions that can
+    not be compiled are evaluated with findall
+    
+    which properties match only depends on the tags and predicate attribute values 
+    along the path of an element so the match results are cached by this path signature
+    '''
+    stepPattern=re.compile(r"(//|/)([^/\[]+)(\[[^\]]*\])?")
+    predicatePattern=re.compile(r"""^\[@([\w:]+)=["']([^"']*)["']\]$""")
+    
+    def __init__(self,xmlPropertyMap:dict,namespaces:dict):
+        '''
+        constructor
+        
+        Args:
+            xmlPropertyMap(dict): attribute/xpath expression dict
+            namespaces(dict): namespace / namespace path dict 
+        '''
+        self.xmlPropertyMap=xmlPropertyMap
+        self.namespaces=namespaces
+        # attributes used in predicates - their values are part of the path signature
+        self.predicateAttrs=[]
+        # list of (prop,attr,xpath,steps) in the order of the property map
+        self.props=[]
+        # compiled properties by the tag of the last step
+        self.propsByTag={}
+        for prop, xpath in xmlPropertyMap.items():
+            attr=None
+            if "@" in prop:
+                propparts=prop.split("@")
+                prop=propparts[0]
+                attr=propparts[1]
+            steps=self.compile(xpath)
+            index=len(self.props)
+            self.props.append((prop,attr,xpath,steps))
+            if steps is not None:
+                lastTag=steps[-1][1]
+                if not lastTag in self.propsByTag:
+                    self.propsByTag[lastTag]=[]
+                self.propsByTag[lastTag].append((index,steps))
+        self.predicateAttrs=tuple(self.predicateAttrs)
+        # property indices by path signature
+        self.matchCache={}
+        # natively compiled xpath expressions for lxml elements - created on first use
+        self.lxmlXPaths=None
+                
+    def qname(self,tag:str)->str:
+        '''
+        get the qualified name for the given prefixed tag e.g. ns0:document
+        
+        Args:
+            tag(str): the tag with an optional namespace prefix
+            
+        Returns:
+            str: the {namespace}tag qualified name or None if the prefix is unknown
+        '''
+        if ":" in tag:
+            prefix,localName=tag.split(":",1)
+            if not prefix in self.namespaces:
+                return None
+            return f"{{{self.namespaces[prefix]}}}{localName}"
+        return tag
+        
+    def compile(self,xpath:str)->list:
+        '''
+        compile the given xpath expression into a list of (descendant,tag,predicate) steps
+        
+        Args:
+            xpath(str): a relative xpath expression e.g. ./ns0:systemInfo/ns0:databaseDate
+            
+        Returns:
+            list: the steps or None if the xpath expression is not supported
+        '''
+        if not xpath.startswith("./"):
+            return None
+        path=xpath[1:]
+        steps=[]
+        pos=0
+        for match in XmlPropertyExtractor.stepPattern.finditer(path):
+            if match.start()!=pos:
+                return None
+            pos=match.end()
+            descendant=match.group(1)=="//"
+            tag=self.qname(match.group(2))
+            if tag is None or tag in ["*",".",".."]:
+                return None
+            predicate=None
+            if match.group(3):
+                predicateMatch=XmlPropertyExtractor.predicatePattern.match(match.group(3))
+                if not predicateMatch:
+                    return None
+                predicateAttr=self.qname(predicateMatch.group(1))
+                if predicateAttr is None:
+                    return None
+                predicate=(predicateAttr,predicateMatch.group(2))
+            steps.append((descendant,tag,predicate))
+        if pos!=len(path) or len(steps)==0:
+            return None
+        # register the predicate attributes only for valid expressions
+        for _descendant,_tag,predicate in steps:
+            if predicate is not None and not predicate[0] in self.predicateAttrs:
+                self.predicateAttrs.append(predicate[0])
+        return steps
+    
+    def getNodeKey(self,element)->tuple:
+        '''
+        get the signature of the given element: its tag and the values of the predicate attributes
+        '''
+        if self.predicateAttrs:
+            return (element.tag,tuple(element.get(attr) for attr in self.predicateAttrs))
+        return (element.tag,None)
+    
+    def matchStep(self,step,nodeKey:tuple)->bool:
+        '''
+        check whether the given node signature matches the given step
+        '''
+        _descendant,tag,predicate=step
+        if nodeKey[0]!=tag:
+            return False
+        if predicate is not None:
+            attr,value=predicate
+            return nodeKey[1][self.predicateAttrs.index(attr)]==value
+        return True
+        
+    def matches(self,steps:list,path:tuple,stepIndex:int,pathIndex:int)->bool:
+        '''
+        check whether the given steps up to stepIndex match the path up to pathIndex
+        
+        Args:
+            steps(list): the compiled steps
+            path(tuple): the node signatures from the record element's child down to the current element
+            stepIndex(int): the index of the step to match
+            pathIndex(int): the index of the node in the path to match it with
+        '''
+        step=steps[stepIndex]
+        if not self.matchStep(step, path[pathIndex]):
+            return False
+        descendant=step[0]
+        if stepIndex==0:
+            return descendant or pathIndex==0
+        if descendant:
+            for parentIndex in range(pathIndex-1,-1,-1):
+                if self.matches(steps, path, stepIndex-1, parentIndex):
+                    return True
+            return False
+        else:
+            return pathIndex>0 and self.matches(steps, path, stepIndex-1, pathIndex-1)
+        
+    def getMatchingProps(self,path:tuple)->list:
+        '''
+        get the indices of the properties matching the given path signature
+        
+        Args:
+            path(tuple): the node signatures from the record element's child down to the current element
+            
+        Returns:
+            list: the indices of the matching properties
+        '''
+        indices=self.matchCache.get(path)
+        if indices is None:
+            indices=[]
+            for index,steps in self.propsByTag[path[-1][0]]:
+                if self.matches(steps, path, len(steps)-1, len(path)-1):
+                    indices.append(index)
+            self.matchCache[path]=indices
+        return indices
+        
+    def visit(self,element,path:list,found:list):
+        '''
+        visit the children of the given element recursively
+        
+        Args:
+            element: the element to visit the children of
+            path(list): the node signatures down to the given element
+            found(list): the list of value elements found per property
+        '''
+        for child in element:
+            tag=child.tag
+            # skip comments and processing instructions
+            if not isinstance(tag,str):
+                continue
+            path.append(self.getNodeKey(child))
+            if tag in self.propsByTag:
+                for index in self.getMatchingProps(tuple(path)):
+                    found[index].append(child)
+            self.visit(child, path, found)
+            path.pop()
+            
+    def getLxmlXPaths(self)->list:
+        '''
+        get the xpath expressions of my properties compiled by lxml
+        
+        Returns:
+            list: a compiled lxml XPath per property or None if lxml can not compile the expression
+        '''
+        if self.lxmlXPaths is None:
+            self.lxmlXPaths=[]
+            for _prop,_attr,xpath,_steps in self.props:
+                try:
+                    lxmlXPath=lxmlEtree.XPath(xpath,namespaces=self.namespaces)
+                except lxmlEtree.XPathSyntaxError:
+                    lxmlXPath=None
+                self.lxmlXPaths.append(lxmlXPath)
+        return self.lxmlXPaths
+    
+    def extractLxml(self,element)->list:
+        '''
+        extract the value elements for my properties from the given lxml record element
+        using the natively compiled xpath expressions
+        
+        walking the subtree in python is slower for lxml than for ElementTree since
+        every element visited needs a python proxy object
+        '''
+        result=[]
+        for (prop,attr,xpath,_steps),lxmlXPath in zip(self.props,self.getLxmlXPaths()):
+            if lxmlXPath is None:
+                valueElements=element.findall(xpath,self.namespaces)
+            else:
+                valueElements=lxmlXPath(element)
+            result.append((prop,attr,valueElements))
+        return result
+        
+    def extract(self,element)->list:
+        '''
+        extract the value elements for my properties from the given record element
+        
+        Args:
+            element: the record element
+            
+        Returns:
+            list: a list of (prop,attr,valueElements) tuples in the order of the property map
+        '''
+        if lxmlEtree is not None and isinstance(element,lxmlEtree._Element):
+            return self.extractLxml(element)
+        found=[[] for _prop in self.props]
+        self.visit(element,[],found)
+        result=[]
+        for index,(prop,attr,xpath,steps) in enumerate(self.props):
+            if steps is None:
+                valueElements=element.findall(xpath,self.namespaces)
+            else:
+                valueElements=found[index]
+            result.append((prop,attr,valueElements))
+        return result
+    
 class XmlEntity(object):
     '''
     an entity based on an XML object
@@ -18,38 +276,59 @@ class XmlEntity(object):
     debug=False
     encoding="utf-8"
     
-    def __init__(self,element:Element,xmlPropertyMap:dict,namespaces:dict):
+    def __init__(self,element:Element,xmlPropertyMap:dict,namespaces:dict,extractor:XmlPropertyExtractor=None):
         ''' 
         constructor
         
         Args:
             element: the element to construct me from
+            xmlPropertyMap(dict): attribute/xpath expression dict
+            namespaces(dict): namespace / namespace path dict 
+            extractor(XmlPropertyExtractor): optional precompiled extractor for the xmlPropertyMap
         '''
         self._props=[]
         if XmlEntity.debug:
-            xml=ElementTree.tostring(element).decode(XmlEntity.encoding)
+            if lxmlEtree is not None and isinstance(element,lxmlEtree._Element):
+                xml=lxmlEtree.tostring(element).decode(XmlEntity.encoding)
+            else:
+                xml=ElementTree.tostring(element).decode(XmlEntity.encoding)
             # debug e.g. with http://xpather.com/
             print(xml)
             setattr(self,"rawxml",xml)
-        for prop, xpath in xmlPropertyMap.items():
-            attr=None
-            if "@"in prop:
-                propparts=prop.split("@")
-                prop=propparts[0]
-                attr=propparts[1]
-            valueElements = element.findall(xpath,namespaces)
-            if valueElements is not None and len(valueElements)>0:
-                # single or multi?
-                if len(valueElements)==1:
-                    value=self.getValue(valueElements[0],attr) 
-                else:
-                    value=[]
-                    for valueElement in valueElements:
-                        value.append(self.getValue(valueElement,attr))
-                setattr(self,prop,value)
-                self._props.append(prop)
+        if extractor is not None:
+            for prop,attr,valueElements in extractor.extract(element):
+                self.setProperty(prop,attr,valueElements)
+        else:
+            for prop, xpath in xmlPropertyMap.items():
+                attr=None
+                if "@"in prop:
+                    propparts=prop.split("@")
+                    prop=propparts[0]
+                    attr=propparts[1]
+                valueElements = element.findall(xpath,namespaces)
+                self.setProperty(prop,attr,valueElements)
         pass        
     
+    def setProperty(self,prop:str,attr:str,valueElements:list):
+        '''
+        set the given property from the given value elements
+        
+        Args:
+            prop(str): the name of the property
+            attr(str): the attribute to get the value for - if None get the text
+            valueElements(list): the elements found for the property
+        '''
+        if valueElements is not None and len(valueElements)>0:
+            # single or multi?
+            if len(valueElements)==1:
+                value=self.getValue(valueElements[0],attr) 
+            else:
+                value=[]
+                for valueElement in valueElements:
+                    value.append(self.getValue(valueElement,attr))
+            setattr(self,prop,value)
+            self._props.append(prop)
+    
     def getValue(self,element,attr:str=None):
         '''
         get the value from the element
@@ -86,7 +365,7 @@ class XMLEntityParser():
     '''
     a parser for XML Entities
     '''
-    def __init__(self,filePath:str,recordsTag:str,progress:Progress=None):
+    def __init__(self,filePath:str,recordsTag:str,progress:Progress=None,useLxml:bool=True):
         '''
         Constructor
         
@@ -94,16 +373,21 @@ class XMLEntityParser():
             filePath(str): the path to the xml file to parse
             recordsTag(str): the name of the tag to parse
             progressSteps(int): how often to show the progress of the parser
+            useLxml(bool): if True use lxml for parsing if it is available
         '''
         self.filePath=filePath
         self.recordsTag=recordsTag
         self.progress=progress
+        self.useLxml=useLxml and lxmlEtree is not None
         
     def readXmlFile(self) -> Iterator[Element]:
         '''
            Reads an XML file element by element and returns an iterator XML elements
            see https://github.com/sopherapps/xml_stream/blob/master/xml_stream/__init__.py 
         '''
+        if self.useLxml:
+            yield from self.readXmlFileWithLxml()
+            return
         with open(self.filePath, 'rb') as xml_file:
             context = ElementTree.iterparse(xml_file, events=('start', 'end',))
             context = iter(context)
@@ -118,20 +402,39 @@ class XMLEntityParser():
                     # clear the root element to leave it empty and use less memory
                     if root != element:
                         root.clear()
+                        
+    def readXmlFileWithLxml(self) -> Iterator[Element]:
+        '''
+        Reads an XML file with lxml only creating events for the end of my records tag 
+        and returns an iterator of XML elements
+        
+        each element is cleared after it has been processed together with its preceding siblings
+        see DblpXml.clear_element
+        '''
+        # https://lxml.de/api/lxml.etree.iterparse-class.html
+        context=lxmlEtree.iterparse(self.filePath, events=('end',), tag=self.recordsTag, huge_tree=True)
+        for _event, element in context:
+            yield element
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        del context
         
-    def parse(self,xmlPropertyMap:dict,namespaces:dict)-> Iterator[XmlEntity]:
+    def parse(self,xmlPropertyMap:dict,namespaces:dict,compiled:bool=True)-> Iterator[XmlEntity]:
         '''
         parse my file
         
         Args:
             xmlPropertyMap(dict): attribute/xpath expression dict
             namespaces(dict): namespace / namespace path dict 
+            compiled(bool): if True use a precompiled XmlPropertyExtractor instead of one findall per property
         '''
+        extractor=XmlPropertyExtractor(xmlPropertyMap,namespaces) if compiled else None
         try:
             for element in self.readXmlFile():
-                yield XmlEntity(element,xmlPropertyMap,namespaces)
+                yield XmlEntity(element,xmlPropertyMap,namespaces,extractor=extractor)
                 if self.progress is not None:
                     self.progress.next()
-        except ParseError as parseError:
+        except parseErrors as parseError:
             print (f"parse error in {self.filePath}:{parseError}", file=sys.stderr)
             pass
\ No newline at end of file
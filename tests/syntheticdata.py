@@ -0,0 +1,168 @@
+'''
+Created on 2023-02-10
+
+@author: wf
+'''
+from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from tests.wikicfpstub import WikiCfpStub
+
+class SyntheticData(object):
+    '''
+    synthetic test fixtures for the tests that can not rely on the real data sources
+    '''
+    
+    @staticmethod
+    def getTempDir(testCase:TestCase,prefix:str)->str:
+        '''
+        get a new temporary directory that is removed when the given test is finished
+        
+        Args:
+            testCase(TestCase): the test to register the cleanup with
+            prefix(str): the prefix of the directory name
+            
+        Returns:
+            str: the path of the directory
+        '''
+        path=tempfile.mkdtemp(prefix=prefix)
+        testCase.addCleanup(shutil.rmtree,path,ignore_errors=True)
+        return path
+    
+    @staticmethod
+    def getEventLod(count:int)->list:
+        '''
+        get a list of dicts of synthetic events with string values
+        
+        Args:
+            count(int): the number of events
+            
+        Returns:
+            list: the event records with "<field> <index>" values e.g. "pageTitle 42"
+        '''
+        fields=["pageTitle","acronym","ordinal","eventType","subject","startDate","endDate","homepage","title","series",
+                "country","region","city","acceptedPapers","submittedPapers","presence","year","source","eventId","lookupAcronym"]
+        lod=[{field:f"{field} {i}" for field in fields} for i in range(count)]
+        return lod
+    
+    @staticmethod
+    def getTypedEventLod(count:int)->list:
+        '''
+        get a list of dicts of synthetic events with typed values
+        
+        Args:
+            count(int): the number of events
+            
+        Returns:
+            list: the event records with 20 distinct acronyms, None cities and datetime start dates
+        '''
+        lod=[{"eventId":f"conf/{i}","acronym":f"CONF {2000+i%20}","ordinal":i%20+1,"city":"Berlin" if i%2==0 else None,"startDate":datetime(2000+i%20,10,1)} for i in range(count)]
+        return lod
+    
+    @staticmethod
+    def createFtxFiles(path:str,files:int=4,documentsPerFile:int=100)->list:
+        '''
+        create synthetic FTX xml files with the structure of the TIBKAT FTX dump
+        
+        Args:
+            path(str): the directory to create the files in
+            files(int): the number of files to create
+            documentsPerFile(int): the number of documents per file
+            
+        Returns:
+            list: the names of the files created
+        '''
+        os.makedirs(path,exist_ok=True)
+        fileNames=[]
+        bks=["54.72","54.10","30.20","54.62"]
+        for fileIndex in range(files):
+            xml="""<?xml version="1.0" encoding="UTF-8"?>
+<documents xmlns="http://www.openarchives.org/OAI/2.0/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/">
+"""
+            for docIndex in range(documentsPerFile):
+                ppn=f"{fileIndex*documentsPerFile+docIndex:09d}"
+                ordinal=docIndex%20+1
+                year=1990+docIndex%30
+                bk=bks[docIndex%len(bks)]
+                xml+=f"""<document>
+<systemInfo><databaseDate>2021-12-20</databaseDate><changeDate>2021-11-{1+docIndex%28:02d}</changeDate><ftxCreationDate>2021-12-20</ftxCreationDate><documentID>TIBKAT:{ppn}</documentID></systemInfo>
+<formalInfo><documentGenre><documentGenreCode>CP</documentGenreCode></documentGenre><documentType><documentTypeCode>BK</documentTypeCode></documentType></formalInfo>
+<identifiers><identifier type="ppn">{ppn}</identifier><identifier type="firstid">GBV:{ppn}</identifier><identifier type="isbn13">97836422{ppn[-5:]}</identifier></identifiers>
+<corporateCreators><corporateCreator type="author"><name>Conference {docIndex}</name><corporateIDs><corporateID type="gnd">{docIndex}-1</corporateID></corporateIDs></corporateCreator><corporateCreator type="sponsor"><name>Sponsor {docIndex}</name></corporateCreator></corporateCreators>
+<bibliographicInfo><dc:title>Proceedings of the {ordinal}th Conference CONF{docIndex%50}</dc:title>
+<alternativeTitles><dcterms:alternative>CONF{docIndex%50} {year}</dcterms:alternative></alternativeTitles>
+<publicationInfo><dcterms:issued>{year}</dcterms:issued><publicationPlaces><publicationPlace>Berlin</publicationPlace></publicationPlaces><dc:publisher>Springer</dc:publisher></publicationInfo></bibliographicInfo>
+<conferenceInfo><name>CONF{docIndex%50} ; {ordinal}</name><places><place>Memphis, Tenn.</place></places><dates><dc:date>{year}</dc:date></dates>
+<dc:description>CONF{docIndex%50} ; {ordinal} (Memphis, Tenn.) : {year}.10.09-12</dc:description><dc:description>Conference {docIndex} ; {ordinal} (Memphis, Tenn.) : {year}.10.09-12</dc:description></conferenceInfo>
+<classificationInfo><classifications><classification classificationName="bk"><code>{bk}</code></classification><classification classificationName="ddc"><code>004</code></classification></classifications></classificationInfo>
+</document>
+"""
+            xml+="</documents>\n"
+            fileName=f"synthetic_ftx_{fileIndex:04d}.xml"
+            with open(f"{path}/{fileName}","w") as xmlFile:
+                xmlFile.write(xml)
+            fileNames.append(fileName)
+        return fileNames
+    
+    @staticmethod
+    def createWikiCfpEventFiles(path:str,batches:int=5,eventsPerBatch:int=1000)->list:
+        '''
+        create synthetic WikiCFP event crawl batch json files
+        
+        every tenth event is deleted and every 25th has an invalid locality
+        
+        Args:
+            path(str): the directory to create the files in
+            batches(int): the number of batch files to create
+            eventsPerBatch(int): the number of events per batch file
+            
+        Returns:
+            list: the names of the files created
+        '''
+        os.makedirs(path,exist_ok=True)
+        fileNames=[]
+        for base in range(0,batches*eventsPerBatch,eventsPerBatch):
+            events=[]
+            for cfpId in range(base,base+eventsPerBatch):
+                year=2000+cfpId%20
+                event={"eventId":str(cfpId),"wikiCfpId":cfpId,"deleted":cfpId%10==0,"acronym":f"CONF{cfpId} {year}",
+                    "title":f"CONF{cfpId} {year} : The {cfpId}th Conference","locality":"123 Spam Street" if cfpId%25==1 else "Milano, Italy",
+                    "startDate":f"{year}-06-03","endDate":f"{year}-06-05","Submission_Deadline":f"{year}-01-19",
+                    "url":f"http://www.wikicfp.com/cfp/servlet/event.showcfp?eventid={cfpId}"}
+                events.append(event)
+            fileName=f"wikicfp_Event{base:06d}-{base+eventsPerBatch-1:06d}.json"
+            with open(f"{path}/{fileName}","w") as jsonFile:
+                json.dump({"events":events},jsonFile)
+            fileNames.append(fileName)
+        return fileNames
+    
+    @staticmethod
+    def createWikiCfpPages(path:str,pages:int=100)->list:
+        '''
+        save synthetic WikiCFP event pages with the typical navigation and related events tables
+        
+        the event with id 7 and the last 10 events are deleted
+        
+        Args:
+            path(str): the directory to save the pages to
+            pages(int): the number of pages to save
+            
+        Returns:
+            list: the names of the files created
+        '''
+        os.makedirs(path,exist_ok=True)
+        stub=WikiCfpStub(maxId=pages-10,deletedIds=[7])
+        related="\n".join([f"<tr><td><a href=\"/cfp/servlet/event.showcfp?eventid={i}\">CONF{i}</a></td><td>Conference {i} on <b>Topic {i}</b></td><td>Jun {i%28+1}, 2023</td></tr>" for i in range(150)])
+        fileNames=[]
+        for eventId in range(1,pages+1):
+            html=stub.getEventHtml(eventId)
+            html=html.replace("<body>",f"""<body><div class="nav"><a href="/cfp/">Home</a> | <a href="/cfp/allcat">Categories</a><script>var x=1;</script></div>""")
+            html=html.replace("</body>",f"<table class=\"related\">{related}</table><p>Related Resources &amp; Links</p></body>")
+            fileName=f"event{eventId:06d}.html"
+            with open(f"{path}/{fileName}","w") as htmlFile:
+                htmlFile.write(html)
+            fileNames.append(fileName)
+        return fileNames
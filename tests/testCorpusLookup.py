@@ -6,9 +6,14 @@ Created on 2021-07-26
 from tests.testSMW import TestSMW
 from tests.testDblpXml import TestDblp
 from corpus.lookup import CorpusLookup
-from corpus.event import EventStorage
+from corpus.event import EventStorage, EventManager, EventSeriesManager, Event, EventSeries
 from tests.datasourcetoolbox import DataSourceTest
+from corpus.eventcorpus import EventCorpus, EventDataSource
+from corpus.config import EventDataSourceConfig
+from lodstorage.sql import SQLDB
 import json
+import os
+import time
 
 
 class TestCorpusLookup(DataSourceTest):
@@ -106,7 +111,109 @@ class TestCorpusLookup(DataSourceTest):
             print(jsonStr)
         for dataSourceName in ["confref","dblp","wikicfp"]:
             self.assertTrue(dataSourceName in dictOfLod)
+        # the per source queries on a thread pool need to give the same result
+        parallelDictOfLod=lookup.getDictOfLod4MultiQuery(multiQuery,idQuery,parallel=True)
+        self.assertEqual(dictOfLod,parallelDictOfLod)
+            
+    def testGetLod4IdList(self):
+        '''
+        test selecting records by a list of ids with chunked parameter binding
+        '''
+        sqlDB=SQLDB("/tmp/idListTest.db")
+        sqlDB.execute("DROP TABLE IF EXISTS event_test")
+        sqlDB.execute("CREATE TABLE event_test (eventId TEXT PRIMARY KEY,acronym TEXT)")
+        ids=[f"conf/{i}" for i in range(1200)]+["conf/O'Hare"]
+        sqlDB.c.executemany("INSERT INTO event_test VALUES (?,?)",[(eventId,eventId.upper()) for eventId in ids])
+        sqlDB.c.commit()
+        lookup=CorpusLookup(lookupIds=[])
+        idList=ids[::2]+["conf/O'Hare","conf/unknown') OR ('1'='1"]
+        lod=lookup.getLod4IdList(sqlDB,"SELECT * FROM event_test","eventId",idList,chunkSize=250)
+        self.assertEqual(601,len(lod))
+        self.assertEqual({eventId.upper() for eventId in ids[::2]+["conf/O'Hare"]},{record["acronym"] for record in lod})
+        self.assertEqual(0,len(lookup.getLod4IdList(sqlDB,"SELECT * FROM event_test","eventId",[])))
+    
+    def testParallelLoadAll(self):
+        '''
+        test loading data sources concurrently
+        '''
+        class SleepyDataSource(EventDataSource):
+            '''
+            data source that just takes some time to load
+            '''
+            def __init__(self,lookupId:str,loadTime:float):
+                self.sourceConfig=EventDataSourceConfig(lookupId=lookupId,name=lookupId,title=lookupId,url=None,tableSuffix=lookupId)
+                self.expectedLoadTime=loadTime
+                
+            def load(self,forceUpdate=False,showProgress=False,debug=False,lazy=False):
+                time.sleep(self.expectedLoadTime)
+                if self.expectedLoadTime<0.1:
+                    raise Exception("endpoint not available")
+                return self.expectedLoadTime
+            
+        eventCorpus=EventCorpus()
+        for i in range(4):
+            eventCorpus.addDataSource(SleepyDataSource(f"source{i}",0.5))
+        for parallel in [False,True]:
+            startTime=time.time()
+            loadTimes=eventCorpus.loadAll(showProgress=self.debug,parallel=parallel)
+            elapsed=time.time()-startTime
+            self.assertEqual(4,len(loadTimes))
+            if parallel:
+                self.assertLess(elapsed,1.5)
+            else:
+                self.assertGreaterEqual(elapsed,2.0)
+        eventCorpus.addDataSource(SleepyDataSource("failing",0.05))
+        with self.assertRaises(Exception) as context:
+            eventCorpus.loadAll(parallel=True)
+        self.assertTrue("failing" in str(context.exception))
+
+    def testLazyLoad(self):
+        '''
+        test loading the entities of a cached data source on first access only
+        '''
+        class CountingEventManager(EventManager):
+            '''
+            event manager that counts the calls of getListOfDicts
+            '''
+            def configure(self):
+                self.fetchCount=0
+                def getListOfDicts():
+                    self.fetchCount+=1
+                    return [{"eventId":f"CONF {2000+i}","acronym":f"CONF {2000+i}","inEventSeries":"CONF","year":2000+i} for i in range(10)]
+                self.getListOfDicts=getListOfDicts
+                
+        class CountingEventSeriesManager(EventSeriesManager):
+            '''
+            event series manager for the CONF series
+            '''
+            def configure(self):
+                self.getListOfDicts=lambda: [{"eventSeriesId":"CONF","acronym":"CONF"}]
+                
+        config=EventStorage.getStorageConfig()
+        config.cacheFile="/tmp/lazyLoadTest.db"
+        if os.path.isfile(config.cacheFile):
+            os.remove(config.cacheFile)
+        sourceConfig=EventDataSourceConfig(lookupId="lazy",name="lazy",title="lazy",url=None,tableSuffix="lazy")
+        def createDataSource():
+            eventManager=CountingEventManager(name="LazyEvents",sourceConfig=sourceConfig,clazz=Event,primaryKey="eventId",config=config)
+            eventSeriesManager=CountingEventSeriesManager(name="LazySeries",sourceConfig=sourceConfig,clazz=EventSeries,primaryKey="eventSeriesId",config=config)
+            return EventDataSource(eventManager,eventSeriesManager,sourceConfig)
+        # a data source which is not cached yet is loaded eagerly
+        dataSource=createDataSource()
+        dataSource.load(lazy=True)
+        self.assertIsNone(dataSource.eventManager.lazyLoader)
+        self.assertEqual(1,dataSource.eventManager.fetchCount)
+        # the cached data source is only loaded on first access
+        dataSource=createDataSource()
+        dataSource.load(lazy=True)
+        eventManager=dataSource.eventManager
+        self.assertEqual([],eventManager.events)
+        self.assertEqual(0,len(dataSource.eventSeriesManager.series))
+        self.assertEqual(10,len(eventManager.getList()))
+        self.assertEqual(0,eventManager.fetchCount)
+        self.assertEqual(10,len(eventManager.getEventsInSeries("CONF")))
+        self.assertEqual(1,len(dataSource.eventSeriesManager.getList()))
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
-    DataSourceTest.main()
\ No newline at end of file
+    DataSourceTest.main()        
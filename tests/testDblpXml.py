@@ -4,14 +4,52 @@ Created on 2021-01-25
 @author: wf
 '''
 
+import gzip
+import hashlib
+import http.server
+import os
+import threading
 import time
 from corpus.datasources.dblpxml import DblpXml
+from corpus.event import EventStorage
+from corpus.utils.download import Download
 from lodstorage.schema import SchemaManager
 from datetime import datetime
 from lodstorage.uml import UML
 from tests.datasourcetoolbox import DataSourceTest
 
 
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    '''
+    local HTTP stand-in that serves files with support for Range requests
+    '''
+    def send_head(self):
+        path=self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return None
+        with open(path,"rb") as f:
+            content=f.read()
+        total=len(content)
+        rangeHeader=self.headers.get("Range")
+        if rangeHeader:
+            start=int(rangeHeader.replace("bytes=","").split("-")[0])
+            if start>=total:
+                self.send_error(416, "Range not satisfiable")
+                return None
+            content=content[start:]
+            self.send_response(206)
+            self.send_header("Content-Range",f"bytes {start}-{total-1}/{total}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length",str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        return None
+    
+    def log_message(self, *args):
+        pass
+
 class TestDblp(DataSourceTest):
     '''
     test the dblp xml parser and pylodstorage extraction for it
@@ -56,7 +94,7 @@ class TestDblp(DataSourceTest):
             print(f"dblp xml file is  {xmlfile} with size {sizeMB:5.1f} MB" )
         return dblpXml
     
-    def getSqlDB(self,mock=True,recreate=False):
+    def getSqlDB(self,mock=True,recreate=False,streaming=False):
         '''
         get the Sql Database
         '''
@@ -64,7 +102,7 @@ class TestDblp(DataSourceTest):
         limit=10000 if mock else 10000000
         showProgress=not mock and not self.inCI()
         sample=5
-        sqlDB=dblpXml.getSqlDB(limit, sample=sample, debug=self.debug,recreate=recreate,postProcess=dblpXml.postProcess,showProgress=showProgress)
+        sqlDB=dblpXml.getSqlDB(limit, sample=sample, debug=self.debug,recreate=recreate,postProcess=dblpXml.postProcess,showProgress=showProgress,streaming=streaming)
         return sqlDB
     
     def testDblpDownload(self):
@@ -133,12 +171,131 @@ class TestDblp(DataSourceTest):
         if not mock:
             return
         sqlDB=self.getSqlDB(mock=mock,recreate=True)
-        tableList=sqlDB.getTableList()
+        tableList=DblpXml.getRecordTableList(sqlDB)
         expected=6 if self.mock else 8
         self.assertEqual(expected,len(tableList))
         self.checkConfColumn(sqlDB)
         sqlDB.close()
         
+    def testStreamingSqlDB(self):
+        '''
+        test that the streaming mode creates the same tables as the
+        in memory mode
+        '''
+        if not self.mock:
+            return
+        tableCounts={}
+        for streaming in [False,True]:
+            sqlDB=self.getSqlDB(mock=self.mock,recreate=True,streaming=streaming)
+            counts={}
+            for table in sqlDB.getTableList():
+                tableName=table["name"]
+                countResult=sqlDB.query(f"SELECT count(*) as count from {tableName}")
+                counts[tableName]=(countResult[0]['count'],len(table["columns"]))
+            tableCounts[streaming]=counts
+            self.checkConfColumn(sqlDB)
+            sqlDB.close()
+        self.log(tableCounts)
+        self.assertEqual(tableCounts[False],tableCounts[True])
+        
+    def testIncrementalSync(self):
+        '''
+        test the incremental sync of the dblp database based on key and mdate
+        '''
+        xmlTemplate="""<?xml version="1.0" encoding="ISO-8859-1"?>
+<dblp>
+<proceedings mdate="2019-05-14" key="conf/pfe/2001"><title>PFE 2001</title><booktitle>PFE</booktitle><year>2002</year></proceedings>
+<proceedings mdate="{mdate}" key="conf/hpcasia/2019"><title>HPC Asia 2019</title><booktitle>{booktitle}</booktitle><year>2019</year></proceedings>
+{extra}
+</dblp>"""
+        xmlpath="/tmp/dblpsync"
+        os.makedirs(xmlpath,exist_ok=True)
+        dblpXml=DblpXml(xmlpath=xmlpath)
+        def writeXml(mdate,booktitle,extra):
+            with open(dblpXml.xmlfile, 'w') as xmlfile:
+                xmlfile.write(xmlTemplate.format(mdate=mdate,booktitle=booktitle,extra=extra))
+        extra='<article mdate="2020-01-01" key="journals/x/1"><title>article</title></article>'
+        writeXml("2019-01-26","HPC Asia",extra)
+        sqlDB=dblpXml.getSqlDB(recreate=True,postProcess=dblpXml.postProcess,incremental=True)
+        syncInfo=dblpXml.getSyncInfo(sqlDB)
+        self.assertEqual(3,syncInfo["inserted"])
+        sqlDB.close()
+        # change one record, delete the article and add a new proceedings record
+        extra='<proceedings mdate="2021-01-01" key="conf/new/2021"><title>New 2021</title><booktitle>NEW</booktitle></proceedings>'
+        writeXml("2021-02-01","HPCAsia",extra)
+        sqlDB=dblpXml.getSqlDB(postProcess=dblpXml.postProcess,incremental=True)
+        syncInfo=dblpXml.getSyncInfo(sqlDB)
+        self.log(syncInfo)
+        self.assertEqual(1,syncInfo["inserted"])
+        self.assertEqual(1,syncInfo["updated"])
+        self.assertEqual(1,syncInfo["deleted"])
+        self.assertEqual(1,syncInfo["unchanged"])
+        self.assertEqual("2021-02-01",syncInfo["dumpVersion"])
+        records=sqlDB.query("select booktitle,conf from proceedings where key=?",("conf/hpcasia/2019",))
+        self.assertEqual("HPCAsia",records[0]["booktitle"])
+        self.assertEqual("hpcasia",records[0]["conf"])
+        self.assertEqual(0,len(sqlDB.query("select * from article")))
+        self.assertEqual(3,len(sqlDB.query("select * from record")))
+        # the record counts are recorded by the sync
+        self.assertEqual({"proceedings":3,"article":0},EventStorage.getInstanceCounts(["proceedings","article"],sqlDB=sqlDB))
+        # deletions need the end of the dump even if the limit is reached exactly
+        writeXml("2021-02-01","HPCAsia","")
+        stats=dblpXml.syncSqlDB(sqlDB,limit=1)
+        self.assertEqual(0,stats["deleted"])
+        stats=dblpXml.syncSqlDB(sqlDB,limit=2)
+        self.assertEqual(1,stats["deleted"])
+        self.assertEqual(1,len(sqlDB.query("select * from proceedings where key='conf/pfe/2001'")))
+        self.assertEqual(0,len(sqlDB.query("select * from proceedings where key='conf/new/2021'")))
+        sqlDB.close()
+        
+    def testStreamingDownload(self):
+        '''
+        test the chunked and resumable download of the gzipped dump
+        against a local HTTP stand-in
+        '''
+        servePath="/tmp/dblpserve"
+        os.makedirs(servePath,exist_ok=True)
+        xml=b"<?xml version='1.0' encoding='ISO-8859-1'?>\n<dblp>\n"+b"".join([f'<article mdate="2020-01-01" key="journals/x/{i}"><title>article {i}</title></article>\n'.encode() for i in range(5000)])+b"</dblp>\n"
+        gzContent=gzip.compress(xml)
+        with open(f"{servePath}/dblp.xml.gz","wb") as gzFile:
+            gzFile.write(gzContent)
+        with open(f"{servePath}/dblp.xml.gz.md5","w") as md5File:
+            md5File.write(f"{hashlib.md5(gzContent).hexdigest()}  dblp.xml.gz\n")
+        with open(f"{servePath}/dblp.dtd","w") as dtdFile:
+            dtdFile.write("")
+        handler=lambda *args, **kwargs: RangeRequestHandler(*args, directory=servePath, **kwargs)
+        server=http.server.ThreadingHTTPServer(("127.0.0.1",0),handler)
+        thread=threading.Thread(target=server.serve_forever,daemon=True)
+        thread.start()
+        try:
+            port=server.server_address[1]
+            xmlpath="/tmp/dblpdownload"
+            dblpXml=DblpXml(xmlpath=xmlpath,gzurl=f"http://127.0.0.1:{port}/dblp.xml.gz",verbose=self.debug)
+            for fileName in [dblpXml.xmlfile,f"{dblpXml.xmlfile}.gz.part"]:
+                if os.path.isfile(fileName):
+                    os.remove(fileName)
+            # simulate an interrupted download
+            os.makedirs(xmlpath,exist_ok=True)
+            with open(f"{dblpXml.xmlfile}.gz.part","wb") as partFile:
+                partFile.write(gzContent[:len(gzContent)//2])
+            xmlfile=dblpXml.getXmlFile(reload=True)
+            with open(xmlfile,"rb") as f:
+                self.assertEqual(xml,f.read())
+            self.assertFalse(os.path.isfile(f"{xmlfile}.gz.part"))
+            # a corrupted partial download is detected by the checksum and restarted
+            with open(f"{dblpXml.xmlfile}.gz.part","wb") as partFile:
+                partFile.write(b"garbage")
+            xmlfile=dblpXml.getXmlFile(reload=True)
+            with open(xmlfile,"rb") as f:
+                self.assertEqual(xml,f.read())
+            # a wrong checksum is reported
+            with self.assertRaises(Exception):
+                Download.streamDownload(dblpXml.gzurl, "/tmp/dblpdownload/wrong.gz", md5="0"*32)
+            self.assertEqual(5000,len(dblpXml.asDictOfLod(limit=10000)["article"]))
+        finally:
+            server.shutdown()
+            server.server_close()
+        
     def testIssue5(self):
         '''
         https://github.com/WolfgangFahl/ConferenceCorpus/issues/5
@@ -229,7 +386,7 @@ class TestDblp(DataSourceTest):
 [[https://dblp.org/ Copyright 2009-2021 dblp computer science bibliography]]
 see also [[https://github.com/WolfgangFahl/dblpconf dblp conf open source project]]
 """ %nowYMD
-        tableList=sqlDB.getTableList()
+        tableList=DblpXml.getRecordTableList(sqlDB)
         schemaDefs={
                 'article': 'Article',
                 'book':'Book',
@@ -1,7 +1,12 @@
 from datetime import datetime
+import os
+import sqlite3
+import time
+import tracemalloc
 from functools import partial
 from unittest import TestCase
 from corpus.event import EventManager, Event, EventSeries, EventSeriesManager, EventStorage
+from tests.syntheticdata import SyntheticData
 
 
 class TestEvent(TestCase):
@@ -48,7 +53,224 @@ class TestEvent(TestCase):
             selectorCallback=partial(self.eventManager.getEventsInSeries, "WebSci"))
         self.assertEqual(expectedCsvString, actualCsvString)
 
+    def testUpdateFromLodScaling(self):
+        '''
+        test that updating from a list of dicts with many new events scales linearly
+        '''
+        elapsed={}
+        for count in [2000,8000]:
+            eventManager=EventManager(name="TestEventManager", clazz=Event, primaryKey='pageTitle')
+            eventManager.fromLoD([{"pageTitle":"ICSME 2020","acronym":"ICSME 2020"}])
+            lod=[{"pageTitle":f"CONF {i}","acronym":f"CONF {i}","ordinal":i} for i in range(count)]
+            # an update of an existing and of a just added event
+            lod.append({"pageTitle":"ICSME 2020","ordinal":36})
+            lod.append({"pageTitle":"CONF 1","ordinal":101})
+            startTime=time.time()
+            eventManager.updateFromLod(lod)
+            elapsed[count]=time.time()-startTime
+            self.assertEqual(count+1,len(eventManager.getList()))
+            eventsByPageTitle=eventManager.getLookup("pageTitle")[0]
+            self.assertEqual(36,eventsByPageTitle["ICSME 2020"].ordinal)
+            self.assertEqual(101,eventsByPageTitle["CONF 1"].ordinal)
+        # quadratic behavior would lead to a factor of 16
+        self.assertLess(elapsed[8000],elapsed[2000]*8+0.1)
+
+    def testIndexedLookup(self):
+        '''
+        test the lookup index of the event manager
+        '''
+        eventManager=self.eventManager
+        event=eventManager.getEventByKey("WebSci 2019")
+        self.assertEqual("Boston",event.city)
+        self.assertIs(event,eventManager.getEventByKey("WebSci 2019"))
+        self.assertIsNone(eventManager.getEventByKey("WebSci 2020"))
+        with self.assertRaises(ValueError):
+            eventManager.getEventByKey("Boston",keytype="venue")
+        eventsBySeries=eventManager.getLookup("series",withDuplicates=True)
+        self.assertIs(eventsBySeries,eventManager.getLookup("series",withDuplicates=True))
+        # appending invalidates the index
+        eventManager.fromLoD([{"pageTitle":"WebSci 2020","series":"WebSci","city":"Southampton"}])
+        self.assertEqual("Southampton",eventManager.getEventByKey("WebSci 2020").city)
+        self.assertEqual(2,len(eventManager.getLookup("series",withDuplicates=True)["WebSci"]))
+        # updating existing and new entities keeps the index consistent
+        eventManager.updateFromLod([{"pageTitle":"WebSci 2020","series":"WS"},{"pageTitle":"WebSci 2021","series":"WebSci"}])
+        eventsBySeries=eventManager.getLookup("series",withDuplicates=True)
+        self.assertEqual(["WebSci 2019","WebSci 2021"],[event.pageTitle for event in eventsBySeries["WebSci"]])
+        self.assertEqual("WebSci 2020",eventsBySeries["WS"][0].pageTitle)
+        # in place modifications need an explicit invalidation
+        event=eventManager.getEventByKey("WebSci 2019")
+        event.pageTitle="WebSci 2019a"
+        eventManager.getList()[0]=Event()
+        eventManager.getList()[0].fromDict({"pageTitle":"ICSME 2020b"})
+        eventManager.invalidateIndex()
+        self.assertIs(event,eventManager.getEventByKey("WebSci 2019a"))
+        self.assertIsNone(eventManager.getEventByKey("WebSci 2019"))
+        self.assertIsNone(eventManager.getEventByKey("ICSME 2020"))
+        self.assertEqual("ICSME 2020b",eventManager.getEventByKey("ICSME 2020b").pageTitle)
+        # updating a key attribute with updateFromLod
+        self.assertIs(event,eventManager.getLookup("acronym")[0]["WebSci 2019"])
+        eventManager.updateFromLod([{"pageTitle":"WebSci 2019a","acronym":"WS 2019"}])
+        eventsByAcronym=eventManager.getLookup("acronym")[0]
+        self.assertIs(event,eventsByAcronym["WS 2019"])
+        self.assertFalse("WebSci 2019" in eventsByAcronym)
+        # replacing the list invalidates the index
+        eventManager.fromLoD([{"pageTitle":"ICSME 2021"}],append=False)
+        self.assertIsNone(eventManager.getEventByKey("WebSci 2019"))
+
+    def testCompactEntities(self):
+        '''
+        test the memory footprint and the API of the read-only compact entities
+        '''
+        count=20000
+        lod=SyntheticData.getEventLod(count)
+        memory={}
+        managers={}
+        for compact in [False,True]:
+            eventManager=EventManager("event",clazz=Event,primaryKey="pageTitle")
+            eventManager.compact=compact
+            tracemalloc.start()
+            eventManager.fromLoD(lod)
+            memory[compact],_peak=tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            managers[compact]=eventManager
+        if self.debug:
+            print(f"{count} events: dict {memory[False]/count:5.0f} bytes/event compact {memory[True]/count:5.0f} bytes/event")
+        self.assertTrue(memory[True]<memory[False]*0.6)
+        eventManager=managers[True]
+        event=eventManager.getEventByKey("pageTitle 42")
+        self.assertTrue(isinstance(event,Event))
+        self.assertEqual("city 42",event.city)
+        self.assertEqual(lod[42],event.__dict__)
+        self.assertEqual(managers[False].getList()[42].__dict__,event.__dict__)
+        self.assertEqual(count,len(eventManager.getLookup("series")[0]))
+        with self.assertRaises(AttributeError):
+            event.city="Berlin"
+        eventManager.fromLoD([{"pageTitle":"WebSci 2019","city":"Boston"}],append=False)
+        self.assertEqual("Boston",eventManager.getEventByKey("WebSci 2019").city)
+        self.assertFalse(hasattr(eventManager.getList()[0],"country"))
+
+    def testUpdateCompactEntities(self):
+        '''
+        test that updateFromLod replaces the read-only compact entities instead of modifying them
+        '''
+        lod=SyntheticData.getEventLod(10)
+        eventManager=EventManager("event",clazz=Event,primaryKey="pageTitle")
+        eventManager.compact=True
+        eventManager.fromLoD(lod)
+        eventManager.updateFromLod([{"pageTitle":"pageTitle 3","city":"Berlin"},{"pageTitle":"WebSci 2019","city":"Boston"}])
+        self.assertEqual(11,len(eventManager.getList()))
+        event=eventManager.getEventByKey("pageTitle 3")
+        self.assertIs(event,eventManager.getList()[3])
+        self.assertEqual("Berlin",event.city)
+        self.assertEqual("country 3",event.country)
+        self.assertIs(event,eventManager.getLookup("city")[0]["Berlin"])
+        self.assertEqual("Boston",eventManager.getEventByKey("WebSci 2019").city)
+        with self.assertRaises(AttributeError):
+            event.city="Paris"
+
+    def testBulkStore(self):
+        '''
+        test storing with a single executemany transaction
+        '''
+        count=50000
+        lod=SyntheticData.getTypedEventLod(count)
+        lod[1].pop("city")
+        # list values need to be converted before they reach executemany
+        lod[0]["keywords"]=["Semantic Web","Linked Data"]
+        results={}
+        for bulkStore in [False,True]:
+            config=EventStorage.getStorageConfig()
+            config.cacheFile=f"/tmp/bulkStoreTest{bulkStore}.db"
+            if os.path.isfile(config.cacheFile):
+                os.remove(config.cacheFile)
+            eventManager=EventManager(name="BulkEvents",clazz=Event,primaryKey="eventId",config=config)
+            eventManager.bulkStore=bulkStore
+            startTime=time.time()
+            eventManager.storeLoD([dict(record) for record in lod])
+            elapsed=time.time()-startTime
+            if self.debug:
+                print(f"bulkStore={bulkStore}: stored {count} rows in {elapsed:5.2f} s {count/elapsed:7.0f} rows/s")
+            results[bulkStore]=eventManager.sqldb.query("SELECT * FROM Event")
+        self.assertEqual(results[False],results[True])
+        self.assertEqual(datetime(2000,10,1),results[True][0]["startDate"])
+        self.assertEqual("Semantic Web⇹Linked Data",results[True][0]["keywords"])
+        sqlDB=eventManager.sqldb
+        plan=sqlDB.query("EXPLAIN QUERY PLAN SELECT * FROM Event WHERE acronym='CONF 2001'")
+        self.assertTrue("Event_acronym" in plan[0]["detail"])
+        # the bulk store does not change the journal mode of the database
+        self.assertEqual("delete",sqlDB.c.execute("PRAGMA journal_mode").fetchone()[0])
+        # appending keeps the table and the indices
+        eventManager.storeLoD([{"eventId":"conf/extra","acronym":"CONF 2001"}],append=True)
+        self.assertEqual(count/20+1,len(sqlDB.query("SELECT * FROM Event WHERE acronym='CONF 2001'")))
+        self.assertEqual(count+1,EventStorage.getTableMetadata(sqlDB)["Event"]["instances"])
+
+    def testShadowStore(self):
+        '''
+        test storing to a shadow table that is swapped in atomically
+        '''
+        for bulkStore in [False,True]:
+            config=EventStorage.getStorageConfig()
+            config.cacheFile=f"/tmp/shadowStoreTest{bulkStore}.db"
+            if os.path.isfile(config.cacheFile):
+                os.remove(config.cacheFile)
+            eventManager=EventManager(name="ShadowEvents",clazz=Event,primaryKey="eventId",config=config)
+            eventManager.bulkStore=bulkStore
+            eventManager.indexColumns=["acronym"]
+            eventManager.storeLoD([{"eventId":f"conf/{i}","acronym":f"CONF {2000+i}"} for i in range(10)])
+            sqlDB=eventManager.sqldb
+            sqlDB.c.execute("PRAGMA journal_mode=WAL")
+            sqlDB.c.execute("CREATE VIEW allevents AS SELECT * FROM Event")
+            # a reader in the middle of a transaction
+            reader=sqlite3.connect(config.cacheFile)
+            reader.execute("BEGIN")
+            self.assertEqual(10,reader.execute("SELECT count(*) FROM allevents").fetchone()[0])
+            eventManager.shadowStore=True
+            for _i in range(2):
+                eventManager.storeLoD([{"eventId":f"conf/{i}","acronym":f"CONF {2000+i}"} for i in range(20)])
+            self.assertEqual("Event",eventManager.tableName)
+            self.assertEqual(10,reader.execute("SELECT count(*) FROM allevents").fetchone()[0])
+            reader.commit()
+            self.assertEqual(20,reader.execute("SELECT count(*) FROM allevents").fetchone()[0])
+            reader.close()
+            tableNames=[table["name"] for table in sqlDB.getTableList()]
+            self.assertFalse("Event__new" in tableNames)
+            self.assertEqual(20,EventStorage.getTableMetadata(sqlDB)["Event"]["instances"])
+            if bulkStore:
+                plan=sqlDB.query("EXPLAIN QUERY PLAN SELECT * FROM Event WHERE acronym='CONF 2001'")
+                self.assertTrue("Event_acronym" in plan[0]["detail"])
+
+    def testPostProcessLod(self):
+        '''
+        test post processing the raw records before the entities are created and stored
+        '''
+        class TitleEventManager(EventManager):
+            '''
+            event manager that derives the year from the title
+            '''
+            def configure(self):
+                self.getListOfDicts=lambda: [{"pageTitle":f"CONF {2000+i}","title":f"Conference {2000+i}"} for i in range(10)]
+                self.storeCount=0
+                
+            def postProcessLod(self,listOfDicts:list,debug:bool=False):
+                for rawEvent in listOfDicts:
+                    rawEvent["year"]=int(rawEvent["title"].split(" ")[1])
+                    
+            def storeLoD(self,listOfDicts,**kwArgs):
+                self.storeCount+=1
+                return super().storeLoD(listOfDicts,**kwArgs)
+                
+        config=EventStorage.getStorageConfig()
+        config.cacheFile="/tmp/postProcessLodTest.db"
+        eventManager=TitleEventManager(name="TitleEvents",clazz=Event,primaryKey="pageTitle",config=config)
+        eventManager.configure()
+        eventManager.fromCache(force=True)
+        self.assertEqual(1,eventManager.storeCount)
+        self.assertEqual(2009,eventManager.getEventByKey("CONF 2009").year)
+        years=eventManager.sqldb.query("SELECT year FROM Event ORDER BY year")
+        self.assertEqual(2000,years[0]["year"])
+
     def setUp(self) -> None:
+        self.debug=False
         sampleEvents = [{
                 "pageTitle": "ICSME 2020",
                 "acronym": "ICSME 2020",
@@ -4,7 +4,10 @@ Created on 2022-04-09
 @author: wf
 '''
 from tests.basetest import BaseTest
-from corpus.event import EventStorage
+from corpus.event import EventStorage, EventManager, Event
+from lodstorage.sql import SQLDB
+import datetime
+import os
 
 
 class TestEventStorage(BaseTest):
@@ -26,3 +29,110 @@ class TestEventStorage(BaseTest):
                 print(plantUml)
             self.assertTrue(f"{baseEntity} <|-- {baseEntity.lower()}_dblp" in plantUml)
             self.assertTrue(f"class {baseEntity} " in plantUml)
+        
+    def testIncrementalSignatureCache(self):
+        '''
+        test refreshing the signature cache per source
+        '''
+        dbPath="/tmp/signatureTest"
+        os.makedirs(dbPath,exist_ok=True)
+        for dbName in ["EventCorpus","Signature"]:
+            dbFile=f"{dbPath}/{dbName}.db"
+            if os.path.isfile(dbFile):
+                os.remove(dbFile)
+        sqlDB=SQLDB(f"{dbPath}/EventCorpus.db")
+        for source,count in [("dblp",1000),("wikidata",500),("acm",10)]:
+            lod=[{"eventId":f"{source}-{i}","source":source,"title":f"Conference {i}","country":"Q183","ordinal":i} for i in range(count)]
+            entityInfo=sqlDB.createTable(lod,f"event_{source}","eventId")
+            sqlDB.store(lod,entityInfo)
+        signature=SQLDB(f"{dbPath}/Signature.db")
+        exclude={"event":["event_acm"]}
+        status=EventStorage.refreshSignatureCache(signature, sqlDB, exclude=exclude,profile=self.profile)
+        self.assertEqual({"event_dblp":"refreshed","event_wikidata":"refreshed"},status)
+        self.assertEqual(1500,signature.query("SELECT count(*) AS count FROM event")[0]["count"])
+        columns=[column["name"] for column in signature.query("PRAGMA table_info('event')")]
+        self.assertEqual(["eventId","source","title","country","ordinal"],columns)
+        status=EventStorage.refreshSignatureCache(signature, sqlDB, exclude=exclude,profile=self.profile)
+        self.assertEqual({"event_dblp":"unchanged","event_wikidata":"unchanged"},status)
+        # change a single source with the same number of rows
+        sqlDB.execute("UPDATE event_wikidata SET title='Workshop 1' WHERE eventId='wikidata-1'")
+        sqlDB.c.commit()
+        status=EventStorage.refreshSignatureCache(signature, sqlDB, exclude=exclude,profile=self.profile)
+        self.assertEqual({"event_dblp":"unchanged","event_wikidata":"refreshed"},status)
+        self.assertEqual(1500,signature.query("SELECT count(*) AS count FROM event")[0]["count"])
+        titles=signature.query("SELECT title FROM event WHERE eventId='wikidata-1'")
+        self.assertEqual([{"title":"Workshop 1"}],titles)
+        # remove a source
+        sqlDB.execute("DROP TABLE event_wikidata")
+        status=EventStorage.refreshSignatureCache(signature, sqlDB, exclude=exclude,profile=self.profile)
+        self.assertEqual({"event_dblp":"unchanged","event_wikidata":"removed"},status)
+        self.assertEqual(1000,signature.query("SELECT count(*) AS count FROM event")[0]["count"])
+        
+    def testMaterializedViews(self):
+        '''
+        test materializing the common views as indexed tables
+        '''
+        dbFile="/tmp/materializedViewTest.db"
+        if os.path.isfile(dbFile):
+            os.remove(dbFile)
+        sqlDB=SQLDB(dbFile)
+        for source,count in [("dblp",100),("wikidata",50),("acm",10)]:
+            lod=[{"eventId":f"{source}-{i}","source":source,"acronym":f"ISWC {2000+i}","lookupAcronym":f"ISWC {2000+i}","year":2000+i,"countryWikidataid":"Q183","startDate":datetime.date(2000+i,10,1)} for i in range(count)]
+            entityInfo=sqlDB.createTable(lod,f"event_{source}","eventId")
+            sqlDB.store(lod,entityInfo)
+        lod=[{"acronym":"ISWC","source":"dblp"}]
+        entityInfo=sqlDB.createTable(lod,"eventseries_dblp","acronym")
+        sqlDB.store(lod,entityInfo)
+        exclude={"event":["event_acm"],"eventseries":[]}
+        query="""SELECT source,eventId,startDate FROM event WHERE lookupAcronym LIKE "ISWC 2%" ORDER BY year DESC,source"""
+        EventStorage.createViews(exclude=exclude,materialize=False,sqlDB=sqlDB)
+        viewRecords=sqlDB.query(query)
+        for _i in range(2):
+            EventStorage.createViews(exclude=exclude,materialize=True,sqlDB=sqlDB)
+            self.assertEqual("table",EventStorage.getObjectType(sqlDB, "event"))
+            self.assertEqual(viewRecords,sqlDB.query(query))
+        self.assertEqual(150,len(viewRecords))
+        self.assertEqual(datetime.date(2099,10,1),viewRecords[0]["startDate"])
+        indices=[index["name"] for index in sqlDB.query("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='event'")]
+        for column in ["lookupAcronym","acronym","year","source","eventId","countryWikidataid"]:
+            self.assertTrue(f"event_{column}" in indices,column)
+        plan=sqlDB.query("EXPLAIN QUERY PLAN SELECT * FROM event WHERE acronym='ISWC 2010'")
+        self.assertTrue("event_acronym" in plan[0]["detail"])
+        # an empty table list does not lead to invalid SQL
+        EventStorage.materializeView(sqlDB, "emptyview", [])
+        self.assertIsNone(EventStorage.getObjectType(sqlDB, "emptyview"))
+        # switch back to a plain view
+        EventStorage.createViews(exclude=exclude,materialize=False,sqlDB=sqlDB)
+        self.assertEqual("view",EventStorage.getObjectType(sqlDB, "event"))
+        self.assertEqual(viewRecords,sqlDB.query(query))
+
+    def testTableMetadata(self):
+        '''
+        test the recorded instance counts of the tables
+        '''
+        dbFile="/tmp/tableMetadataTest.db"
+        if os.path.isfile(dbFile):
+            os.remove(dbFile)
+        config=EventStorage.getStorageConfig()
+        config.cacheFile=dbFile
+        eventManager=EventManager(name="MetadataEvents",clazz=Event,primaryKey="eventId",config=config)
+        eventManager.tableName="event_test"
+        eventManager.storeLoD([{"eventId":f"e{i}","acronym":f"ISWC {2000+i}"} for i in range(10)])
+        sqlDB=SQLDB(dbFile)
+        metadata=EventStorage.getTableMetadata(sqlDB)
+        self.assertEqual(10,metadata["event_test"]["instances"])
+        self.assertTrue(isinstance(metadata["event_test"]["updated"],datetime.datetime))
+        # changes outside of the managers are not counted ...
+        sqlDB.c.execute("INSERT INTO event_test (eventId,acronym) VALUES ('e10','ISWC 2010')")
+        sqlDB.c.commit()
+        self.assertEqual({"event_test":10},EventStorage.getInstanceCounts(["event_test"],sqlDB=sqlDB))
+        # ... until the metadata is updated
+        EventStorage.updateTableMetadata(["event_test"],sqlDB=sqlDB)
+        self.assertEqual({"event_test":11},EventStorage.getInstanceCounts(["event_test"],sqlDB=sqlDB))
+        # tables without metadata are counted on first access
+        sqlDB.execute("CREATE TABLE eventseries_test (acronym TEXT)")
+        self.assertEqual(0,EventStorage.getInstanceCounts(["eventseries_test"],sqlDB=sqlDB)["eventseries_test"])
+        self.assertTrue("eventseries_test" in EventStorage.getTableMetadata(sqlDB))
+        # materialized views are recorded when they are refreshed
+        EventStorage.createViews(exclude={"event":[],"eventseries":[]},materialize=True,sqlDB=sqlDB)
+        self.assertEqual({"event":11},EventStorage.getInstanceCounts(["event"],sqlDB=sqlDB))
@@ -4,6 +4,7 @@ Created on 04.03.2022
 @author: wf
 '''
 from tests.datasourcetoolbox import DataSourceTest
+from tests.syntheticdata import SyntheticData
 import getpass
 from corpus.datasources.tibkatftx import FTXParser
 
@@ -33,6 +34,49 @@ class TestFTXParser(DataSourceTest):
         for sample in self.samples:
             self.sampleFtxs.append(f"{self.sampleBase}{sample}.xml")
     
+    def testSyntheticDocumentParsing(self):
+        '''
+        test parsing documents out of synthetic FTX xml files
+        '''
+        ftxroot=SyntheticData.getTempDir(self,"ftx-synthetic")
+        fileNames=SyntheticData.createFtxFiles(ftxroot,files=1,documentsPerFile=10)
+        ftxParser=FTXParser(ftxroot)
+        documents=list(ftxParser.parse(fileNames[0],local=True))
+        self.assertEqual(10,len(documents))
+        document=documents[1]
+        self.assertEqual("000000001",document.ppn)
+        self.assertEqual(["author","sponsor"],document.corporateCreatorTypes)
+        self.assertEqual("1-1",document.authorGndId)
+        self.assertEqual("54.10",document.bk)
+        self.assertEqual(2,len(document.description))
+        
+    def testCompiledExtractor(self):
+        '''
+        test that the precompiled property extractor gives the same results
+        as the findall per property extraction
+        '''
+        ftxroot=SyntheticData.getTempDir(self,"ftx-compiled")
+        fileNames=SyntheticData.createFtxFiles(ftxroot,files=1,documentsPerFile=200)
+        ftxParser=FTXParser(ftxroot)
+        results={}
+        for compiled in [False,True]:
+            results[compiled]=[document.asDict() for document in ftxParser.parse(fileNames[0],local=True,compiled=compiled)]
+        self.assertEqual(results[False],results[True])
+        self.assertEqual(200,len(results[True]))
+        
+    def testLxmlParsing(self):
+        '''
+        test that parsing with lxml gives the same results as the standard library
+        '''
+        ftxroot=SyntheticData.getTempDir(self,"ftx-lxml")
+        fileNames=SyntheticData.createFtxFiles(ftxroot,files=1,documentsPerFile=200)
+        ftxParser=FTXParser(ftxroot)
+        results={}
+        for useLxml in [False,True]:
+            results[useLxml]=[document.asDict() for document in ftxParser.parse(fileNames[0],local=True,useLxml=useLxml)]
+        self.assertEqual(results[False],results[True])
+        self.assertEqual(200,len(results[True]))
+        
     def getAllFtxXmlFiles(self):
         if not hasattr(self, "xmlFiles"):
             self.xmlFiles=self.ftxParser.ftxXmlFiles()
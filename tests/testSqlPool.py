@@ -0,0 +1,113 @@
+'''
+Created on 2023-02-10
+
+@author: wf
+'''
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from tests.basetest import BaseTest
+from corpus.utils.sqlpool import SQLDBPool
+from corpus.event import EventStorage, EventManager, Event
+
+class TestSqlPool(BaseTest):
+    '''
+    test the SQLDB connection pool
+    '''
+
+    def setUp(self, debug=False, profile=True):
+        BaseTest.setUp(self, debug=debug, profile=profile)
+        self.dbFile="/tmp/sqlPoolTest.db"
+        for suffix in ["","-wal","-shm"]:
+            if os.path.isfile(f"{self.dbFile}{suffix}"):
+                os.remove(f"{self.dbFile}{suffix}")
+        self.pool=SQLDBPool()
+        sqlDB=self.pool.getSqlDB(self.dbFile)
+        sqlDB.execute("CREATE TABLE event (eventId TEXT PRIMARY KEY,acronym TEXT)")
+        sqlDB.c.executemany("INSERT INTO event VALUES (?,?)",[(f"e{i}",f"ISWC {2000+i}") for i in range(100)])
+        sqlDB.c.commit()
+
+    def tearDown(self):
+        self.pool.closeAll()
+        BaseTest.tearDown(self)
+
+    def testReuse(self):
+        '''
+        test that the connections are reused per thread and database mode
+        '''
+        sqlDB=self.pool.getSqlDB(self.dbFile)
+        self.assertIs(sqlDB,self.pool.getSqlDB(self.dbFile))
+        self.assertEqual("delete",sqlDB.query("PRAGMA journal_mode")[0]["journal_mode"])
+        self.assertEqual(2,sqlDB.query("PRAGMA temp_store")[0]["temp_store"])
+        readOnlyDB=self.pool.getSqlDB(self.dbFile,readOnly=True)
+        self.assertIsNot(sqlDB,readOnlyDB)
+        self.assertIs(readOnlyDB,self.pool.getSqlDB(self.dbFile,readOnly=True))
+        self.assertEqual(100,readOnlyDB.query("SELECT count(*) AS count FROM event")[0]["count"])
+        with self.assertRaises(sqlite3.OperationalError):
+            readOnlyDB.execute("DELETE FROM event")
+
+    def testThreads(self):
+        '''
+        test that each worker thread gets its own connection
+        '''
+        def query(i):
+            sqlDB=self.pool.getSqlDB(self.dbFile,readOnly=True)
+            records=sqlDB.query("SELECT acronym FROM event WHERE eventId=?",(f"e{i%100}",))
+            return id(sqlDB),records[0]["acronym"]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results=list(executor.map(query,range(200)))
+        self.assertEqual("ISWC 2042",results[42][1])
+        sqlDBIds={sqlDBId for sqlDBId,_acronym in results}
+        self.assertTrue(len(sqlDBIds)<=4)
+
+    def testReplacedFile(self):
+        '''
+        test that a replaced database file gets a new connection
+        '''
+        pool=SQLDBPool()
+        dbFile="/tmp/sqlPoolReplaceTest.db"
+        newFile=f"{dbFile}.new"
+        for path in [dbFile,newFile]:
+            if os.path.isfile(path):
+                os.remove(path)
+        sqlite3.connect(dbFile).execute("CREATE TABLE event (eventId TEXT PRIMARY KEY,acronym TEXT)")
+        sqlDB=pool.getSqlDB(dbFile,readOnly=True)
+        newDB=sqlite3.connect(newFile)
+        newDB.execute("CREATE TABLE event (eventId TEXT PRIMARY KEY,acronym TEXT)")
+        newDB.execute("INSERT INTO event VALUES ('e1','ISWC 2001')")
+        newDB.commit()
+        newDB.close()
+        os.replace(newFile,dbFile)
+        replacedDB=pool.getSqlDB(dbFile,readOnly=True)
+        self.assertIsNot(sqlDB,replacedDB)
+        self.assertEqual(1,replacedDB.query("SELECT count(*) AS count FROM event")[0]["count"])
+        pool.closeAll()
+
+    def testWal(self):
+        '''
+        test switching to the write ahead log journal mode on request
+        '''
+        pool=SQLDBPool(wal=True)
+        try:
+            sqlDB=pool.getSqlDB(self.dbFile)
+            self.assertEqual("wal",sqlDB.query("PRAGMA journal_mode")[0]["journal_mode"])
+        finally:
+            pool.closeAll()
+
+    def testJournalModeUnchanged(self):
+        '''
+        test that the default load and store keeps the journal mode of the database file
+        '''
+        config=EventStorage.getStorageConfig()
+        config.cacheFile="/tmp/journalModeTest.db"
+        if os.path.isfile(config.cacheFile):
+            os.remove(config.cacheFile)
+        eventManager=EventManager(name="JournalModeEvents",clazz=Event,primaryKey="eventId",config=config)
+        eventManager.storeLoD([{"eventId":f"conf/{i}","acronym":f"CONF {2000+i}"} for i in range(10)])
+        eventManager=EventManager(name="JournalModeEvents",clazz=Event,primaryKey="eventId",config=config)
+        eventManager.fromStore(cacheFile=config.cacheFile)
+        self.assertEqual(10,len(eventManager.getList()))
+        self.assertIs(EventStorage.pooled,False)
+        connection=sqlite3.connect(config.cacheFile)
+        self.assertEqual("delete",connection.execute("PRAGMA journal_mode").fetchone()[0])
+        connection.close()
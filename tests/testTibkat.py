@@ -2,7 +2,8 @@ from tests.datasourcetoolbox import DataSourceTest
 from corpus.lookup import CorpusLookup
 from corpus.event import EventStorage
 from lodstorage.query import Query
-from corpus.datasources.tibkat import Tibkat,TibkatEvent
+from corpus.datasources.tibkat import Tibkat,TibkatEvent,TibkatEventManager
+from tests.syntheticdata import SyntheticData
 import datetime
 from collections import Counter
 import getpass
@@ -40,6 +41,30 @@ class TestTibkatEvents(DataSourceTest):
         expectedEvents=Tibkat.limitFiles*9
         _eventSeriesList,_eventList=self.checkDataSource(self.tibkatDataSource,0,expectedEvents,eventSample="FSE 2003")
     
+    def testParallelFtxParsing(self):
+        '''
+        test that parsing the FTX files with a process pool gives the
+        same records in the same order as the serial parsing
+        '''
+        ftxroot=SyntheticData.getTempDir(self,"ftx-parallel")
+        SyntheticData.createFtxFiles(ftxroot,files=6,documentsPerFile=50)
+        saved=(Tibkat.ftxroot,Tibkat.wantedbks,Tibkat.limitFiles,Tibkat.workers)
+        try:
+            Tibkat.ftxroot=ftxroot
+            Tibkat.wantedbks=["54"]
+            Tibkat.limitFiles=10000
+            eventManager=TibkatEventManager()
+            lods={}
+            for workers in [1,3]:
+                Tibkat.workers=workers
+                lods[workers]=eventManager.getListOfDicts()
+        finally:
+            Tibkat.ftxroot,Tibkat.wantedbks,Tibkat.limitFiles,Tibkat.workers=saved
+        # all but every fourth document starting with the third one have a "54" bk
+        self.assertEqual(6*(50-len(range(2,50,4))),len(lods[1]))
+        self.assertEqual(lods[1],lods[3])
+        self.assertEqual("CONF0",lods[1][0]["acronym"])
+        
     def testParseTibkatDescription(self):
         '''
         check the elements of a TIBKat description
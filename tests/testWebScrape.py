@@ -4,9 +4,12 @@ Created on 2021-07-31
 @author: wf
 '''
 import unittest
-from corpus.datasources.webscrape import WebScrape
-from corpus.datasources.wikicfpscrape import CrawlType
+from corpus.datasources.webscrape import WebScrape, ResponseCache
+from corpus.datasources.wikicfpscrape import CrawlType, WikiCfpEventFetcher
 from tests.datasourcetoolbox import DataSourceTest
+from tests.wikicfpstub import WikiCfpStub
+from tests.syntheticdata import SyntheticData
+import os
 
 
 class TestWebScrape(DataSourceTest):
@@ -60,6 +63,90 @@ class TestWebScrape(DataSourceTest):
                 extracted_homepage = scrape.findLinkByPrefixLabel("\w*Link:\w*")
                 self.assertEqual(expected_homepage, extracted_homepage)
 
+    def testResponseCache(self):
+        '''
+        test caching the responses with conditional requests and offline replay
+        '''
+        stub=WikiCfpStub(maxId=10)
+        baseUrl=stub.start()
+        cacheFile="/tmp/webcache-test.db"
+        if os.path.isfile(cacheFile):
+            os.remove(cacheFile)
+        try:
+            url=f"{baseUrl}/cfp/servlet/event.showcfp?eventid=3"
+            # always revalidate
+            responseCache=ResponseCache(cacheFile,ttl=0)
+            scrape=WebScrape(debug=self.debug,responseCache=responseCache)
+            triples=scrape.parseRDFa(url)
+            self.assertEqual(9,len(triples))
+            self.assertEqual(1,stub.requests[3])
+            self.assertEqual(triples,WebScrape(responseCache=responseCache).parseRDFa(url))
+            self.assertEqual(2,stub.requests[3])
+            self.assertEqual(1,stub.notModified[3])
+            # the changed page is fetched again
+            stub.maxId=2
+            deletedTriples=WebScrape(responseCache=responseCache).parseRDFa(url)
+            self.assertEqual([],deletedTriples)
+            self.assertEqual(1,stub.notModified[3])
+            stub.maxId=10
+            WebScrape(responseCache=responseCache).parseRDFa(url)
+            # no revalidation within the ttl
+            responseCache.ttl=3600
+            WebScrape(responseCache=responseCache).parseRDFa(url)
+            self.assertEqual(4,stub.requests[3])
+            responseCache.close()
+        finally:
+            stub.stop()
+        # replay without network access
+        responseCache=ResponseCache(cacheFile,offline=True)
+        scrape=WebScrape(responseCache=responseCache)
+        self.assertEqual(triples,scrape.parseRDFa(url))
+        self.assertIsNone(scrape.err)
+        scrape=WebScrape(responseCache=responseCache)
+        self.assertEqual([],scrape.parseRDFa(f"{baseUrl}/cfp/servlet/event.showcfp?eventid=4"))
+        self.assertTrue("offline" in str(scrape.err))
+        responseCache.close()
+
+    def testLxmlRDFa(self):
+        '''
+        test that the lxml backend gives the same triples and links as BeautifulSoup
+        '''
+        stub=WikiCfpStub(maxId=10)
+        html=stub.getEventHtml(3).replace("</span>\n</span>","<span property=\"v:note\">a <b>nested</b> note</span></span>\n</span>")
+        for html in [html,stub.getEventHtml(11),stub.getSeriesHtml(101)]:
+            html=html.encode("utf-8")
+            scrapes={}
+            for useLxml in [False,True]:
+                scrape=WebScrape(useLxml=useLxml)
+                scrape.triples=scrape.parseRDFaHtml(html)
+                scrapes[useLxml]=scrape
+            bs4Scrape,lxmlScrape=scrapes[False],scrapes[True]
+            self.assertTrue(lxmlScrape.useLxml)
+            self.assertEqual(bs4Scrape.triples,lxmlScrape.triples)
+            if b"nested" in html:
+                self.assertTrue(("v:Event","v:note","a nested note") in lxmlScrape.triples)
+            for tag in ["h3","title"]:
+                self.assertEqual(bs4Scrape.getText(tag),lxmlScrape.getText(tag))
+            bs4Match,bs4Text=bs4Scrape.findLinkForRegexp(r'/cfp/program\?id=([0-9]+).*')
+            lxmlMatch,lxmlText=lxmlScrape.findLinkForRegexp(r'/cfp/program\?id=([0-9]+).*')
+            self.assertEqual(bs4Text,lxmlText)
+            self.assertEqual(bs4Match.group(1) if bs4Match else None,lxmlMatch.group(1) if lxmlMatch else None)
+            self.assertEqual(bs4Scrape.findLinkByPrefixLabel(r"\w*Link:\w*"),lxmlScrape.findLinkByPrefixLabel(r"\w*Link:\w*"))
+        # complete pages with navigation and related events tables give the same raw events
+        pageDir=SyntheticData.getTempDir(self,"wikicfp-pages")
+        fileNames=SyntheticData.createWikiCfpPages(pageDir,pages=20)
+        results={}
+        for useLxml in [False,True]:
+            eventFetcher=WikiCfpEventFetcher(useLxml=useLxml)
+            results[useLxml]=[]
+            for index,fileName in enumerate(fileNames):
+                with open(f"{pageDir}/{fileName}","rb") as htmlFile:
+                    html=htmlFile.read()
+                url=WikiCfpEventFetcher.getUrl(index+1)
+                results[useLxml].append(eventFetcher.fromHtml(url, html))
+        self.assertEqual(results[False],results[True])
+        self.assertTrue(results[True][6]["deleted"])
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
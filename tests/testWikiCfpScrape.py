@@ -5,13 +5,23 @@ Created on 2020-08-20
 '''
 import unittest
 from corpus.datasources.wikicfp import WikiCfp
-from corpus.datasources.wikicfpscrape import WikiCfpScrape,WikiCfpEventFetcher, CrawlType, CrawlBatch
+from corpus.datasources.wikicfpscrape import WikiCfpScrape,WikiCfpEventFetcher, CrawlType, CrawlBatch, AsyncWikiCfpCrawler, TokenBucket, CrawlJournal
+from tests.wikicfpstub import WikiCfpStub
+from tests.syntheticdata import SyntheticData
+import asyncio
+import time
 import os
 from collections import Counter
 import jsonpickle
 from datetime import datetime
 import corpus.datasources.wikicfpscrape
 from tests.datasourcetoolbox import DataSourceTest
+from corpus.event import EventStorage, EventManager
+from corpus.datasources.wikicfp import WikiCfpEvent
+from lodstorage.storageconfig import StorageConfig
+import json
+import subprocess
+import sys
 
 
 class TestWikiCFP(DataSourceTest):
@@ -159,6 +169,17 @@ class TestWikiCFP(DataSourceTest):
         #latestEvent=WikiCFPEventFetcher.getLatestEvent(showProgress=True)
         pass
     
+    def testImportOrder(self):
+        '''
+        test that wikicfpscrape can be imported before wikicfp
+        (there is a mutual dependency between the two modules)
+        '''
+        cmd=[sys.executable,"-c","import corpus.datasources.wikicfpscrape"]
+        result=subprocess.run(cmd,capture_output=True,text=True)
+        if self.debug:
+            print(result.stderr)
+        self.assertEqual(0,result.returncode,result.stderr)
+
     def testCrawlType(self):
         '''
         test CrawlType enumeration
@@ -221,6 +242,228 @@ class TestWikiCFP(DataSourceTest):
             args=["--startId", "0", "--stopId", "10","-t", "1", "--targetPath",jsondir,"--crawlType",crawlType.value]
             corpus.datasources.wikicfpscrape.main(args)
 
+    def testTokenBucket(self):
+        '''
+        test the politeness limiter of the async crawler
+        '''
+        async def acquireAll(tokenBucket,count):
+            await asyncio.gather(*[tokenBucket.acquire() for _i in range(count)])
+        tokenBucket=TokenBucket(rate=50,capacity=5)
+        startTime=time.time()
+        asyncio.run(acquireAll(tokenBucket,30))
+        elapsed=time.time()-startTime
+        # 5 tokens of the initial burst and 25 at 50 tokens/s
+        self.assertGreaterEqual(elapsed,0.45)
+        self.assertLess(elapsed,1.5)
+            
+    def testAsyncCrawl(self):
+        '''
+        test crawling asynchronously from a local WikiCFP stub
+        '''
+        stub=WikiCfpStub(maxId=28,deletedIds=[5],failures={7:2,9:-1},errors={11:404},disconnects={13:2})
+        baseUrl=stub.start()
+        try:
+            jsondir="/tmp/wikicfp-asynccrawl"
+            os.makedirs(jsondir,exist_ok=True)
+            for jsonFile in os.listdir(jsondir):
+                os.remove(f"{jsondir}/{jsonFile}")
+            wikicfp=WikiCfp()
+            wikiCfpScrape=wikicfp.wikiCfpScrape
+            wikiCfpScrape.jsondir=jsondir
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=4,rate=1000,backoff=0.01,baseUrl=baseUrl)
+            batchEms=crawler.crawl(CrawlBatch(2,1,30,CrawlType.EVENT.value))
+            self.assertEqual(["wikicfp_Event000001-000015.json","wikicfp_Event000016-000030.json"],sorted(os.listdir(jsondir)))
+            events=batchEms[0].getList()+batchEms[1].getList()
+            # the event with id 9 is always inaccessible and the one with id 11 is not found
+            self.assertEqual([eventId for eventId in range(1,31) if eventId not in [9,11]],[event.wikiCfpId for event in events])
+            self.assertEqual(3,stub.requests[7])
+            self.assertEqual(4,stub.requests[9])
+            # HTTP errors other than 500 are not retried but dropped connections are
+            self.assertEqual(1,stub.requests[11])
+            self.assertEqual(3,stub.requests[13])
+            self.assertEqual("CONF13 2013",events[10].acronym)
+            eventsById={event.wikiCfpId:event for event in events}
+            self.assertTrue(eventsById[5].deleted)
+            self.assertTrue(eventsById[29].deleted)
+            event=eventsById[7]
+            self.assertFalse(event.deleted)
+            self.assertEqual("CONF7 2007",event.acronym)
+            self.assertEqual("http://www.wikicfp.com/cfp/servlet/event.showcfp?eventid=7",event.url)
+            self.assertEqual("102",event.seriesId)
+            self.assertEqual("http://conf7.org",event.homepage)
+            self.assertEqual(datetime(2007,1,19).date(),event.Submission_Deadline)
+            # the batch files are read like the ones of the threaded crawl
+            jsonEm=wikiCfpScrape.crawlFilesToJson(CrawlType.EVENT,withStore=False)
+            self.assertEqual(25,len(jsonEm.getList()))
+            series=crawler.crawl(CrawlBatch(1,100,101,CrawlType.SERIES.value))[0].getList()
+            self.assertEqual("conf/conf101",series[1].dblpSeriesId)
+        finally:
+            stub.stop()
+            
+    def testMalformedPage(self):
+        '''
+        test that a page that can not be parsed does not abort the batch
+        '''
+        stub=WikiCfpStub(maxId=10,malformedIds=[3])
+        baseUrl=stub.start()
+        try:
+            jsondir="/tmp/wikicfp-malformed"
+            os.makedirs(jsondir,exist_ok=True)
+            for jsonFile in os.listdir(jsondir):
+                os.remove(f"{jsondir}/{jsonFile}")
+            wikicfp=WikiCfp()
+            wikiCfpScrape=wikicfp.wikiCfpScrape
+            wikiCfpScrape.jsondir=jsondir
+            crawlBatch=CrawlBatch(1,1,10,CrawlType.EVENT.value)
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=4,rate=1000,backoff=0.01,baseUrl=baseUrl)
+            events=crawler.crawl(crawlBatch)[0].getList()
+            self.assertEqual([eventId for eventId in range(1,11) if eventId!=3],[event.wikiCfpId for event in events])
+            self.assertEqual(1,stub.requests[3])
+            journal=wikiCfpScrape.getCrawlJournal()
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=4,rate=1000,backoff=0.01,baseUrl=baseUrl,journal=journal)
+            crawler.crawl(crawlBatch)
+            self.assertEqual(CrawlJournal.STATUS_ERROR,journal.getStates(crawlBatch)[3])
+            journal.close()
+        finally:
+            stub.stop()
+            
+    def testCrawlJournal(self):
+        '''
+        test resuming an interrupted crawl with the crawl journal
+        '''
+        # the event with id 12 times out and id 9 is inaccessible on the first run
+        stub=WikiCfpStub(maxId=18,failures={9:2},delays={12:2.0})
+        baseUrl=stub.start()
+        try:
+            jsondir="/tmp/wikicfp-journal"
+            os.makedirs(jsondir,exist_ok=True)
+            for jsonFile in os.listdir(jsondir):
+                os.remove(f"{jsondir}/{jsonFile}")
+            wikicfp=WikiCfp()
+            wikiCfpScrape=wikicfp.wikiCfpScrape
+            wikiCfpScrape.jsondir=jsondir
+            crawlBatch=CrawlBatch(1,1,20,CrawlType.EVENT.value)
+            journal=wikiCfpScrape.getCrawlJournal(flushSize=5)
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=4,rate=1000,maxRetries=1,backoff=0.01,timeout=0.5,baseUrl=baseUrl,journal=journal)
+            batchEms=crawler.crawl(crawlBatch)
+            # the batch is incomplete so no json file is written yet
+            self.assertEqual([None],batchEms)
+            self.assertEqual(["wikicfp_crawl.db"],os.listdir(jsondir))
+            states=journal.getStates(crawlBatch)
+            self.assertEqual(CrawlJournal.STATUS_TIMEOUT,states[12])
+            self.assertEqual(CrawlJournal.STATUS_500,states[9])
+            self.assertEqual(CrawlJournal.STATUS_DELETED,states[20])
+            self.assertEqual(CrawlJournal.STATUS_OK,states[1])
+            self.assertEqual([9,12],journal.getTodoIds(crawlBatch))
+            journal.close()
+            # resume with a new journal instance as after an interrupted run
+            stub.delays={}
+            journal=wikiCfpScrape.getCrawlJournal()
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=4,rate=1000,maxRetries=1,backoff=0.01,baseUrl=baseUrl,journal=journal)
+            batchEm=crawler.crawl(crawlBatch)[0]
+            journal.close()
+            self.assertEqual(1,stub.requests[1])
+            self.assertEqual(1,stub.requests[20])
+            self.assertEqual(3,stub.requests[9])
+            events=batchEm.getList()
+            self.assertEqual(list(range(1,21)),[event.wikiCfpId for event in events])
+            self.assertEqual(datetime(2012,1,19).date(),events[11].Submission_Deadline)
+            self.assertTrue("wikicfp_Event000001-000020.json" in os.listdir(jsondir))
+            jsonEm=wikiCfpScrape.crawlFilesToJson(CrawlType.EVENT,withStore=False)
+            self.assertEqual(18,len(jsonEm.getList()))
+        finally:
+            stub.stop()
+            
+    def testCrawlJournalDateTypes(self):
+        '''
+        test that the crawl journal keeps the types of date and datetime values
+        '''
+        rawEvent={"wikiCfpId":1,"Submission_Deadline":datetime(2012,1,19).date(),"startDate":datetime(2012,6,3,10,30)}
+        recordJson=json.dumps(rawEvent,default=CrawlJournal.encodeValue)
+        decoded=json.loads(recordJson,object_hook=CrawlJournal.decodeValue)
+        self.assertEqual(rawEvent,decoded)
+        self.assertIs(type(decoded["Submission_Deadline"]),type(rawEvent["Submission_Deadline"]))
+        self.assertIs(datetime,type(decoded["startDate"]))
+            
+    def testDeltaCrawl(self):
+        '''
+        test crawling only the ids above the highest known wikiCfpId
+        '''
+        stub=WikiCfpStub(maxId=100,deletedIds=[50,160])
+        baseUrl=stub.start()
+        try:
+            jsondir="/tmp/wikicfp-delta"
+            os.makedirs(jsondir,exist_ok=True)
+            for jsonFile in os.listdir(jsondir):
+                os.remove(f"{jsondir}/{jsonFile}")
+            wikicfp=WikiCfp()
+            wikiCfpScrape=wikicfp.wikiCfpScrape
+            wikiCfpScrape.jsondir=jsondir
+            config=EventStorage.getStorageConfig(mode="json")
+            config.cacheFile="/tmp/wikicfp-delta-events.json"
+            wikiCfpScrape.jsonEventManager.config=config
+            wikiCfpScrape.jsonEventManager.removeCacheFile()
+            wikicfp.eventManager.config.cacheFile="/tmp/wikicfp-delta.db"
+            crawler=AsyncWikiCfpCrawler(wikiCfpScrape,concurrency=8,rate=1000,backoff=0.01,baseUrl=baseUrl)
+            crawler.crawl(CrawlBatch(1,1,120,CrawlType.EVENT.value))
+            wikicfp.eventManager.fromCache(force=True)
+            self.assertEqual(100,wikicfp.getMaxWikiCfpId())
+            # new events show up
+            stub.maxId=230
+            stub.requests.clear()
+            lod=wikicfp.deltaUpdate(crawler,window=10,stride=50)
+            self.assertEqual(230,crawler.frontier)
+            self.assertEqual(129,len(lod))
+            self.assertEqual(230,wikicfp.getMaxWikiCfpId())
+            # only ids above the known id are fetched and each of them only once
+            self.assertEqual(0,sum(stub.requests[cfpId] for cfpId in range(1,101)))
+            self.assertEqual(1,max(stub.requests.values()))
+            self.assertTrue("wikicfp_Event000000-000999.json" in os.listdir(jsondir))
+            # the deleted events of the earlier batch file are replaced by the new ones
+            wikiCfpScrape.jsonEventManager.getList().clear()
+            jsonEm=wikiCfpScrape.crawlFilesToJson(CrawlType.EVENT,withStore=False)
+            self.assertEqual(228,len(jsonEm.getList()))
+            sqlDB=wikicfp.eventManager.getSQLDB("/tmp/wikicfp-delta.db")
+            countResult=sqlDB.query(f"SELECT count(*) AS count FROM {wikicfp.eventManager.tableName}")
+            self.assertEqual(228,countResult[0]["count"])
+            self.assertEqual(228,EventStorage.getTableMetadata(sqlDB)[wikicfp.eventManager.tableName]["instances"])
+            # nothing new - the nightly refresh only probes beyond the frontier
+            lod=wikicfp.deltaUpdate(crawler,window=10,stride=50)
+            self.assertEqual(0,len(lod))
+            self.assertEqual(230,crawler.frontier)
+        finally:
+            stub.stop()
+            
+    def testFastJsonLoader(self):
+        '''
+        test reading the crawl batch files as dicts compared to the per file EventManager instantiation
+        '''
+        jsondir=SyntheticData.getTempDir(self,"wikicfp-fastload")
+        batches=5
+        SyntheticData.createWikiCfpEventFiles(jsondir,batches=batches,eventsPerBatch=1000)
+        wikicfp=WikiCfp()
+        wikiCfpScrape=wikicfp.wikiCfpScrape
+        wikiCfpScrape.jsondir=jsondir
+        jsonFiles=wikiCfpScrape.jsonFiles(CrawlType.EVENT)
+        self.assertEqual(batches,len(jsonFiles))
+        self.assertTrue(jsonFiles[2].endswith("wikicfp_Event002000-002999.json"))
+        # the per file EventManager instantiation as done before
+        legacyRecords=[]
+        for jsonFilePath in jsonFiles:
+            config=StorageConfig.getJSON(debug=self.debug)
+            config.cacheFile=jsonFilePath
+            batchEm=EventManager(name=jsonFilePath,clazz=WikiCfpEvent,config=config)
+            batchEm.fromStore(cacheFile=jsonFilePath)
+            for entity in batchEm.getList():
+                entity.year=entity.startDate.year
+                if not entity.deleted and not entity.locality.startswith("1"):
+                    legacyRecords.append(entity.__dict__)
+        records=list(wikiCfpScrape.iterBatchRecords(CrawlType.EVENT))
+        self.assertEqual(batches*1000*86//100,len(records))
+        self.assertEqual(len(legacyRecords),len(records))
+        for legacyRecord,record in zip(legacyRecords,records):
+            self.assertEqual(legacyRecord,record)
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
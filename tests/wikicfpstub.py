@@ -0,0 +1,166 @@
+'''
+Created on 2023-02-10
+
+@author: wf
+'''
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from collections import Counter
+import hashlib
+import threading
+
+class WikiCfpStub(object):
+    '''
+    local HTTP stub for WikiCFP event and series pages to test crawling without network access
+    '''
+
+    def __init__(self,maxId:int=100,deletedIds:list=None,failures:dict=None,delay:float=0.0,delays:dict=None,errors:dict=None,disconnects:dict=None,malformedIds:list=None):
+        '''
+        constructor
+
+        Args:
+            maxId(int): the highest id of an existing event or series - higher ids are shown as deleted
+            deletedIds(list): ids of deleted events
+            failures(dict): number of HTTP 500 responses by id before the page is served - -1 for always
+            delay(float): seconds to wait before responding
+            delays(dict): seconds to wait before responding by id - overrides delay
+            errors(dict): HTTP status code to always respond with by id e.g. 404
+            disconnects(dict): number of connections closed without a response by id before the page is served
+            malformedIds(list): ids of events whose page has a start date that can not be parsed
+        '''
+        self.maxId=maxId
+        self.deletedIds=list(deletedIds) if deletedIds is not None else []
+        self.failures=dict(failures) if failures is not None else {}
+        self.delay=delay
+        self.delays=dict(delays) if delays is not None else {}
+        self.errors=dict(errors) if errors is not None else {}
+        self.disconnects=dict(disconnects) if disconnects is not None else {}
+        self.malformedIds=list(malformedIds) if malformedIds is not None else []
+        self.requests=Counter()
+        # conditional requests answered with 304 Not Modified by id
+        self.notModified=Counter()
+        # the modification time of the pages
+        self.lastModified="Fri, 10 Feb 2023 08:00:00 GMT"
+        self.lock=threading.Lock()
+
+    def getEventHtml(self,eventId:int)->str:
+        '''
+        get the html of the event page with the given id
+        '''
+        if eventId in self.deletedIds or eventId>self.maxId:
+            return "<html><body><h3>This item has been deleted</h3></body></html>"
+        year=2000+eventId%20
+        seriesId=100+eventId%5
+        html=f"""<html><head><title>CONF{eventId} {year}</title></head><body>
+<span xmlns:v="http://rdf.data-vocabulary.org/#" typeof="v:Event">
+<span property="v:summary" content="CONF{eventId} {year}"></span>
+<span property="v:eventType" content="Conference"></span>
+<span property="v:startDate" content="{"June 3rd" if eventId in self.malformedIds else f"{year}-06-03T00:00:00"}"></span>
+<span property="v:endDate" content="{year}-06-05T23:59:59"></span>
+<span rel="v:location" typeof="v:Address"><span property="v:locality" content="Milano, Italy"></span></span>
+<span property="v:description" content=" CONF{eventId} {year} : The {eventId}th Conference"></span>
+<span property="v:summary" content="Submission Deadline"></span>
+<span property="v:startDate" content="{year}-01-19T00:00:00"></span>
+</span>
+<a href="/cfp/program?id={seriesId}&amp;s=CONF&amp;f=Conference">Conference Series {seriesId}</a>
+<table><tr><td>Link: <a href="http://conf{eventId}.org">http://conf{eventId}.org</a></td></tr></table>
+</body></html>"""
+        return html
+
+    def getSeriesHtml(self,seriesId:int)->str:
+        '''
+        get the html of the series page with the given id
+        '''
+        html=f"""<html><head><title>CONF{seriesId} : Conference Series {seriesId}</title></head><body>
+<a href="http://dblp.uni-trier.de/db/conf/conf{seriesId}/index.html">DBLP</a>
+</body></html>"""
+        return html
+
+    def handle(self,handler:BaseHTTPRequestHandler):
+        '''
+        handle the given request
+        '''
+        url=urlparse(handler.path)
+        params=parse_qs(url.query)
+        if url.path=="/cfp/servlet/event.showcfp":
+            cfpId=int(params["eventid"][0])
+            html=self.getEventHtml(cfpId)
+        elif url.path=="/cfp/program":
+            cfpId=int(params["id"][0])
+            html=self.getSeriesHtml(cfpId)
+        else:
+            handler.send_error(404)
+            return
+        with self.lock:
+            self.requests[cfpId]+=1
+            failures=self.failures.get(cfpId,0)
+            if failures>0:
+                self.failures[cfpId]=failures-1
+            disconnects=self.disconnects.get(cfpId,0)
+            if disconnects>0:
+                self.disconnects[cfpId]=disconnects-1
+        delay=self.delays.get(cfpId,self.delay)
+        if delay:
+            threading.Event().wait(delay)
+        if disconnects>0:
+            handler.close_connection=True
+            return
+        if cfpId in self.errors:
+            handler.send_error(self.errors[cfpId])
+            return
+        if failures!=0:
+            handler.send_error(500)
+            return
+        content=html.encode("utf-8")
+        etag=f'"{hashlib.md5(content).hexdigest()}"'
+        # the ETag takes precedence over the modification time
+        if "If-None-Match" in handler.headers:
+            notModified=handler.headers["If-None-Match"]==etag
+        else:
+            notModified=handler.headers.get("If-Modified-Since")==self.lastModified
+        if notModified:
+            with self.lock:
+                self.notModified[cfpId]+=1
+            handler.send_response(304)
+            handler.send_header("ETag",etag)
+            handler.end_headers()
+            return
+        handler.send_response(200)
+        handler.send_header("ETag",etag)
+        handler.send_header("Last-Modified",self.lastModified)
+        handler.send_header("Content-Type","text/html; charset=utf-8")
+        handler.send_header("Content-Length",str(len(content)))
+        handler.end_headers()
+        try:
+            handler.wfile.write(content)
+        except (BrokenPipeError,ConnectionResetError):
+            # the client gave up e.g. due to a timeout
+            pass
+
+    def start(self)->str:
+        '''
+        start serving on a free local port
+
+        Returns:
+            str: the base url of the stub
+        '''
+        stub=self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version="HTTP/1.1"
+            def do_GET(self):
+                stub.handle(self)
+            def log_message(self, *args):
+                pass
+        self.server=ThreadingHTTPServer(("127.0.0.1",0),Handler)
+        self.server.daemon_threads=True
+        self.thread=threading.Thread(target=self.server.serve_forever,daemon=True)
+        self.thread.start()
+        self.baseUrl=f"http://127.0.0.1:{self.server.server_port}"
+        return self.baseUrl
+
+    def stop(self):
+        '''
+        stop serving
+        '''
+        self.server.shutdown()
+        self.server.server_close()